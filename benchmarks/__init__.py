@@ -0,0 +1,3 @@
+"""
+Бенчмарки горячих путей бота. Запуск: python -m benchmarks.<модуль>
+"""
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import timeit
+from typing import Callable, Dict, List
+
+from bot.data import SCHEDULE, SUBJECTS, Subject, data_replaced, get_all_day_keys
+
+
+def populate(n_subjects: int, n_days: int = 7, lessons_per_day: int = 6) -> None:
+    """Заменить SUBJECTS/SCHEDULE синтетическими данными заданного размера."""
+    SUBJECTS.clear()
+    for i in range(n_subjects):
+        key = f"subj_{i}"
+        SUBJECTS[key] = Subject(key=key, name=f"Предмет {i}", homework=f"Задание {i}: упр. {i % 50}, стр. {i % 300}")
+
+    week = get_all_day_keys()
+    day_keys: List[str] = [week[i] if i < len(week) else f"d{i}" for i in range(n_days)]
+    keys = list(SUBJECTS)
+    SCHEDULE.clear()
+    for d, day_key in enumerate(day_keys):
+        SCHEDULE[day_key] = [keys[(d * lessons_per_day + j) % len(keys)] for j in range(lessons_per_day)] if keys else []
+    data_replaced()
+
+
+def per_call(fn: Callable[[], object], min_time: float = 0.2) -> float:
+    """Среднее время одного вызова fn в микросекундах."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    while True:
+        elapsed = min(timer.repeat(repeat=3, number=number))
+        if elapsed >= min_time or number >= 1_000_000:
+            return elapsed / number * 1e6
+        number *= 2
+
+
+def format_table(rows: List[Dict[str, object]], columns: List[str]) -> str:
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    lines = ["  ".join(c.ljust(widths[c]) for c in columns)]
+    lines.append("  ".join("-" * widths[c] for c in columns))
+    for r in rows:
+        lines.append("  ".join(str(r[c]).ljust(widths[c]) for c in columns))
+    return "\n".join(lines)
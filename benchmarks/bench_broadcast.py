@@ -0,0 +1,111 @@
+"""Скорость рассылки против поддельного Bot API с лимитами Telegram.
+
+    python -m benchmarks.bench_broadcast --chats 600 --latency 0.02
+
+Сравнивает рассылку через Broadcaster (ведро токенов, пауза по retry_after)
+с наивным циклом «отправить всем параллельно»: сколько сообщений в секунду
+доходит и сколько ответов 429 получает бот.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from telegram import Bot  # noqa: E402
+from telegram.error import RetryAfter  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+
+from benchmarks._fixtures import format_table  # noqa: E402
+from bot.broadcast import Broadcaster, BroadcastStore, RateLimiter  # noqa: E402
+from tools.fake_telegram import FakeBotApi  # noqa: E402
+
+
+TOKEN = "123:bench"
+
+
+def _bot(base_url: str, pool: int) -> Bot:
+    return Bot(TOKEN, base_url=base_url, request=HTTPXRequest(connection_pool_size=pool))
+
+
+async def bench_broadcaster(chats: int, latency: float, in_flight: int) -> Dict[str, object]:
+    api = FakeBotApi(latency=latency)
+    base_url = await api.start()
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-broadcast-"), "broadcast.sqlite3")
+    broadcaster = Broadcaster(BroadcastStore(path), RateLimiter(), max_in_flight=in_flight)
+    for chat_id in range(1, chats + 1):
+        broadcaster.remember(chat_id, "default")
+    bot = _bot(base_url, in_flight + 2)
+    async with bot:
+        started = time.perf_counter()
+        broadcaster.start(bot)
+        job_id, _ = broadcaster.submit("default", "Объявление", admin_chat_id=chats + 1)
+        await broadcaster.wait(job_id)
+        elapsed = time.perf_counter() - started
+        counts = broadcaster.store.counts(job_id)
+        await broadcaster.stop()
+    await api.stop()
+    return {
+        "mode": f"Broadcaster x{in_flight}",
+        "delivered": counts["sent"],
+        "seconds": f"{elapsed:.1f}",
+        "msg_per_s": f"{counts['sent'] / elapsed:.1f}",
+        "429": api.rate_limited,
+    }
+
+
+async def bench_naive(chats: int, latency: float, in_flight: int) -> Dict[str, object]:
+    """Все сразу, с ограничением только на число одновременных запросов; 429 — повтор через retry_after."""
+    api = FakeBotApi(latency=latency)
+    base_url = await api.start()
+    semaphore = asyncio.Semaphore(in_flight)
+    bot = _bot(base_url, in_flight + 2)
+
+    async def send(chat_id: int) -> None:
+        while True:
+            async with semaphore:
+                try:
+                    await bot.send_message(chat_id, "Объявление")
+                    return
+                except RetryAfter as e:
+                    retry_after = e.retry_after
+            await asyncio.sleep(retry_after)
+
+    async with bot:
+        started = time.perf_counter()
+        await asyncio.gather(*(send(chat_id) for chat_id in range(1, chats + 1)))
+        elapsed = time.perf_counter() - started
+    await api.stop()
+    return {
+        "mode": f"naive x{in_flight}",
+        "delivered": api.sent,
+        "seconds": f"{elapsed:.1f}",
+        "msg_per_s": f"{api.sent / elapsed:.1f}",
+        "429": api.rate_limited,
+    }
+
+
+async def run(chats: int, latency: float, in_flight: int) -> List[Dict[str, object]]:
+    return [
+        await bench_broadcaster(chats, latency, in_flight),
+        await bench_naive(chats, latency, in_flight),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа API, с")
+    parser.add_argument("--in-flight", type=int, default=8, help="одновременных запросов")
+    args = parser.parse_args()
+    rows = asyncio.run(run(args.chats, args.latency, args.in_flight))
+    print(format_table(rows, ["mode", "delivered", "seconds", "msg_per_s", "429"]))
+
+
+if __name__ == "__main__":
+    main()
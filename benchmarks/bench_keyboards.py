@@ -0,0 +1,52 @@
+"""Сколько стоит построение клавиатуры с кешем и без него.
+
+    python -m benchmarks.bench_keyboards [--sizes 10 100 1000]
+"""
+from __future__ import annotations
+
+import argparse
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks._fixtures import format_table, per_call, populate
+from bot import keyboards
+
+
+CASES: List[Tuple[str, Callable[..., Any], Tuple[Any, ...]]] = [
+    ("build_subjects_keyboard", keyboards.build_subjects_keyboard, ()),
+    ("build_days_keyboard", keyboards.build_days_keyboard, ()),
+    ("build_subjects_keyboard_with_prefix", keyboards.build_subjects_keyboard_with_prefix, ("edit:hw:",)),
+    ("build_subjects_keyboard_for_day_add", keyboards.build_subjects_keyboard_for_day_add, ("mon",)),
+    ("build_main_menu_keyboard", keyboards.build_main_menu_keyboard, (True,)),
+]
+
+
+def run(sizes: List[int]) -> List[Dict[str, object]]:
+    rows: List[Dict[str, object]] = []
+    for size in sizes:
+        populate(size)
+        for name, builder, args in CASES:
+            uncached = per_call(lambda: builder.__wrapped__(*args))
+            builder(*args)  # прогреть кеш
+            cached = per_call(lambda: builder(*args))
+            rows.append(
+                {
+                    "subjects": size,
+                    "builder": name,
+                    "uncached_us": f"{uncached:.2f}",
+                    "cached_us": f"{cached:.2f}",
+                    "speedup": f"{uncached / cached:.0f}x",
+                }
+            )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+    rows = run(args.sizes)
+    print(format_table(rows, ["subjects", "builder", "uncached_us", "cached_us", "speedup"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Задержка нажатия «В главное меню» в двух режимах навигации.
+
+    python -m benchmarks.bench_navigation --latency 0.05 --taps 50
+
+Бот работает против поддельного Bot API с задержкой ответа `latency`
+(сеть до Telegram). NAV_MODE=reply: удалить сообщение, прислать новое,
+ответить на нажатие — три запроса подряд. NAV_MODE=inline: ответ на нажатие
+и правка того же сообщения — два запроса одновременно.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from telegram import Update  # noqa: E402
+from telegram.ext import Application, CallbackQueryHandler  # noqa: E402
+
+from benchmarks._fixtures import format_table  # noqa: E402
+from bot.config import reload_settings  # noqa: E402
+from bot.handlers import back_to_main  # noqa: E402
+from bot.storage import configure_storage, load_data  # noqa: E402
+from bot.telegram_api import build_request, configure_api  # noqa: E402
+from tools.fake_telegram import FakeBotApi, callback_update  # noqa: E402
+
+
+TOKEN = "123:bench"
+
+
+async def bench_mode(mode: str, taps: int, latency: float) -> Dict[str, object]:
+    os.environ["NAV_MODE"] = mode
+    reload_settings()
+    # Без общего лимита бота: меряем круги до API, а не ожидание очереди
+    configure_api(rate=10_000)
+    api = FakeBotApi(latency=latency)
+    base_url = await api.start()
+    application = Application.builder().token(TOKEN).base_url(base_url).request(build_request()).build()
+    application.add_handler(CallbackQueryHandler(back_to_main, pattern=r"^back:main$"))
+    timings: List[float] = []
+    async with application:
+        for i in range(taps):
+            # Каждое нажатие — в своём чате: лимит «1 сообщение в секунду в чат» не мешает замеру
+            chat_id = 1000 + i
+            update = Update.de_json(callback_update("back:main", user_id=chat_id, chat_id=chat_id), application.bot)
+            started = time.perf_counter()
+            await application.process_update(update)
+            timings.append(time.perf_counter() - started)
+    await api.stop()
+    calls = sum(n for method, n in api.requests.items() if method != "getMe")
+    timings.sort()
+    return {
+        "mode": mode,
+        "calls_per_tap": f"{calls / taps:.1f}",
+        "mean_ms": f"{statistics.mean(timings) * 1000:.1f}",
+        "p50_ms": f"{timings[len(timings) // 2] * 1000:.1f}",
+        "p95_ms": f"{timings[int(len(timings) * 0.95) - 1] * 1000:.1f}",
+    }
+
+
+async def run(taps: int, latency: float) -> List[Dict[str, object]]:
+    return [await bench_mode(mode, taps, latency) for mode in ("reply", "inline")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--taps", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа API, с")
+    args = parser.parse_args()
+    configure_storage("json", os.path.join(tempfile.mkdtemp(prefix="bench-nav-"), "data.json"))
+    load_data()
+    rows = asyncio.run(run(args.taps, args.latency))
+    print(format_table(rows, ["mode", "calls_per_tap", "mean_ms", "p50_ms", "p95_ms"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Сколько стоит разбор callback_data таблицей маршрутов.
+
+    python -m benchmarks.bench_router
+"""
+from __future__ import annotations
+
+import argparse
+import os
+from typing import Dict, List
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from benchmarks._fixtures import format_table, per_call, populate  # noqa: E402
+from bot.handlers import edit_routes, menu_routes  # noqa: E402
+
+
+MENU_CASES: List[str] = ["menu:subjects", "menu:days_manage:create", "menu:unknown"]
+EDIT_CASES: List[str] = [
+    "edit:sched:add",
+    "edit:sched:add:subj_1",
+    "edit:sched:del_choose:3",
+    "edit:sched:day:mon",
+    "edit:hw:subj_1",
+    "edit:days:delete:sun",
+    "edit:garbage",
+]
+
+
+def run() -> List[Dict[str, object]]:
+    populate(10)
+    rows: List[Dict[str, object]] = []
+    for router, cases in ((menu_routes, MENU_CASES), (edit_routes, EDIT_CASES)):
+        for data in cases:
+            resolved = router.resolve(data)
+            rows.append(
+                {
+                    "callback_data": data,
+                    "route": resolved[0].pattern if resolved else "-",
+                    "resolve_us": f"{per_call(lambda: router.resolve(data)):.3f}",
+                }
+            )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.parse_args()
+    print(format_table(run(), ["callback_data", "route", "resolve_us"]))
+
+
+if __name__ == "__main__":
+    main()
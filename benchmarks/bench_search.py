@@ -0,0 +1,83 @@
+"""Поиск по ДЗ: обратный индекс против перебора всех текстов.
+
+    python -m benchmarks.bench_search [--sizes 100 10000 100000]
+
+Документы — синтетические задания (несколько лет ДЗ по всем предметам).
+search_us — один запрос через индекс, scan_us — перебор с поиском подстроки,
+update_us — правка одного задания в индексе, build_ms — построение с нуля.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from benchmarks._fixtures import format_table, per_call
+from bot.search import NAME_WEIGHT, TEXT_WEIGHT, SearchIndex
+
+
+SUBJECT_NAMES = ["Математика", "Русский язык", "Физика", "Химия", "История", "Биология", "Литература", "География"]
+WORDS = (
+    "задачи законы Ньютона упражнение параграф конспект прочитать главу выучить слова правило "
+    "решить уравнения стр номер таблица карта материки океаны клетка реакции окисления война "
+    "реформы пересказ стихотворение наизусть сочинение тема доклад презентация опыт движение "
+    "сила трения энергия импульс дроби проценты степени корни функции графики"
+).split()
+QUERIES = ["ньютон", "законы ньютона", "упр", "выучить стихотворение наизусть", "xyz"]
+
+
+def make_docs(n: int, seed: int = 1) -> Dict[int, List]:
+    rnd = random.Random(seed)
+    docs: Dict[int, List] = {}
+    for i in range(n):
+        text = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(4, 12))) + f", стр. {rnd.randint(1, 300)}"
+        docs[i] = [(rnd.choice(SUBJECT_NAMES), NAME_WEIGHT), (text, TEXT_WEIGHT)]
+    return docs
+
+
+def scan(docs: Dict[int, List], query: str) -> List[int]:
+    words = query.lower().replace("ё", "е").split()
+    found = []
+    for doc_id, fields in docs.items():
+        text = " ".join(t for t, _ in fields).lower().replace("ё", "е")
+        if all(w in text for w in words):
+            found.append(doc_id)
+    return found
+
+
+def run(sizes: List[int]) -> List[Dict[str, object]]:
+    rows: List[Dict[str, object]] = []
+    for size in sizes:
+        docs = make_docs(size)
+        started = time.perf_counter()
+        index = SearchIndex()
+        for doc_id, fields in docs.items():
+            index.add(doc_id, fields)
+        build_ms = (time.perf_counter() - started) * 1000
+        edits = iter(make_docs(1_000_000, seed=2).values())
+        update_us = per_call(lambda: index.add(random.randrange(size), next(edits)))
+        for query in QUERIES:
+            rows.append(
+                {
+                    "docs": size,
+                    "query": query,
+                    "hits": len(index.search(query, limit=size)),
+                    "search_us": f"{per_call(lambda: index.search(query)):.1f}",
+                    "scan_us": f"{per_call(lambda: scan(docs, query), min_time=0.05):.0f}",
+                    "update_us": f"{update_us:.1f}",
+                    "build_ms": f"{build_ms:.0f}",
+                }
+            )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 100000])
+    args = parser.parse_args()
+    print(format_table(run(args.sizes), ["docs", "query", "hits", "search_us", "scan_us", "update_us", "build_ms"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""Нагрузочный тест: бот из bot/main.py против поддельного Bot API.
+
+    python -m benchmarks.loadtest --mix morning --users 300 --rate 100 --updates 3000
+    python -m benchmarks.loadtest --mix admin --latency 0.05 --error-rate 0.02
+
+Бот собирается как обычно (configure_services + build_application, long
+polling), только BOT_API_BASE_URL указывает на tools.fake_telegram.FakeBotApi,
+а данные и базы лежат во временном каталоге. Смеси трафика:
+
+  student — «ДЗ на завтра», просмотр предметов и расписания по дням;
+  admin   — серии правок ДЗ и расписания (edit_callback и ввод текста);
+  morning — утренний пик: ученики и изредка админ (--admin-share).
+
+Между действиями одного пользователя не меньше --think секунд, как у живого
+человека (и как требует лимит Telegram на чат), поэтому для --rate нужно не
+меньше rate × think пользователей.
+
+Итог: апдейтов в секунду; задержка обработки (handler — от первого хендлера
+до последнего) и от выдачи в getUpdates до конца обработки (e2e), p50/p99;
+запросов к Bot API на апдейт; сколько секунд отправки простояли в лимитере
+бота (limiter_wait_s: лимит настоящий, --broadcast-rate, по умолчанию как у
+Telegram); память на одного нового пользователя (tracemalloc, отдельный
+прогон по --memory-users пользователям). Ниже — те же задержки по экранам:
+где искать медленное.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import heapq
+import logging
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from benchmarks._fixtures import format_table
+from bot.stats import classify_update
+from bot.telegram_api import GLOBAL_RATE
+from tools.fake_telegram import FakeBotApi, callback_update, message_update
+
+
+TOKEN = "123:loadtest"
+ADMIN_BASE = 1_000
+STUDENT_BASE = 100_000
+MEMORY_BASE = 900_000
+
+Action = Tuple[str, str]  # ("text" | "cb", текст или callback_data)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Traffic:
+    """Сценарии пользователей: у каждого — текущая серия действий."""
+
+    def __init__(self, subjects: List[str], days: List[str], seed: int) -> None:
+        self.subjects = subjects
+        self.days = days
+        self.rng = random.Random(seed)
+        self._sessions: Dict[int, List[Action]] = defaultdict(list)
+
+    def student_session(self) -> List[Action]:
+        roll = self.rng.random()
+        if roll < 0.45:
+            return [("text", "📝 ДЗ на завтра")]
+        if roll < 0.60:
+            return [("cb", "menu:tomorrow")]
+        if roll < 0.85:
+            return [("cb", "menu:subjects"), ("cb", f"subject:{self.rng.choice(self.subjects)}"), ("cb", "back:main")]
+        if roll < 0.97:
+            return [("cb", "menu:day"), ("cb", f"day:{self.rng.choice(self.days)}"), ("cb", "back:main")]
+        return [("text", "/start")]
+
+    def admin_session(self) -> List[Action]:
+        actions: List[Action] = [("cb", "menu:admin"), ("cb", "menu:edit_hw")]
+        for _ in range(3):
+            subject = self.rng.choice(self.subjects)
+            homework = f"Упр. {self.rng.randint(1, 500)}, стр. {self.rng.randint(1, 300)}"
+            actions += [("cb", f"edit:hw:{subject}"), ("text", homework)]
+        # Урок добавляем и сразу убираем первый: расписание не растёт от прогона к прогону
+        actions += [
+            ("cb", "menu:edit_sched"),
+            ("cb", f"edit:sched:day:{self.rng.choice(self.days)}"),
+            ("cb", f"edit:sched:add:{self.rng.choice(self.subjects)}"),
+            ("cb", "edit:sched:del"),
+            ("cb", "edit:sched:del_choose:1"),
+        ]
+        return actions
+
+    def next_action(self, user_id: int, admin: bool) -> Action:
+        session = self._sessions[user_id]
+        if not session:
+            session.extend(reversed(self.admin_session() if admin else self.student_session()))
+        return session.pop()
+
+
+def make_update(user_id: int, action: Action) -> Dict:
+    kind, payload = action
+    if kind == "text":
+        return message_update(payload, user_id=user_id)
+    return callback_update(payload, user_id=user_id)
+
+
+class Probe:
+    """Время обработки каждого апдейта: хендлеры в самой первой и самой последней группе."""
+
+    def __init__(self, api: FakeBotApi) -> None:
+        self.api = api
+        self.started: Dict[int, float] = {}
+        self.handler: List[float] = []
+        self.e2e: List[float] = []
+        self.by_route: Dict[str, List[float]] = defaultdict(list)
+        self.done = 0
+        self.expected = 0
+        self.finished = asyncio.Event()
+
+    def install(self, application: Application) -> None:
+        application.add_handler(TypeHandler(Update, self._begin), group=-100)
+        application.add_handler(TypeHandler(Update, self._end), group=100)
+
+    def expect(self, n: int) -> None:
+        self.expected += n
+        self.finished.clear()
+
+    async def _begin(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.started[update.update_id] = time.perf_counter()
+
+    async def _end(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        now = time.perf_counter()
+        started = self.started.pop(update.update_id, now)
+        self.handler.append(now - started)
+        self.by_route[classify_update(update)[1]].append(now - started)
+        delivered = self.api.delivered_at.pop(update.update_id, None)
+        if delivered is not None:
+            self.e2e.append(now - delivered)
+        self.done += 1
+        if self.done >= self.expected:
+            self.finished.set()
+
+    def reset(self) -> None:
+        self.handler.clear()
+        self.e2e.clear()
+        self.by_route.clear()
+
+
+async def drive(
+    api: FakeBotApi, traffic: Traffic, total: int, rate: float, think: float,
+    students: List[int], admins: List[int], admin_share: float,
+) -> float:
+    """Отдать total апдейтов в getUpdates с частотой rate (0 — как позволяют паузы пользователей)."""
+    queues = {False: [(0.0, u) for u in students], True: [(0.0, u) for u in admins]}
+    for heap in queues.values():
+        heapq.heapify(heap)
+    interval = 1.0 / rate if rate > 0 else 0.0
+    started = time.perf_counter()
+    for k in range(total):
+        due = started + k * interval
+        admin = bool(queues[True]) and (not queues[False] or traffic.rng.random() < admin_share)
+        if queues[not admin] and queues[admin][0][0] > max(due, queues[not admin][0][0]):
+            # Выбранный ещё думает — апдейт отдаём тому, кто готов раньше, а не ждём
+            admin = not admin
+        ready, user_id = heapq.heappop(queues[admin])
+        due = max(due, ready)
+        wait = due - time.perf_counter()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        api.push_updates([make_update(user_id, traffic.next_action(user_id, admin))])
+        heapq.heappush(queues[admin], (time.perf_counter() + think, user_id))
+    return started
+
+
+def _api_calls(api: FakeBotApi) -> int:
+    return sum(n for method, n in api.requests.items() if method != "getUpdates")
+
+
+def _configure_env(args: argparse.Namespace, base_url: str, workdir: str, admins: List[int]) -> None:
+    os.environ.update(
+        {
+            "BOT_TOKEN": TOKEN,
+            "BOT_API_BASE_URL": base_url,
+            "BOT_MODE": "polling",
+            "WORKERS": "1",
+            "ADMIN_USER_ID": str(admins[0]) if admins else "",
+            "ADMIN_USER_IDS": ",".join(map(str, admins)),
+            "STORAGE_BACKEND": args.storage,
+            "STORAGE_PATH": os.path.join(workdir, "data.sqlite3" if args.storage == "sqlite" else "data.json"),
+            "TENANTS_DIR": os.path.join(workdir, "tenants"),
+            "STATE_PATH": os.path.join(workdir, "state.sqlite3"),
+            "SUBSCRIPTIONS_PATH": os.path.join(workdir, "subscriptions.sqlite3"),
+            "BROADCAST_PATH": os.path.join(workdir, "broadcast.sqlite3"),
+            "HISTORY_PATH": os.path.join(workdir, "history.sqlite3"),
+            "STATS_PATH": os.path.join(workdir, "stats.sqlite3"),
+            "METRICS_PORT": "0",
+            "BROADCAST_RATE": str(args.broadcast_rate),
+            "CONCURRENT_UPDATES": str(args.concurrency),
+            "NAV_MODE": args.nav,
+        }
+    )
+
+
+async def measure_memory(api: FakeBotApi, probe: Probe, users: int) -> float:
+    """Сколько байт памяти остаётся занято на каждого нового пользователя после /start и пары экранов."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        probe.expect(users * 3)
+        for i in range(users):
+            user_id = MEMORY_BASE + i
+            api.push_updates(
+                [
+                    message_update("/start", user_id=user_id),
+                    callback_update("menu:subjects", user_id=user_id),
+                    callback_update("back:main", user_id=user_id),
+                ]
+            )
+        await asyncio.wait_for(probe.finished.wait(), timeout=60 + users)
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    # Без учёта самого стенда (очередь поддельного API, замеры Probe)
+    exclude = [tracemalloc.Filter(False, "*tools/fake_telegram.py"), tracemalloc.Filter(False, __file__)]
+    growth = sum(stat.size_diff for stat in after.filter_traces(exclude).compare_to(before.filter_traces(exclude), "filename"))
+    return growth / users
+
+
+async def run(args: argparse.Namespace) -> Tuple[Dict[str, object], List[Dict[str, object]]]:
+    from bot.config import reload_settings
+    from bot.data import SCHEDULE, SUBJECTS
+    from bot.main import build_application, configure_services
+    from bot.telegram_api import get_api_stats, get_limiter
+
+    api = FakeBotApi(rate=1e9, chat_rate=1e9, latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    base_url = await api.start()
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    admins = [ADMIN_BASE + i for i in range(args.admins)] if args.mix != "student" else []
+    students = [STUDENT_BASE + i for i in range(args.users)] if args.mix != "admin" else []
+    _configure_env(args, base_url, workdir, admins or [ADMIN_BASE])
+    settings = reload_settings()
+    configure_services(settings)
+    traffic = Traffic(list(SUBJECTS), [day for day, lessons in SCHEDULE.items() if lessons] or list(SCHEDULE), args.seed)
+
+    application = build_application(settings)
+    probe = Probe(api)
+    probe.install(application)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.updater.start_polling(poll_interval=0.0, timeout=1, drop_pending_updates=False)  # type: ignore[union-attr]
+    await application.start()
+    try:
+        # Прогрев: первый вызов каждого экрана строит кэши клавиатур, индексы и т.п.
+        probe.expect(args.warmup)
+        await drive(api, traffic, args.warmup, 0.0, 0.0, students, admins, args.admin_share)
+        await asyncio.wait_for(probe.finished.wait(), timeout=120)
+        probe.reset()
+        calls_before = _api_calls(api)
+        retries_before = sum(get_api_stats().retries.values())
+        waited_before = sum(get_limiter().waited.values())
+
+        probe.expect(args.updates)
+        started = await drive(
+            api, traffic, args.updates, args.rate, args.think, students, admins,
+            args.admin_share if args.mix == "morning" else 0.0,
+        )
+        await asyncio.wait_for(probe.finished.wait(), timeout=max(120.0, args.updates / 10))
+        elapsed = time.perf_counter() - started
+        calls = _api_calls(api) - calls_before
+        retries = sum(get_api_stats().retries.values()) - retries_before
+        waited = sum(get_limiter().waited.values()) - waited_before
+        handler, e2e = list(probe.handler), list(probe.e2e)
+        routes = [
+            {
+                "route": route or "?",
+                "n": len(times),
+                "p50_ms": f"{percentile(times, 0.5) * 1000:.1f}",
+                "p99_ms": f"{percentile(times, 0.99) * 1000:.1f}",
+            }
+            for route, times in sorted(probe.by_route.items(), key=lambda item: -percentile(item[1], 0.99))
+        ]
+        bytes_per_user = await measure_memory(api, probe, args.memory_users) if args.memory_users else 0.0
+    finally:
+        await application.updater.stop()  # type: ignore[union-attr]
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await api.stop()
+
+    summary: Dict[str, object] = {
+        "mix": args.mix,
+        "updates": args.updates,
+        "upd_per_s": f"{args.updates / elapsed:.0f}",
+        "handler_p50_ms": f"{percentile(handler, 0.5) * 1000:.1f}",
+        "handler_p99_ms": f"{percentile(handler, 0.99) * 1000:.1f}",
+        "e2e_p50_ms": f"{percentile(e2e, 0.5) * 1000:.1f}",
+        "e2e_p99_ms": f"{percentile(e2e, 0.99) * 1000:.1f}",
+        "api_per_upd": f"{calls / args.updates:.2f}",
+        "retries": retries,
+        "limiter_wait_s": f"{waited:.1f}",
+        "errors": api.errors_injected,
+        "kb_per_user": f"{bytes_per_user / 1024:.1f}",
+    }
+    return summary, routes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", choices=("student", "admin", "morning"), default="morning")
+    parser.add_argument("--updates", type=int, default=2000, help="сколько апдейтов отправить")
+    parser.add_argument("--rate", type=float, default=100.0, help="апдейтов в секунду (0 — без ограничения)")
+    parser.add_argument("--users", type=int, default=300, help="учеников")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--admin-share", type=float, default=0.05, help="доля действий админа в смеси morning")
+    parser.add_argument("--think", type=float, default=1.0, help="пауза между действиями одного пользователя, с")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа Bot API, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500 от Bot API")
+    parser.add_argument(
+        "--broadcast-rate", type=float, default=GLOBAL_RATE, help="BROADCAST_RATE: общий лимит бота, сообщений/с"
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="CONCURRENT_UPDATES")
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--nav", choices=("reply", "inline"), default="reply")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--memory-users", type=int, default=200, help="0 — не мерить память")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    summary, routes = asyncio.run(run(args))
+    print(format_table([summary], list(summary)))
+    print()
+    print(format_table(routes, ["route", "n", "p50_ms", "p99_ms"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Микробенчмарки горячих путей bot.data, bot.keyboards и bot.storage с базовой линией.
+
+    python -m benchmarks.micro --save before.json          # замерить и сохранить
+    python -m benchmarks.micro --compare before.json       # сравнить после правки
+    python -m benchmarks.micro --subjects 10 100 --days 7 --only keyboards
+
+Каждый случай меряется на синтетических данных всех размеров --subjects ×
+--days (по 6 уроков в день); из --rounds прогонов берётся лучший замер. Клавиатуры — все build_*_keyboard из
+bot.keyboards, без кеша (так они строятся после каждой правки админа): перед каждым вызовом версия
+данных увеличивается, поэтому и вложенные кешированные клавиатуры (список предметов в карточке
+предмета) строятся заново.
+storage.* — save_data + load_data на временном файле (json и sqlite).
+
+--compare печатает изменение к базовой линии и помечает случаи, ставшие
+медленнее больше чем на --threshold (по умолчанию 20%; такие случаи
+перемеряются ещё раз); тогда код выхода 1.
+Сравнивать имеет смысл замеры на одной машине.
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import inspect
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from benchmarks._fixtures import format_table, per_call, populate  # noqa: E402
+from bot import keyboards  # noqa: E402
+from bot.data import SCHEDULE, bump_data_version, get_days_for_subject, get_schedule_for_day  # noqa: E402
+from bot.handlers import _make_unique_key, _slugify_key  # noqa: E402
+from bot.storage import configure_storage, load_data, save_data  # noqa: E402
+
+
+# Изменения меньше этого (мкс) — шум таймера, а не регрессия
+MIN_DELTA_US = 0.1
+
+Case = Tuple[str, Callable[[], object]]
+
+
+def _keyboard_args(subject_key: str, day_key: str, day_keys: List[str]) -> Dict[str, Any]:
+    # Аргументы build_*_keyboard по имени параметра
+    return {
+        "is_admin": True,
+        "prefix": "edit:hw:",
+        "subject_key": subject_key,
+        "day_key": day_key,
+        "older_than": 100,
+        "keys": day_keys,
+    }
+
+
+def keyboard_cases(subject_key: str, day_key: str, day_keys: List[str]) -> List[Case]:
+    values = _keyboard_args(subject_key, day_key, day_keys)
+    cases: List[Case] = []
+    for name, builder in sorted(vars(keyboards).items()):
+        if not (name.startswith("build_") and name.endswith("_keyboard") and callable(builder)):
+            continue
+        raw = getattr(builder, "__wrapped__", builder)
+        params = inspect.signature(raw).parameters
+        missing = [p for p in params if p not in values]
+        if missing:
+            raise RuntimeError(f"{name}: нет значения для параметров {missing} (см. _keyboard_args)")
+        kwargs = {p: values[p] for p in params}
+        cases.append((f"keyboards.{name}", functools.partial(_uncached, raw, kwargs)))
+    return cases
+
+
+def _uncached(builder: Callable[..., object], kwargs: Dict[str, Any]) -> object:
+    # Как после правки админа: кеш клавиатур, вызываемых изнутри builder, устарел
+    bump_data_version()
+    return builder(**kwargs)
+
+
+def data_cases(subject_key: str, day_key: str) -> List[Case]:
+    return [
+        ("data.get_schedule_for_day", lambda: get_schedule_for_day(day_key)),
+        ("data.get_days_for_subject", lambda: get_days_for_subject(subject_key)),
+        # Ключ нового предмета: первый занят, второй свободен
+        ("handlers._make_unique_key", lambda: _make_unique_key(subject_key)),
+    ]
+
+
+def round_trip() -> None:
+    save_data()
+    load_data()
+
+
+STORAGE_BACKENDS = (("json", "data.json"), ("sqlite", "data.sqlite3"))
+
+# Не зависят от размера данных — меряются один раз
+STATIC_CASES: List[Case] = [
+    ("handlers._slugify_key", lambda: _slugify_key("Иностранный язык (англ.) — 2 группа")),
+]
+
+
+def run(
+    subject_sizes: List[int], day_sizes: List[int], only: List[str], min_time: float
+) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+
+    def measure(name: str, fn: Callable[[], object], subjects: int, days: int, setup: Callable[[], None]) -> None:
+        if only and not any(name.startswith(prefix) for prefix in only):
+            return
+        fn()  # прогрев: индексы, кеши импорта и т.п.
+        rows.append(
+            {
+                "case": name,
+                "subjects": subjects,
+                "days": days,
+                "us": per_call(fn, min_time=min_time),
+                "rerun": (setup, fn),  # для перепроверки регрессии
+            }
+        )
+
+    for name, fn in STATIC_CASES:
+        measure(name, fn, 0, 0, lambda: None)
+    workdir = tempfile.mkdtemp(prefix="bench-micro-")
+    # Данные бота (bot/data.json) не трогаем
+    configure_storage("json", os.path.join(workdir, "data.json"))
+    for subjects in subject_sizes:
+        for days in day_sizes:
+            setup = functools.partial(populate, subjects, days)
+            setup()
+            day_keys = list(SCHEDULE)
+            day_key = day_keys[0]
+            subject_key = SCHEDULE[day_key][0]
+            for name, fn in data_cases(subject_key, day_key) + keyboard_cases(subject_key, day_key, day_keys):
+                measure(name, fn, subjects, days, setup)
+            for backend, filename in STORAGE_BACKENDS:
+                path = os.path.join(workdir, f"{subjects}x{days}-{filename}")
+
+                def storage_setup(setup: Callable[[], None] = setup, backend: str = backend, path: str = path) -> None:
+                    setup()
+                    configure_storage(backend, path)
+
+                storage_setup()
+                measure(f"storage.round_trip_{backend}", round_trip, subjects, days, storage_setup)
+    return rows
+
+
+def _key(row: Dict[str, Any]) -> str:
+    return f"{row['case']}|{row['subjects']}|{row['days']}"
+
+
+def save_baseline(path: str, rows: List[Dict[str, Any]]) -> None:
+    payload = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+        "results": {_key(row): round(row["us"], 4) for row in rows},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def compare(rows: List[Dict[str, Any]], baseline: Dict[str, float], threshold: float) -> int:
+    """Добавить к строкам сравнение с базовой линией; вернуть число регрессий."""
+    regressions = 0
+    for row in rows:
+        before = baseline.get(_key(row))
+        if before is None:
+            row["baseline_us"], row["change"], row["flag"] = "-", "-", "new"
+            continue
+        change = row["us"] / before - 1 if before else 0.0
+        flag = ""
+        if abs(row["us"] - before) >= MIN_DELTA_US:
+            if change > threshold:
+                flag = "REGRESSION"
+                regressions += 1
+            elif change < -threshold:
+                flag = "faster"
+        row["baseline_us"], row["change"], row["flag"] = f"{before:.2f}", f"{change:+.0%}", flag
+    return regressions
+
+
+def recheck(rows: List[Dict[str, Any]], min_time: float) -> None:
+    """Перемерить случаи с регрессией: единичный выброс (соседний процесс, частота CPU) — не регрессия."""
+    for row in rows:
+        if row.get("flag") == "REGRESSION":
+            setup, fn = row["rerun"]
+            setup()
+            fn()
+            row["us"] = min(row["us"], per_call(fn, min_time=min_time))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subjects", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 365])
+    parser.add_argument("--only", nargs="*", default=[], help="только случаи с этими префиксами (keyboards, data, ...)")
+    parser.add_argument("--min-time", type=float, default=0.1, help="минимальное время одного замера, с")
+    parser.add_argument("--rounds", type=int, default=3, help="прогонов всего набора; берётся лучший замер")
+    parser.add_argument("--save", metavar="FILE", help="сохранить результаты как базовую линию (JSON)")
+    parser.add_argument("--compare", metavar="FILE", help="сравнить с базовой линией")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # Лучший из нескольких прогонов: шум (соседние процессы, частота CPU) только замедляет
+    rows = run(args.subjects, args.days, args.only, args.min_time)
+    for _ in range(args.rounds - 1):
+        for row, again in zip(rows, run(args.subjects, args.days, args.only, args.min_time)):
+            row["us"] = min(row["us"], again["us"])
+    columns = ["case", "subjects", "days", "us"]
+    regressions = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        if compare(rows, baseline, args.threshold):
+            recheck(rows, args.min_time)
+        regressions = compare(rows, baseline, args.threshold)
+        columns += ["baseline_us", "change", "flag"]
+    if args.save:
+        save_baseline(args.save, rows)
+    print(format_table([{**row, "us": f"{row['us']:.2f}"} for row in rows], columns))
+    if args.compare:
+        print(f"\nРегрессий (медленнее больше чем на {args.threshold:.0%}): {regressions}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
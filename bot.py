@@ -5,12 +5,15 @@
 """
 
 import os
+import asyncio
 import logging
 import json
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
+from bot.stats import configure_stats, count_update, format_summary, get_stats, start_stats, stop_stats
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -19,6 +22,12 @@ logging.basicConfig(
 
 # Файл для данных
 DATA_FILE = "bot_data.json"
+# Журнал мелких изменений (счётчик сообщений, пользователи) между полными записями DATA_FILE
+JOURNAL_FILE = "bot_data.journal"
+# Как часто (сек) сбрасывать накопленные изменения на диск
+SAVE_INTERVAL = float(os.getenv("SAVE_INTERVAL_SECONDS") or 2.0)
+# После стольких строк журнал сворачивается в DATA_FILE
+JOURNAL_COMPACT_LINES = 1000
 
 def load_data():
     """Загрузить данные из файла"""
@@ -34,9 +43,151 @@ def load_data():
         }
 
 def save_data(data):
-    """Сохранить данные в файл"""
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
+    """Сохранить данные в файл (целиком, через временный файл)"""
+    tmp_file = DATA_FILE + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, DATA_FILE)
+
+
+class BotState:
+    """Данные бота в памяти: читаются с диска один раз при запуске.
+
+    Счётчик сообщений и пользователи меняются часто, поэтому не переписывают
+    весь файл: изменения копятся и раз в SAVE_INTERVAL секунд дописываются
+    строкой в журнал (время записи не зависит от числа пользователей).
+    Предметы и расписание меняются редко — сразу полная запись DATA_FILE.
+    Журнал сворачивается в DATA_FILE при запуске, остановке и по размеру.
+    """
+
+    def __init__(self):
+        self.data = load_data()
+        self.data.setdefault("subjects", [])
+        self.data.setdefault("schedule", {})
+        self.data.setdefault("messages_count", 0)
+        self.data.setdefault("users", {})
+        self._pending_users = {}
+        self._count_dirty = False
+        self._journal_lines = 0
+        if self._replay_journal():
+            self.compact()
+
+    def _replay_journal(self):
+        try:
+            with open(JOURNAL_FILE, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return False
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # оборванная последняя строка (бот упал во время записи)
+            if "messages_count" in entry:
+                self.data["messages_count"] = entry["messages_count"]
+            self.data["users"].update(entry.get("users", {}))
+        return True
+
+    @property
+    def subjects(self):
+        return self.data["subjects"]
+
+    @property
+    def schedule(self):
+        return self.data["schedule"]
+
+    def count_message(self):
+        self.data["messages_count"] += 1
+        self._count_dirty = True
+
+    def remember_user(self, user):
+        record = {
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name
+        }
+        user_id = str(user.id)
+        if self.data["users"].get(user_id) == record:
+            return  # повторный /start — писать нечего
+        self.data["users"][user_id] = record
+        self._pending_users[user_id] = record
+
+    def add_subject(self, name):
+        self.subjects.append(name)
+        self.compact()
+
+    def add_to_schedule(self, day, name):
+        self.schedule.setdefault(day, []).append(name)
+        self.compact()
+
+    def stats(self):
+        return len(self.subjects), self.data["messages_count"], len(self.data["users"])
+
+    def flush(self):
+        """Дописать накопленные изменения в журнал."""
+        if not self._pending_users and not self._count_dirty:
+            return
+        entry = {}
+        if self._count_dirty:
+            entry["messages_count"] = self.data["messages_count"]
+        if self._pending_users:
+            entry["users"] = self._pending_users
+        with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._pending_users = {}
+        self._count_dirty = False
+        self._journal_lines += 1
+        if self._journal_lines >= JOURNAL_COMPACT_LINES:
+            self.compact()
+
+    def compact(self):
+        """Записать всё в DATA_FILE и очистить журнал."""
+        save_data(self.data)
+        self._pending_users = {}
+        self._count_dirty = False
+        self._journal_lines = 0
+        try:
+            os.remove(JOURNAL_FILE)
+        except FileNotFoundError:
+            pass
+
+
+_state = None
+
+
+def get_state():
+    global _state
+    if _state is None:
+        _state = BotState()
+    return _state
+
+
+async def _flush_periodically():
+    while True:
+        await asyncio.sleep(SAVE_INTERVAL)
+        try:
+            get_state().flush()
+        except OSError as e:
+            logging.error(f"Не удалось сохранить данные: {e}")
+
+
+_flush_task = None
+
+
+async def on_startup(application):
+    global _flush_task
+    get_state()
+    _flush_task = asyncio.get_running_loop().create_task(_flush_periodically())
+    # Статистика использования (по часам и дням) — в stats.sqlite3
+    configure_stats(os.getenv("STATS_PATH") or "stats.sqlite3", os.getenv("TIMEZONE") or "Europe/Moscow")
+    start_stats()
+
+
+async def on_shutdown(application):
+    if _flush_task is not None:
+        _flush_task.cancel()
+    get_state().compact()
+    await stop_stats()
 
 # Создание клавиатур
 def get_main_menu_keyboard():
@@ -83,19 +234,8 @@ def get_day_keyboard(day):
 # Обработчики команд
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
-    user_id = update.effective_user.id
-    data = load_data()
-    
-    # Сохраняем информацию о пользователе
-    if "users" not in data:
-        data["users"] = {}
-    
-    data["users"][str(user_id)] = {
-        "username": update.effective_user.username,
-        "first_name": update.effective_user.first_name,
-        "last_name": update.effective_user.last_name
-    }
-    save_data(data)
+    # Сохраняем информацию о пользователе (на диск — при следующем сбросе)
+    get_state().remember_user(update.effective_user)
     
     await update.message.reply_text(
         "🤖 Добро пожаловать в бот управления расписанием!\n\n"
@@ -130,7 +270,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data.split(":")[1]
     
     if data == "subjects":
-        subjects = load_data().get("subjects", [])
+        subjects = get_state().subjects
         if not subjects:
             await query.edit_message_text(
                 "📝 Список предметов пуст.\nИспользуйте кнопку 'Добавить предмет' для создания нового предмета.",
@@ -156,17 +296,15 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["waiting_for_subject"] = True
     
     elif data == "stats":
-        data_obj = load_data()
-        subjects_count = len(data_obj.get("subjects", []))
-        messages_count = data_obj.get("messages_count", 0)
-        users_count = len(data_obj.get("users", {}))
+        subjects_count, messages_count, users_count = get_state().stats()
         
         await query.edit_message_text(
             f"📊 Статистика бота:\n\n"
             f"📚 Предметов: {subjects_count}\n"
             f"💬 Сообщений: {messages_count}\n"
             f"👥 Пользователей: {users_count}\n"
-            f"🏠 Хостинг: Timeweb",
+            f"🏠 Хостинг: Timeweb\n\n"
+            f"{format_summary(await get_stats().summary_async())}",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="back:main")]])
         )
     
@@ -187,8 +325,7 @@ async def subject_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     subject_index = int(query.data.split(":")[1])
-    data = load_data()
-    subjects = data.get("subjects", [])
+    subjects = get_state().subjects
     
     if subject_index < len(subjects):
         subject = subjects[subject_index]
@@ -219,9 +356,7 @@ async def day_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
     
     day_name = day_names.get(day, day)
-    data = load_data()
-    schedule = data.get("schedule", {})
-    day_subjects = schedule.get(day, [])
+    day_subjects = get_state().schedule.get(day, [])
     
     if not day_subjects:
         text = f"📅 {day_name}\n\nРасписание пусто."
@@ -268,8 +403,7 @@ async def back_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_main_menu_keyboard()
         )
     elif back_to == "subjects":
-        data = load_data()
-        subjects = data.get("subjects", [])
+        subjects = get_state().subjects
         await query.edit_message_text(
             "📚 Выберите предмет:",
             reply_markup=get_subjects_keyboard(subjects)
@@ -284,18 +418,14 @@ async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик текстовых сообщений"""
     user_text = update.message.text
     
-    # Увеличиваем счетчик сообщений
-    data = load_data()
-    data["messages_count"] = data.get("messages_count", 0) + 1
+    # Увеличиваем счетчик сообщений (в памяти; на диск — раз в SAVE_INTERVAL)
+    state = get_state()
+    state.count_message()
     
     # Проверяем, ждем ли мы ввод предмета
     if context.user_data.get("waiting_for_subject"):
         # Добавляем новый предмет
-        if "subjects" not in data:
-            data["subjects"] = []
-        
-        data["subjects"].append(user_text)
-        save_data(data)
+        state.add_subject(user_text)
         
         await update.message.reply_text(
             f"✅ Предмет '{user_text}' добавлен!",
@@ -306,13 +436,7 @@ async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif context.user_data.get("waiting_for_day_subject"):
         # Добавляем предмет в день недели
         day = context.user_data["waiting_for_day_subject"]
-        if "schedule" not in data:
-            data["schedule"] = {}
-        if day not in data["schedule"]:
-            data["schedule"][day] = []
-        
-        data["schedule"][day].append(user_text)
-        save_data(data)
+        state.add_to_schedule(day, user_text)
         
         await update.message.reply_text(
             f"✅ Предмет '{user_text}' добавлен в расписание!",
@@ -322,7 +446,6 @@ async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     else:
         # Обычное эхо-сообщение
-        save_data(data)
         await update.message.reply_text(
             f"💬 Вы написали: {user_text}\n\nИспользуйте /start для открытия главного меню.",
             reply_markup=get_main_menu_keyboard()
@@ -339,8 +462,11 @@ def main():
     logging.info("Starting Telegram bot...")
     
     # Создаем приложение
-    application = Application.builder().token(bot_token).build()
+    application = Application.builder().token(bot_token).post_init(on_startup).post_shutdown(on_shutdown).build()
     
+    # Счётчики статистики — для всех апдейтов, раньше остальных хендлеров
+    application.add_handler(TypeHandler(Update, count_update), group=-1)
+
     # Добавляем обработчики команд
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
@@ -0,0 +1,458 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from bot.telegram_api import RateLimiter, already_throttled, get_limiter
+
+
+BROADCAST_FILE = os.path.join(os.path.dirname(__file__), "broadcast.sqlite3")
+
+logger = logging.getLogger(__name__)
+
+# Как часто сохранять результаты рассылки и обновлять сообщение о прогрессе
+PROGRESS_INTERVAL = 3.0
+# Задание в работе у одного процесса, пока тот продлевает аренду; после
+# падения процесса задание подхватит другой (или он сам после перезапуска)
+LEASE_SECONDS = 60.0
+# Повторы при сетевых ошибках (на 429 повторяем всегда, выждав retry_after)
+MAX_NETWORK_ATTEMPTS = 3
+# Сколько недавних чатов помнить, чтобы не переписывать audience на каждый апдейт
+KNOWN_CHATS = 4096
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+# audience — чаты, которые писали боту (кому вообще можно отправить рассылку),
+# с классом, выбранным в чате. jobs/outbox — очередь рассылок: получатели
+# задания фиксируются при постановке в очередь, статус каждого сохраняется,
+# поэтому после перезапуска досылаются только недоставленные.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audience (
+    chat_id INTEGER PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    is_group INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS audience_tenant ON audience(tenant_id);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    parse_mode TEXT,
+    admin_chat_id INTEGER,
+    progress_message_id INTEGER,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    lease_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    chat_id INTEGER NOT NULL,
+    is_group INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    PRIMARY KEY (job_id, chat_id)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass(frozen=True)
+class BroadcastJob:
+    id: int
+    tenant_id: str
+    text: str
+    parse_mode: str | None = None
+    admin_chat_id: int | None = None
+    progress_message_id: int | None = None
+
+
+class BroadcastStore:
+    """Аудитория и очередь рассылок в SQLite (общий файл для процессов бота)."""
+
+    def __init__(self, path: str = BROADCAST_FILE) -> None:
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    # --- аудитория ----------------------------------------------------------
+
+    def remember(self, chat_id: int, tenant_id: str, is_group: bool) -> None:
+        self.conn.execute(
+            "INSERT INTO audience(chat_id, tenant_id, is_group, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET tenant_id = excluded.tenant_id, "
+            "is_group = excluded.is_group, updated_at = excluded.updated_at",
+            (chat_id, tenant_id, int(is_group), time.time()),
+        )
+
+    def forget(self, chat_id: int) -> None:
+        self.conn.execute("DELETE FROM audience WHERE chat_id = ?", (chat_id,))
+
+    def audience_size(self, tenant_id: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM audience WHERE tenant_id = ?", (tenant_id,)).fetchone()[0]
+
+    # --- задания ------------------------------------------------------------
+
+    def _transaction(self, fn, *args):  # type: ignore[no-untyped-def]
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, *args)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def create_job(
+        self, tenant_id: str, text: str, parse_mode: str | None = None, admin_chat_id: int | None = None
+    ) -> Tuple[int, int]:
+        """Поставить рассылку в очередь; вернуть (id задания, число получателей)."""
+
+        def create(conn: sqlite3.Connection) -> Tuple[int, int]:
+            job_id = conn.execute(
+                "INSERT INTO jobs(tenant_id, text, parse_mode, admin_chat_id, created_at) VALUES (?, ?, ?, ?, ?)",
+                (tenant_id, text, parse_mode, admin_chat_id, time.time()),
+            ).lastrowid
+            # Админ видит ход рассылки в своём сообщении — саму рассылку ему не шлём
+            count = conn.execute(
+                "INSERT INTO outbox(job_id, chat_id, is_group) "
+                "SELECT ?, chat_id, is_group FROM audience WHERE tenant_id = ? AND chat_id IS NOT ?",
+                (job_id, tenant_id, admin_chat_id),
+            ).rowcount
+            return job_id, count
+
+        return self._transaction(create)
+
+    def claim_job(self) -> BroadcastJob | None:
+        """Взять в работу самое старое незавершённое задание, которое никто не держит."""
+
+        def claim(conn: sqlite3.Connection) -> BroadcastJob | None:
+            now = time.time()
+            row = conn.execute(
+                "SELECT id, tenant_id, text, parse_mode, admin_chat_id, progress_message_id FROM jobs "
+                "WHERE finished_at IS NULL AND lease_until < ? ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (now + LEASE_SECONDS, row[0]))
+            return BroadcastJob(*row)
+
+        return self._transaction(claim)
+
+    def renew(self, job_id: int) -> None:
+        self.conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() + LEASE_SECONDS, job_id))
+
+    def release(self, job_id: int) -> None:
+        self.conn.execute("UPDATE jobs SET lease_until = 0 WHERE id = ? AND finished_at IS NULL", (job_id,))
+
+    def set_progress_message(self, job_id: int, message_id: int) -> None:
+        self.conn.execute("UPDATE jobs SET progress_message_id = ? WHERE id = ?", (message_id, job_id))
+
+    def pending(self, job_id: int, after_chat_id: int, limit: int = 500) -> List[Tuple[int, bool]]:
+        rows = self.conn.execute(
+            "SELECT chat_id, is_group FROM outbox WHERE job_id = ? AND chat_id > ? AND status = 'pending' "
+            "ORDER BY chat_id LIMIT ?",
+            (job_id, after_chat_id, limit),
+        )
+        return [(chat_id, bool(is_group)) for chat_id, is_group in rows]
+
+    def record(self, job_id: int, results: List[Tuple[int, str]]) -> None:
+        if not results:
+            return
+        self._transaction(
+            lambda conn: conn.executemany(
+                "UPDATE outbox SET status = ? WHERE job_id = ? AND chat_id = ?",
+                [(status, job_id, chat_id) for chat_id, status in results],
+            )
+        )
+
+    def counts(self, job_id: int) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM outbox WHERE job_id = ? GROUP BY status", (job_id,))
+        counts = {PENDING: 0, SENT: 0, FAILED: 0}
+        counts.update(dict(rows.fetchall()))
+        return counts
+
+    def finish(self, job_id: int) -> None:
+        self.conn.execute("UPDATE jobs SET finished_at = ?, lease_until = 0 WHERE id = ?", (time.time(), job_id))
+
+    def is_finished(self, job_id: int) -> bool:
+        row = self.conn.execute("SELECT finished_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or row[0] is not None
+
+    def unfinished(self) -> List[Tuple[int, str, Dict[str, int]]]:
+        ids = self.conn.execute("SELECT id, tenant_id FROM jobs WHERE finished_at IS NULL ORDER BY id").fetchall()
+        return [(job_id, tenant_id, self.counts(job_id)) for job_id, tenant_id in ids]
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def format_progress(job_id: int, counts: Dict[str, int], elapsed: float | None = None) -> str:
+    total = sum(counts.values())
+    done = counts[SENT] + counts[FAILED]
+    if elapsed is None:
+        return f"📣 Рассылка #{job_id}: {done} из {total}, не доставлено {counts[FAILED]}"
+    return (
+        f"✅ Рассылка #{job_id} завершена за {elapsed:.0f} с: "
+        f"доставлено {counts[SENT]}, не доставлено {counts[FAILED]}"
+    )
+
+
+class Broadcaster:
+    """Рассылки админа всем чатам класса.
+
+    Задания выполняются по одному в фоновой задаче: получатели читаются из
+    outbox порциями и раздаются `max_in_flight` отправителям, каждый из
+    которых ждёт своей очереди в RateLimiter. Ответ 429 приостанавливает всю
+    рассылку на retry_after. Результаты и сообщение о прогрессе у админа
+    обновляются раз в PROGRESS_INTERVAL.
+    """
+
+    def __init__(
+        self,
+        store: BroadcastStore,
+        limiter: RateLimiter | None = None,
+        max_in_flight: int = 8,
+        known_size: int = KNOWN_CHATS,
+    ) -> None:
+        self.store = store
+        # Общий с остальными отправками бота: лимиты Telegram одни на всех
+        self.limiter = limiter or get_limiter()
+        self.max_in_flight = max_in_flight
+        # Что уже записано в audience — для последних known_size чатов (LRU)
+        self.known_size = known_size
+        self._known: "OrderedDict[int, Tuple[str, bool]]" = OrderedDict()
+        self._wake = asyncio.Event()
+        self._finished: Dict[int, asyncio.Event] = {}
+        self._runner: asyncio.Task | None = None
+
+    # --- аудитория и очередь ------------------------------------------------
+
+    def remember(self, chat_id: int, tenant_id: str, is_group: bool = False) -> None:
+        """Запомнить чат как получателя рассылок класса (пишем только изменения)."""
+        if self._known.get(chat_id) == (tenant_id, is_group):
+            self._known.move_to_end(chat_id)
+            return
+        self._known[chat_id] = (tenant_id, is_group)
+        self._known.move_to_end(chat_id)
+        if len(self._known) > self.known_size:
+            self._known.popitem(last=False)
+        self.store.remember(chat_id, tenant_id, is_group)
+
+    def forget(self, chat_id: int) -> None:
+        self._known.pop(chat_id, None)
+        self.store.forget(chat_id)
+
+    def submit(
+        self, tenant_id: str, text: str, admin_chat_id: int | None = None, parse_mode: str | None = None
+    ) -> Tuple[int, int]:
+        job_id, count = self.store.create_job(tenant_id, text, parse_mode, admin_chat_id)
+        logger.info("Рассылка #%d класса %s: получателей %d", job_id, tenant_id, count)
+        self._wake.set()
+        return job_id, count
+
+    async def wait(self, job_id: int) -> None:
+        """Дождаться окончания рассылки (выполняемой этим процессом)."""
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        if not self.store.is_finished(job_id):
+            await event.wait()
+        self._finished.pop(job_id, None)
+
+    # --- выполнение ---------------------------------------------------------
+
+    def start(self, bot: Bot) -> None:
+        if self._runner is None:
+            self._runner = asyncio.get_running_loop().create_task(self._run(bot))
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        self.store.close()
+
+    async def _run(self, bot: Bot) -> None:
+        while True:
+            self._wake.clear()
+            job = self.store.claim_job()
+            if job is None:
+                # Иногда проверяем и без сигнала: задание мог бросить упавший процесс
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=LEASE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._process(bot, job)
+            except asyncio.CancelledError:
+                self.store.release(job.id)
+                raise
+            except Exception:
+                logger.exception("Рассылка #%d прервана, повторю позже", job.id)
+                await asyncio.sleep(PROGRESS_INTERVAL)
+
+    async def _process(self, bot: Bot, job: BroadcastJob) -> None:
+        started = time.monotonic()
+        counts = self.store.counts(job.id)
+        if job.admin_chat_id is not None and job.progress_message_id is None:
+            job = await self._post_progress(bot, job, counts)
+
+        results: List[Tuple[int, str]] = []
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_in_flight * 2)
+
+        async def sender() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                chat_id, is_group = item
+                results.append((chat_id, await self._send(bot, job, chat_id, is_group)))
+
+        def checkpoint() -> None:
+            batch = results[:]
+            del results[:]
+            self.store.record(job.id, batch)
+            for _, status in batch:
+                counts[PENDING] -= 1
+                counts[status] += 1
+            self.store.renew(job.id)
+
+        async def ticker() -> None:
+            while True:
+                await asyncio.sleep(PROGRESS_INTERVAL)
+                checkpoint()
+                await self._update_progress(bot, job, format_progress(job.id, counts))
+
+        senders = [asyncio.get_running_loop().create_task(sender()) for _ in range(self.max_in_flight)]
+        tick = asyncio.get_running_loop().create_task(ticker())
+        try:
+            after = -(2**63)
+            while True:
+                batch = self.store.pending(job.id, after)
+                if not batch:
+                    break
+                for item in batch:
+                    await queue.put(item)
+                after = batch[-1][0]
+            for _ in senders:
+                await queue.put(None)
+            await asyncio.gather(*senders)
+        finally:
+            tick.cancel()
+            for task in senders:
+                task.cancel()
+            await asyncio.gather(tick, *senders, return_exceptions=True)
+            # Сохраняем и при остановке бота: доставленное не уйдёт повторно
+            checkpoint()
+
+        self.store.finish(job.id)
+        elapsed = time.monotonic() - started
+        logger.info("Рассылка #%d: доставлено %d, ошибок %d за %.1f с", job.id, counts[SENT], counts[FAILED], elapsed)
+        await self._update_progress(bot, job, format_progress(job.id, counts, elapsed))
+        event = self._finished.get(job.id)
+        if event is not None:
+            event.set()
+
+    async def _send(self, bot: Bot, job: BroadcastJob, chat_id: int, is_group: bool) -> str:
+        attempts = 0
+        while True:
+            await self.limiter.acquire(chat_id, is_group)
+            try:
+                with already_throttled():
+                    await bot.send_message(chat_id, job.text, parse_mode=job.parse_mode)
+                return SENT
+            except RetryAfter as e:
+                # Лимит превышен — приостанавливаем все отправки, не только эту
+                logger.warning("Рассылка #%d: 429, пауза %s с", job.id, e.retry_after)
+                self.limiter.pause(e.retry_after)
+            except Forbidden:
+                # Бота заблокировали или удалили из группы
+                self.forget(chat_id)
+                return FAILED
+            except BadRequest as e:
+                logger.info("Рассылка #%d: чат %s: %s", job.id, chat_id, e)
+                return FAILED
+            except NetworkError:
+                attempts += 1
+                if attempts >= MAX_NETWORK_ATTEMPTS:
+                    return FAILED
+                await asyncio.sleep(2**attempts)
+            except TelegramError:
+                logger.exception("Рассылка #%d: не удалось отправить в чат %s", job.id, chat_id)
+                return FAILED
+
+    async def _post_progress(self, bot: Bot, job: BroadcastJob, counts: Dict[str, int]) -> BroadcastJob:
+        try:
+            await self.limiter.acquire(job.admin_chat_id)  # type: ignore[arg-type]
+            with already_throttled():
+                message = await bot.send_message(job.admin_chat_id, format_progress(job.id, counts))
+        except TelegramError:
+            logger.warning("Рассылка #%d: не удалось отправить прогресс админу", job.id)
+            return job
+        self.store.set_progress_message(job.id, message.message_id)
+        return BroadcastJob(job.id, job.tenant_id, job.text, job.parse_mode, job.admin_chat_id, message.message_id)
+
+    async def _update_progress(self, bot: Bot, job: BroadcastJob, text: str) -> None:
+        if job.admin_chat_id is None or job.progress_message_id is None:
+            return
+        for _ in range(2):
+            await self.limiter.acquire(job.admin_chat_id)
+            try:
+                with already_throttled():
+                    await bot.edit_message_text(text, chat_id=job.admin_chat_id, message_id=job.progress_message_id)
+                return
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramError:
+                return  # прогресс не важнее самой рассылки ("message is not modified" и т.п.)
+
+
+_broadcaster: Broadcaster | None = None
+
+
+def configure_broadcasts(path: str | None) -> Broadcaster:
+    global _broadcaster
+    _broadcaster = Broadcaster(BroadcastStore(path or BROADCAST_FILE))
+    return _broadcaster
+
+
+def get_broadcaster() -> Broadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = Broadcaster(BroadcastStore())
+    return _broadcaster
+
+
+def start_broadcasts(bot: Bot) -> None:
+    get_broadcaster().start(bot)
+
+
+async def stop_broadcasts() -> None:
+    if _broadcaster is not None:
+        await _broadcaster.stop()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, List
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов с сохранением порядка внутри одного пользователя/чата.
+
+    Апдейты одного пользователя идут строго по очереди (от этого зависит
+    состояние в context.user_data: edit_sched_day, edit_hw_subject и т.п.),
+    апдейты разных пользователей обрабатываются параллельно, не более
+    `max_workers` одновременно.
+
+    Семафор базового класса ограничивает число принятых, но ещё не обработанных
+    апдейтов (`max_pending`). Собственный семафор воркеров берётся уже после
+    очереди пользователя, поэтому ждущие апдейты одного пользователя не занимают
+    воркеры, нужные остальным.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int = 1024) -> None:
+        super().__init__(max(max_pending, max_workers))
+        self.max_workers = max_workers
+        self._workers = asyncio.BoundedSemaphore(max_workers)
+        # ключ → [lock, сколько апдейтов этого ключа сейчас принято]
+        self._locks: Dict[Hashable, List[Any]] = {}
+        self.pending = 0  # приняты, ждут своей очереди или свободного воркера
+        self.in_flight = 0  # обрабатываются прямо сейчас
+        self.max_pending_seen = 0
+        self.processed = 0
+
+    @staticmethod
+    def ordering_key(update: object) -> Hashable | None:
+        if isinstance(update, Update):
+            if update.effective_user:
+                return ("user", update.effective_user.id)
+            if update.effective_chat:
+                return ("chat", update.effective_chat.id)
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "in_flight": self.in_flight,
+            "max_pending_seen": self.max_pending_seen,
+            "processed": self.processed,
+            "active_keys": len(self._locks),
+        }
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.ordering_key(update)
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # asyncio.Lock отдаётся ждущим в порядке очереди — порядок апдейтов сохраняется
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        async with self._workers:
+            self.pending -= 1
+            self.in_flight += 1
+            try:
+                await coroutine
+            finally:
+                self.in_flight -= 1
+                self.processed += 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
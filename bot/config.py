@@ -1,18 +1,114 @@
+import logging
 import os
+import re
 from dataclasses import dataclass
 from typing import Final
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from dotenv import load_dotenv
 
 
+logger = logging.getLogger(__name__)
+
+
 @dataclass(frozen=True)
 class Settings:
     bot_token: str
     admin_user_id: int | None = None
+    # Все админы: ADMIN_USER_ID плюс список ADMIN_USER_IDS (через запятую)
+    admin_ids: frozenset[int] = frozenset()
+    # Как часто (сек) фоновая запись сбрасывает накопленные правки в data.json
+    save_interval: float = 2.0
+    # Хранилище данных: "json" (data.json + журнал) или "sqlite"
+    storage_backend: str = "json"
+    storage_path: str | None = None
+    # Данные остальных классов (см. /class); основной класс — storage_path
+    tenants_dir: str | None = None
+    # Сколько классов держать в памяти и через сколько секунд простоя выгружать
+    max_active_tenants: int = 16
+    tenant_idle_seconds: float = 600.0
+    # Режим получения апдейтов: "polling" или "webhook"
+    mode: str = "polling"
+    # Публичный адрес бота (https://...); если пуст — вебхук не регистрируется ботом
+    webhook_url: str | None = None
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_path: str = "/telegram"
+    webhook_secret: str | None = None
+    webhook_max_connections: int = 40
+    # Адрес Bot API (свой telegram-bot-api или поддельный для нагрузочного теста); пусто — api.telegram.org
+    bot_api_base_url: str | None = None
+    # Сколько процессов бота запускает python -m bot.workers (общая база SQLite)
+    workers: int = 1
+    # Сколько апдейтов обрабатывать параллельно (1 — строго по очереди, как раньше)
+    concurrent_updates: int = 1
+    # Сколько апдейтов можно принять в обработку, пока заняты воркеры
+    max_pending_updates: int = 1024
+    # Состояние диалогов (context.user_data): "sqlite" (переживает перезапуск,
+    # общее для нескольких процессов) или "memory"
+    state_backend: str = "sqlite"
+    state_path: str | None = None
+    # Через сколько секунд без активности забывается недоделанное редактирование
+    state_ttl: float = 86400.0
+    # Как часто (сек) изменения состояния пачкой пишутся на диск
+    state_flush_interval: float = 5.0
+    # Напоминания о ДЗ (/subscribe): время и часовой пояс по умолчанию, файл подписок
+    reminder_time: str = "19:00"
+    timezone: str = "Europe/Moscow"
+    subscriptions_path: str | None = None
+    # Рассылки админа (/broadcast): файл очереди. broadcast_rate — сколько сообщений
+    # в секунду бот отправляет всего (рассылки, напоминания и обычные ответы)
+    broadcast_path: str | None = None
+    # Архив ДЗ (кнопка «Прошлые задания»): файл SQLite
+    history_path: str | None = None
+    # Статистика использования: файл SQLite и как часто (сек) сбрасывать в него счётчики
+    stats_path: str | None = None
+    stats_flush_interval: float = 60.0
+    # Метрики для Prometheus (GET /metrics); порт 0 — выключены
+    metrics_listen: str = "127.0.0.1"
+    metrics_port: int = 0
+    broadcast_rate: float = 30.0
+    # Сколько последних сообщений помнить, чтобы не слать правки без изменений (0 — не помнить);
+    # private_only — только личные чаты (так запускает воркеры python -m bot.workers)
+    edit_cache_size: int = 4096
+    edit_cache_private_only: bool = False
+    # Навигация: "reply" — клавиатура внизу экрана, «В меню» присылает новое сообщение;
+    # "inline" — одно сообщение с меню на чат, кнопки правят его на месте
+    nav_mode: str = "reply"
 
+    def is_admin(self, user_id: int | None) -> bool:
+        if not self.admin_ids:
+            return True  # если админ не задан, считаем что доступ открыт
+        return user_id in self.admin_ids
 
-def get_settings() -> Settings:
-    load_dotenv()
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        raise RuntimeError(f"{name} должен быть числом")
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise RuntimeError(f"{name} должен быть целым числом")
+
+
+def load_settings(reload_dotenv: bool = False) -> Settings:
+    """Прочитать настройки из окружения и .env (без кеша).
+
+    reload_dotenv=True — значения из .env перекрывают уже загруженные,
+    чтобы правка .env применялась при горячей перезагрузке.
+    """
+    load_dotenv(override=reload_dotenv)
 
     env_var_name: Final[str] = "BOT_TOKEN"
     token = os.getenv(env_var_name)
@@ -29,6 +125,118 @@ def get_settings() -> Settings:
         except ValueError:
             raise RuntimeError("ADMIN_USER_ID должен быть числом (telegram user id)")
 
-    return Settings(bot_token=token, admin_user_id=admin_user_id)
+    admin_ids = {admin_user_id} if admin_user_id is not None else set()
+    for part in (os.getenv("ADMIN_USER_IDS") or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            admin_ids.add(int(part))
+        except ValueError:
+            raise RuntimeError("ADMIN_USER_IDS должен быть списком чисел через запятую")
+
+    storage_backend = (os.getenv("STORAGE_BACKEND") or "json").strip().lower()
+    if storage_backend not in ("json", "sqlite"):
+        raise RuntimeError("STORAGE_BACKEND должен быть json или sqlite")
+
+    state_backend = (os.getenv("STATE_BACKEND") or "sqlite").strip().lower()
+    if state_backend not in ("sqlite", "memory"):
+        raise RuntimeError("STATE_BACKEND должен быть sqlite или memory")
+
+    mode = (os.getenv("BOT_MODE") or "polling").strip().lower()
+    if mode not in ("polling", "webhook"):
+        raise RuntimeError("BOT_MODE должен быть polling или webhook")
+    webhook_path = os.getenv("WEBHOOK_PATH") or "/telegram"
+    if not webhook_path.startswith("/"):
+        webhook_path = "/" + webhook_path
+
+    reminder_time = (os.getenv("REMINDER_TIME") or "19:00").strip()
+    if not re.match(r"^([01]?\d|2[0-3]):[0-5]\d$", reminder_time):
+        raise RuntimeError("REMINDER_TIME должен быть временем ЧЧ:ММ, например 19:00")
+    reminder_time = reminder_time.zfill(5)
+    timezone = (os.getenv("TIMEZONE") or "Europe/Moscow").strip()
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise RuntimeError(f"TIMEZONE: неизвестный часовой пояс {timezone!r} (пример: Europe/Moscow)")
+
+    nav_mode = (os.getenv("NAV_MODE") or "reply").strip().lower()
+    if nav_mode not in ("reply", "inline"):
+        raise RuntimeError("NAV_MODE должен быть reply или inline")
+
+    workers = max(1, _env_int("WORKERS", 1))
+    if workers > 1:
+        # Процессы делят данные и состояние диалогов только через SQLite,
+        # а апдейты получают от главного процесса через вебхук
+        if mode != "webhook":
+            raise RuntimeError("WORKERS > 1 работает только с BOT_MODE=webhook")
+        if storage_backend != "sqlite" or state_backend != "sqlite":
+            raise RuntimeError("WORKERS > 1 требует STORAGE_BACKEND=sqlite и STATE_BACKEND=sqlite")
+
+    return Settings(
+        bot_token=token,
+        admin_user_id=admin_user_id,
+        admin_ids=frozenset(admin_ids),
+        save_interval=_env_float("SAVE_INTERVAL_SECONDS", 2.0),
+        storage_backend=storage_backend,
+        storage_path=os.getenv("STORAGE_PATH") or None,
+        tenants_dir=os.getenv("TENANTS_DIR") or None,
+        max_active_tenants=max(1, _env_int("MAX_ACTIVE_TENANTS", 16)),
+        tenant_idle_seconds=_env_float("TENANT_IDLE_SECONDS", 600.0),
+        mode=mode,
+        webhook_url=os.getenv("WEBHOOK_URL") or None,
+        webhook_listen=os.getenv("WEBHOOK_LISTEN") or "0.0.0.0",
+        # PORT выставляют Railway/Render/Heroku
+        webhook_port=_env_int("WEBHOOK_PORT", _env_int("PORT", 8080)),
+        webhook_path=webhook_path,
+        webhook_secret=os.getenv("WEBHOOK_SECRET") or None,
+        bot_api_base_url=os.getenv("BOT_API_BASE_URL") or None,
+        webhook_max_connections=_env_int("WEBHOOK_MAX_CONNECTIONS", 40),
+        workers=workers,
+        concurrent_updates=max(1, _env_int("CONCURRENT_UPDATES", 1)),
+        max_pending_updates=max(1, _env_int("MAX_PENDING_UPDATES", 1024)),
+        state_backend=state_backend,
+        state_path=os.getenv("STATE_PATH") or None,
+        state_ttl=_env_float("STATE_TTL_SECONDS", 86400.0),
+        state_flush_interval=_env_float("STATE_FLUSH_INTERVAL_SECONDS", 5.0),
+        reminder_time=reminder_time,
+        timezone=timezone,
+        subscriptions_path=os.getenv("SUBSCRIPTIONS_PATH") or None,
+        broadcast_path=os.getenv("BROADCAST_PATH") or None,
+        history_path=os.getenv("HISTORY_PATH") or None,
+        stats_path=os.getenv("STATS_PATH") or None,
+        stats_flush_interval=max(1.0, _env_float("STATS_FLUSH_SECONDS", 60.0)),
+        metrics_listen=os.getenv("METRICS_LISTEN") or "127.0.0.1",
+        metrics_port=max(0, _env_int("METRICS_PORT", 0)),
+        broadcast_rate=max(0.1, _env_float("BROADCAST_RATE", 30.0)),
+        edit_cache_size=max(0, _env_int("EDIT_CACHE_SIZE", 4096)),
+        nav_mode=nav_mode,
+        edit_cache_private_only=os.getenv("EDIT_CACHE_PRIVATE_ONLY", "").strip().lower() in ("1", "true", "yes"),
+    )
+
+
+_settings: Settings | None = None
+
+
+def get_settings() -> Settings:
+    """Настройки, прочитанные один раз; вызывать можно на каждом апдейте."""
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
 
+def reload_settings() -> Settings:
+    """Перечитать .env и окружение (/reload, SIGHUP).
 
+    При ошибке в новых настройках остаются прежние. Токен и хранилище
+    подхватываются только при перезапуске бота.
+    """
+    global _settings
+    try:
+        _settings = load_settings(reload_dotenv=True)
+    except RuntimeError:
+        if _settings is None:
+            raise
+        logger.exception("Не удалось перечитать настройки, оставляю прежние")
+    return _settings
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import copy
+from bisect import insort
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 
 
 # Ключи дней недели (ru): mon..sun
@@ -29,7 +34,7 @@ class Subject:
 
 
 # Статичный список предметов и ДЗ (пример — поменяйте под себя)
-SUBJECTS: Dict[SubjectKey, Subject] = {
+_DEFAULT_SUBJECTS: Dict[SubjectKey, Subject] = {
     "math": Subject("math", "Математика", "Решить задачи №1-10 на стр. 25"),
     "rus": Subject("rus", "Русский язык", "Упражнение 34, правило выучить"),
     "eng": Subject("eng", "Английский язык", "Выучить слова unit 3, упр. 5"),
@@ -45,7 +50,7 @@ SUBJECTS: Dict[SubjectKey, Subject] = {
 
 # Расписание: для каждого дня — список предметов по порядку уроков
 # Время уроков можно не указывать; нумерация позиций даёт порядок
-SCHEDULE: Dict[DayKey, List[SubjectKey]] = {
+_DEFAULT_SCHEDULE: Dict[DayKey, List[SubjectKey]] = {
     "mon": ["math", "rus", "eng", "cs"],
     "tue": ["hist", "phys", "chem", "math"],
     "wed": ["bio", "lit", "eng"],
@@ -56,6 +61,127 @@ SCHEDULE: Dict[DayKey, List[SubjectKey]] = {
 }
 
 
+# ---------------------------------------------------------------------------
+# Классы (tenants)
+#
+# Один процесс обслуживает несколько классов, у каждого свои предметы и
+# расписание — DataStore. Текущий класс хранится в contextvar и выставляется
+# на время обработки апдейта (bot.tenants.use_tenant). SUBJECTS и SCHEDULE —
+# прокси на словари текущего класса, поэтому код ниже и в других модулях
+# работает с ними как с обычными dict.
+# ---------------------------------------------------------------------------
+
+DEFAULT_TENANT = "default"
+
+# Обратный индекс (см. ниже): предмет → {день: [позиции уроков]}
+SubjectIndex = Dict[SubjectKey, Dict[DayKey, List[int]]]
+
+
+class DataStore:
+    """Данные одного класса и всё, что из них выводится."""
+
+    def __init__(
+        self,
+        tenant_id: str,
+        subjects: Dict[SubjectKey, Subject] | None = None,
+        schedule: Dict[DayKey, List[SubjectKey]] | None = None,
+    ) -> None:
+        self.tenant_id = tenant_id
+        self.subjects: Dict[SubjectKey, Subject] = subjects if subjects is not None else {}
+        self.schedule: Dict[DayKey, List[SubjectKey]] = schedule if schedule is not None else {}
+        self.subject_index: SubjectIndex = {}
+        self.version = 0
+        # Состояние других модулей, привязанное к этим данным: кеши, хранилище
+        self.extras: Dict[str, Any] = {}
+
+    def __repr__(self) -> str:
+        return f"DataStore({self.tenant_id!r})"
+
+
+class _CurrentStoreDict(MutableMapping):
+    """dict текущего класса (атрибут DataStore по имени)."""
+
+    __slots__ = ("_attr",)
+
+    def __init__(self, attr: str) -> None:
+        self._attr = attr
+
+    def _target(self) -> Dict[Any, Any]:
+        return getattr(_CURRENT_STORE.get(), self._attr)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._target()[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self._target()[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        del self._target()[key]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._target())
+
+    def __len__(self) -> int:
+        return len(self._target())
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._target()
+
+    # Частые методы — напрямую, без обёрток MutableMapping
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self._target().get(key, default)
+
+    def keys(self):  # type: ignore[override]
+        return self._target().keys()
+
+    def values(self):  # type: ignore[override]
+        return self._target().values()
+
+    def items(self):  # type: ignore[override]
+        return self._target().items()
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        return self._target().setdefault(key, default)
+
+    def clear(self) -> None:
+        self._target().clear()
+
+    # copy/deepcopy дают снимок данных текущего класса, а не ещё один прокси
+    def __copy__(self) -> Dict[Any, Any]:
+        return dict(self._target())
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[Any, Any]:
+        return copy.deepcopy(self._target(), memo)
+
+    def __repr__(self) -> str:
+        return repr(self._target())
+
+
+_DEFAULT_STORE = DataStore(DEFAULT_TENANT, _DEFAULT_SUBJECTS, _DEFAULT_SCHEDULE)
+_CURRENT_STORE: ContextVar[DataStore] = ContextVar("current_store", default=_DEFAULT_STORE)
+
+SUBJECTS: Dict[SubjectKey, Subject] = _CurrentStoreDict("subjects")  # type: ignore[assignment]
+SCHEDULE: Dict[DayKey, List[SubjectKey]] = _CurrentStoreDict("schedule")  # type: ignore[assignment]
+
+
+def current_store() -> DataStore:
+    return _CURRENT_STORE.get()
+
+
+def get_default_store() -> DataStore:
+    return _DEFAULT_STORE
+
+
+@contextmanager
+def using_store(store: DataStore) -> Iterator[DataStore]:
+    """Сделать store текущим внутри блока with."""
+    token = _CURRENT_STORE.set(store)
+    try:
+        yield store
+    finally:
+        _CURRENT_STORE.reset(token)
+
+
 def list_subjects() -> List[Subject]:
     return list(SUBJECTS.values())
 
@@ -69,16 +195,24 @@ def get_day_label(day_key: DayKey) -> str:
 
 
 def get_schedule_for_day(day_key: DayKey) -> List[Tuple[int, Subject]]:
-    keys = SCHEDULE.get(day_key, [])
-    return [(idx + 1, SUBJECTS[k]) for idx, k in enumerate(keys) if k in SUBJECTS]
+    store = _CURRENT_STORE.get()
+    subjects = store.subjects
+    keys = store.schedule.get(day_key, [])
+    return [(idx + 1, subjects[k]) for idx, k in enumerate(keys) if k in subjects]
+
+
+def get_day_keys_for_subject(subject_key: SubjectKey) -> List[DayKey]:
+    return list(_index().get(subject_key, {}))
 
 
 def get_days_for_subject(subject_key: SubjectKey) -> List[Tuple[str, int]]:
+    by_day = _index().get(subject_key)
+    if not by_day:
+        return []
     result: List[Tuple[str, int]] = []
-    for day_key, subjects in SCHEDULE.items():
-        for idx, k in enumerate(subjects):
-            if k == subject_key:
-                result.append((get_day_label(day_key), idx + 1))
+    for day_key in sorted(by_day, key=_day_sort_key):
+        for idx in by_day[day_key]:
+            result.append((get_day_label(day_key), idx + 1))
     return result
 
 
@@ -95,4 +229,307 @@ def get_tomorrow_day_key(now: datetime | None = None) -> DayKey:
     return mapping[idx]
 
 
+# ---------------------------------------------------------------------------
+# Обратный индекс: предмет → {день: [позиции уроков (с нуля), по возрастанию]}
+#
+# Поддерживается каждой правкой расписания, поэтому поиск дней предмета и
+# каскадное удаление предмета не обходят всё расписание.
+# ---------------------------------------------------------------------------
+
+def _index() -> SubjectIndex:
+    return _CURRENT_STORE.get().subject_index
+
+
+_DAY_ORDER: Dict[DayKey, int] = {dk: i for i, dk in enumerate(get_all_day_keys())}
+
+
+def _day_sort_key(day_key: DayKey) -> Tuple[int, str]:
+    # Порядок как в клавиатурах: пн..вс, затем нестандартные ключи
+    return (_DAY_ORDER.get(day_key, len(_DAY_ORDER)), day_key)
+
+
+def _index_add(subject_key: SubjectKey, day_key: DayKey, pos: int) -> None:
+    insort(_index().setdefault(subject_key, {}).setdefault(day_key, []), pos)
+
+
+def _index_remove(subject_key: SubjectKey, day_key: DayKey, pos: int) -> None:
+    index = _index()
+    by_day = index[subject_key]
+    positions = by_day[day_key]
+    positions.remove(pos)
+    if not positions:
+        del by_day[day_key]
+        if not by_day:
+            del index[subject_key]
+
+
+def _index_day(day_key: DayKey) -> None:
+    index = _index()
+    for pos, subject_key in enumerate(SCHEDULE.get(day_key, [])):
+        index.setdefault(subject_key, {}).setdefault(day_key, []).append(pos)
+
+
+def _unindex_day(day_key: DayKey) -> None:
+    index = _index()
+    for subject_key in set(SCHEDULE.get(day_key, [])):
+        by_day = index.get(subject_key)
+        if by_day and by_day.pop(day_key, None) is not None and not by_day:
+            del index[subject_key]
+
+
+def _build_subject_index() -> SubjectIndex:
+    index: SubjectIndex = {}
+    for day_key, keys in SCHEDULE.items():
+        for pos, subject_key in enumerate(keys):
+            index.setdefault(subject_key, {}).setdefault(day_key, []).append(pos)
+    return index
+
+
+def rebuild_subject_index() -> None:
+    """Перестроить индекс целиком — после замены SCHEDULE (загрузка с диска)."""
+    index = _index()
+    index.clear()
+    index.update(_build_subject_index())
+
+
+# ---------------------------------------------------------------------------
+# Версия данных: растёт при любом изменении SUBJECTS/SCHEDULE (своя у каждого класса).
+# Кеши (клавиатуры и т.п.) сравнивают её со своей и сбрасываются при расхождении.
+# ---------------------------------------------------------------------------
+
+
+def get_data_version() -> int:
+    return _CURRENT_STORE.get().version
+
+
+def bump_data_version() -> None:
+    _CURRENT_STORE.get().version += 1
+
+
+_RELOAD_LISTENERS: List[Callable[[], None]] = []
+
+
+def add_reload_listener(listener: Callable[[], None]) -> None:
+    if listener not in _RELOAD_LISTENERS:
+        _RELOAD_LISTENERS.append(listener)
+
+
+def data_replaced() -> None:
+    """Вызывается после замены SUBJECTS/SCHEDULE целиком (загрузка с диска)."""
+    rebuild_subject_index()
+    bump_data_version()
+    for listener in list(_RELOAD_LISTENERS):
+        listener()
+
+
+def check_subject_index() -> List[str]:
+    """Сверить индекс с SCHEDULE. Возвращает список расхождений (пустой — всё в порядке)."""
+    expected = _build_subject_index()
+    index = _index()
+    problems: List[str] = []
+    for subject_key in sorted(set(expected) | set(index)):
+        want = expected.get(subject_key, {})
+        have = index.get(subject_key, {})
+        for day_key in sorted(set(want) | set(have)):
+            if want.get(day_key) != have.get(day_key):
+                problems.append(
+                    f"{subject_key}@{day_key}: в индексе {have.get(day_key)}, в расписании {want.get(day_key)}"
+                )
+    return problems
+
+
+rebuild_subject_index()
+
+
+# ---------------------------------------------------------------------------
+# Изменение данных
+#
+# Все правки SUBJECTS/SCHEDULE идут через функции ниже. Каждая правка
+# описывается компактной записью (dict с ключом "op"), которую можно
+# сохранить в журнал и потом воспроизвести через apply_mutation().
+# ---------------------------------------------------------------------------
+
+Mutation = Dict[str, Any]
+MutationListener = Callable[[Mutation], None]
+
+_LISTENERS: List[MutationListener] = []
+
+
+def add_mutation_listener(listener: MutationListener) -> None:
+    if listener not in _LISTENERS:
+        _LISTENERS.append(listener)
+
+
+def remove_mutation_listener(listener: MutationListener) -> None:
+    if listener in _LISTENERS:
+        _LISTENERS.remove(listener)
+
+
+def _apply_set_homework(op: Mutation) -> bool:
+    subject = SUBJECTS.get(op["subject"])
+    if not subject:
+        return False
+    SUBJECTS[subject.key] = Subject(key=subject.key, name=subject.name, homework=op["value"])
+    return True
+
+
+def _apply_rename_subject(op: Mutation) -> bool:
+    subject = SUBJECTS.get(op["subject"])
+    if not subject:
+        return False
+    SUBJECTS[subject.key] = Subject(key=subject.key, name=op["value"], homework=subject.homework)
+    return True
+
+
+def _apply_add_subject(op: Mutation) -> bool:
+    key = op["subject"]
+    if key in SUBJECTS:
+        return False
+    SUBJECTS[key] = Subject(key=key, name=op["name"], homework=op.get("value", ""))
+    return True
+
+
+def _apply_delete_subject(op: Mutation) -> bool:
+    key = op["subject"]
+    if SUBJECTS.pop(key, None) is None:
+        return False
+    # Удаляем предмет из расписания — только в тех днях, где он есть по индексу
+    for day_key in list(_index().get(key, {})):
+        _unindex_day(day_key)
+        SCHEDULE[day_key] = [k for k in SCHEDULE[day_key] if k != key]
+        _index_day(day_key)
+    return True
+
+
+def _apply_add_lesson(op: Mutation) -> bool:
+    if op["subject"] not in SUBJECTS:
+        return False
+    items = SCHEDULE.setdefault(op["day"], [])
+    items.append(op["subject"])
+    _index_add(op["subject"], op["day"], len(items) - 1)
+    return True
+
+
+def _apply_remove_lesson(op: Mutation) -> bool:
+    day_key = op["day"]
+    items = SCHEDULE.get(day_key, [])
+    idx = op["index"]
+    if not (0 <= idx < len(items)):
+        return False
+    _index_remove(items[idx], day_key, idx)
+    del items[idx]
+    # Уроки после удалённого сдвигаются на одну позицию вверх
+    index = _index()
+    for pos in range(idx, len(items)):
+        positions = index[items[pos]][day_key]
+        positions[positions.index(pos + 1)] = pos
+    return True
+
+
+def _apply_replace_lesson(op: Mutation) -> bool:
+    day_key = op["day"]
+    items = SCHEDULE.get(day_key, [])
+    idx = op["index"]
+    if op["subject"] not in SUBJECTS or not (0 <= idx < len(items)):
+        return False
+    _index_remove(items[idx], day_key, idx)
+    items[idx] = op["subject"]
+    _index_add(op["subject"], day_key, idx)
+    return True
+
+
+def _apply_clear_day(op: Mutation) -> bool:
+    if not SCHEDULE.get(op["day"]):
+        return False
+    _unindex_day(op["day"])
+    SCHEDULE[op["day"]] = []
+    return True
+
+
+def _apply_create_day(op: Mutation) -> bool:
+    if op["day"] in SCHEDULE:
+        return False
+    SCHEDULE[op["day"]] = []
+    return True
+
+
+def _apply_delete_day(op: Mutation) -> bool:
+    if op["day"] not in SCHEDULE:
+        return False
+    _unindex_day(op["day"])
+    del SCHEDULE[op["day"]]
+    return True
+
+
+_APPLIERS: Dict[str, Callable[[Mutation], bool]] = {
+    "set_homework": _apply_set_homework,
+    "rename_subject": _apply_rename_subject,
+    "add_subject": _apply_add_subject,
+    "delete_subject": _apply_delete_subject,
+    "add_lesson": _apply_add_lesson,
+    "remove_lesson": _apply_remove_lesson,
+    "replace_lesson": _apply_replace_lesson,
+    "clear_day": _apply_clear_day,
+    "create_day": _apply_create_day,
+    "delete_day": _apply_delete_day,
+}
+
+
+def apply_mutation(op: Mutation, notify: bool = True) -> bool:
+    """Применить правку. Возвращает False, если она ничего не изменила.
+
+    notify=False используется при воспроизведении журнала на старте,
+    чтобы правка не записалась в журнал повторно.
+    """
+    applier = _APPLIERS.get(op.get("op", ""))
+    if applier is None:
+        raise ValueError(f"Неизвестная операция: {op.get('op')!r}")
+    changed = applier(op)
+    if changed:
+        bump_data_version()
+    if changed and notify:
+        for listener in list(_LISTENERS):
+            listener(op)
+    return changed
+
+
+def set_homework(subject_key: SubjectKey, homework: str) -> bool:
+    return apply_mutation({"op": "set_homework", "subject": subject_key, "value": homework})
+
+
+def rename_subject(subject_key: SubjectKey, name: str) -> bool:
+    return apply_mutation({"op": "rename_subject", "subject": subject_key, "value": name})
+
+
+def add_subject(subject_key: SubjectKey, name: str, homework: str = "") -> bool:
+    return apply_mutation({"op": "add_subject", "subject": subject_key, "name": name, "value": homework})
+
+
+def delete_subject(subject_key: SubjectKey) -> bool:
+    return apply_mutation({"op": "delete_subject", "subject": subject_key})
+
+
+def add_lesson(day_key: DayKey, subject_key: SubjectKey) -> bool:
+    return apply_mutation({"op": "add_lesson", "day": day_key, "subject": subject_key})
+
+
+def remove_lesson(day_key: DayKey, index: int) -> bool:
+    """Удалить урок по индексу (с нуля)."""
+    return apply_mutation({"op": "remove_lesson", "day": day_key, "index": index})
+
+
+def replace_lesson(day_key: DayKey, index: int, subject_key: SubjectKey) -> bool:
+    """Заменить предмет урока по индексу (с нуля)."""
+    return apply_mutation({"op": "replace_lesson", "day": day_key, "index": index, "subject": subject_key})
+
+
+def clear_day(day_key: DayKey) -> bool:
+    return apply_mutation({"op": "clear_day", "day": day_key})
+
+
+def create_day(day_key: DayKey) -> bool:
+    return apply_mutation({"op": "create_day", "day": day_key})
+
 
+def delete_day(day_key: DayKey) -> bool:
+    return apply_mutation({"op": "delete_day", "day": day_key})
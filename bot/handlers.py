@@ -1,20 +1,38 @@
+import asyncio
+import html
+from dataclasses import replace
+from datetime import datetime
+
 from telegram import Update
-from telegram.constants import ParseMode
+from telegram.constants import ChatType, ParseMode
 from telegram.ext import ContextTypes, CallbackQueryHandler
-from telegram.error import BadRequest
+from telegram.error import TelegramError
 
 from bot.data import (
-    get_schedule_for_day,
+    DEFAULT_TENANT,
+    current_store,
     get_subject_by_key,
     get_tomorrow_day_key,
     get_day_label,
     SUBJECTS,
-    Subject,
     SCHEDULE,
+    add_lesson,
+    add_subject,
+    clear_day,
+    create_day,
+    delete_day,
+    delete_subject,
+    remove_lesson,
+    rename_subject,
+    replace_lesson,
+    set_homework,
 )
 from bot.keyboards import (
     build_main_menu_keyboard,
+    build_main_menu_inline_keyboard,
     build_subjects_keyboard,
+    build_subject_card_keyboard,
+    build_history_keyboard,
     build_days_keyboard,
     build_subjects_keyboard_with_prefix,
     build_days_keyboard_with_prefix,
@@ -27,24 +45,42 @@ from bot.keyboards import (
     build_days_to_create_keyboard,
     build_days_to_delete_keyboard,
     build_subjects_keyboard_for_day_add,
+    build_notify_homework_keyboard,
+    build_stats_keyboard,
 )
-from bot.storage import load_data, save_data
-from bot.config import get_settings
-
-
-async def safe_edit_message(query, text: str, reply_markup=None):
-    """Безопасное редактирование сообщения с обработкой ошибки 'Message is not modified'"""
+from bot.broadcast import get_broadcaster
+from bot.routing import CallbackRouter
+from bot.reminders import Subscription, get_scheduler, is_valid_timezone, parse_time
+from bot.render import render_day_editor, render_day_schedule, render_homework_for_day
+from bot.history import format_history_page, get_history
+from bot.metrics import get_metrics
+from bot.search import search_homework, transliterate
+from bot.stats import format_summary, get_stats
+from bot.telegram_api import MessageGone, get_api_stats
+from bot.storage import flush_data, list_tenants, load_data, tenant_exists
+from bot.tenants import TENANT_KEY, is_valid_tenant_id, resolve_tenant_id, tenant_handler, use_tenant
+from bot.config import get_settings, reload_settings
+
+
+async def safe_edit_message(query, text: str, reply_markup=None, **kwargs):
+    """Редактирование сообщения с кнопками.
+
+    "Message is not modified" слой Bot API (bot.telegram_api) возвращает как True —
+    тогда просто отвечаем на нажатие. Если сообщение удалено или слишком старое
+    для редактирования, присылаем текст новым сообщением.
+    """
     try:
-        await query.edit_message_text(text=text, reply_markup=reply_markup)
-    except BadRequest as e:
-        if "Message is not modified" in str(e):
-            # Сообщение не изменилось, просто отвечаем
-            await query.answer("✓")
-        else:
-            # Другая ошибка, пробрасываем дальше
+        result = await query.edit_message_text(text=text, reply_markup=reply_markup, **kwargs)
+    except MessageGone:
+        if query.message is None:
             raise
+        await query.message.reply_text(text=text, reply_markup=reply_markup, **kwargs)
+        return
+    if result is True:
+        await query.answer("✓")
 
 
+@tenant_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_first_name = update.effective_user.first_name if update.effective_user else ""
     greeting = (
@@ -55,40 +91,263 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if user_first_name:
         greeting = f"Привет, {user_first_name}!\n\n" + greeting
 
+    if _inline_nav():
+        sent = await update.message.reply_text(  # type: ignore[union-attr]
+            greeting, reply_markup=build_main_menu_inline_keyboard(is_admin=_is_admin(update))
+        )
+        if context.chat_data is not None:
+            context.chat_data[MENU_MESSAGE_KEY] = sent.message_id
+        return
     await update.message.reply_text(
         greeting,
         reply_markup=build_main_menu_keyboard(is_admin=_is_admin(update)),
     )  # type: ignore[union-attr]
 
 
+@tenant_handler
 async def admin_reload(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings = get_settings()
-    if settings.admin_user_id and update.effective_user and update.effective_user.id != settings.admin_user_id:
+    if not _is_admin(update):
         await update.message.reply_text("Эта команда только для админа")  # type: ignore[union-attr]
         return
+    reload_settings()
     load_data()
-    await update.message.reply_text("Данные перезагружены из data.json")  # type: ignore[union-attr]
+    await update.message.reply_text("Настройки и данные перезагружены")  # type: ignore[union-attr]
 
 
+@tenant_handler
 async def admin_save(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    settings = get_settings()
-    if settings.admin_user_id and update.effective_user and update.effective_user.id != settings.admin_user_id:
+    if not _is_admin(update):
         await update.message.reply_text("Эта команда только для админа")  # type: ignore[union-attr]
         return
-    save_data()
+    await flush_data()
     await update.message.reply_text("Данные сохранены в data.json")  # type: ignore[union-attr]
 
 
-def _is_admin(update: Update) -> bool:
+# Шаги редактирования относятся к данным класса — при смене класса сбрасываем
+_EDIT_STATE_KEYS = (
+    "edit_sched_day",
+    "edit_lesson_index",
+    "edit_hw_subject",
+    "rename_subject_key",
+    "await_new_subject_simple",
+)
+
+
+async def class_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/class — показать текущий класс, /class <id> — выбрать (админ может создать новый)."""
+    message = update.message
+    if not message:
+        return
+    chat = update.effective_chat
+    in_group = chat is not None and chat.type != ChatType.PRIVATE
+    binding = context.chat_data if in_group else context.user_data
+    if not context.args:
+        current = binding.get(TENANT_KEY) or DEFAULT_TENANT
+        known = list_tenants()
+        await message.reply_text(
+            f"Текущий класс: {current}\n"
+            f"Доступные: {', '.join(known)}\n"
+            "Выбрать: /class <id>"
+        )
+        return
+
+    tenant_id = context.args[0].strip()
+    if not is_valid_tenant_id(tenant_id):
+        await message.reply_text("Идентификатор класса: латиница, цифры, '-' и '_', до 32 символов")
+        return
+    if in_group and not _is_admin(update):
+        await message.reply_text("Класс группы может выбрать только админ")
+        return
+    created = not tenant_exists(tenant_id)
+    if created and not _is_admin(update):
+        await message.reply_text(f"Класса {tenant_id} нет. Попроси админа создать его.")
+        return
+
+    binding[TENANT_KEY] = tenant_id
+    for key in _EDIT_STATE_KEYS:
+        context.user_data.pop(key, None)
+    # Напоминания о ДЗ этого чата теперь тоже по новому классу
+    subscription = get_scheduler().get(chat.id) if chat else None
+    if subscription is not None and subscription.tenant_id != tenant_id:
+        get_scheduler().subscribe(replace(subscription, tenant_id=tenant_id))
+    # Новый класс создаётся (и сохраняется пустым) при первой загрузке
+    async with use_tenant(tenant_id):
+        await message.reply_text(
+            f"Класс {'создан и ' if created else ''}выбран: {tenant_id}",
+            reply_markup=build_main_menu_keyboard(is_admin=_is_admin(update)),
+        )
+
+
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/subscribe [ЧЧ:ММ] [часовой пояс] — каждый вечер присылать ДЗ на завтра."""
+    message = update.message
+    chat = update.effective_chat
+    if not message or not chat:
+        return
+    if chat.type != ChatType.PRIVATE and not _is_admin(update):
+        await message.reply_text("Подписать группу может только админ")
+        return
+    scheduler = get_scheduler()
+    current = scheduler.get(chat.id)
+    args = context.args or []
+    if not args and current is not None:
+        await message.reply_text(
+            f"Подписка уже есть: ДЗ на завтра в {current.time} ({current.tz}), класс {current.tenant_id}.\n"
+            "Изменить: /subscribe ЧЧ:ММ [пояс], отписаться: /unsubscribe"
+        )
+        return
+
     settings = get_settings()
-    if not settings.admin_user_id:
-        return True  # если админ не задан, считаем что доступ открыт
-    if not update.effective_user:
-        return False
-    return update.effective_user.id == settings.admin_user_id
+    time_ = settings.reminder_time if current is None else current.time
+    tz = settings.timezone if current is None else current.tz
+    if args:
+        time_ = parse_time(args[0])
+        if time_ is None:
+            await message.reply_text("Время в формате ЧЧ:ММ, например /subscribe 19:30")
+            return
+    if len(args) > 1:
+        tz = args[1]
+        if not is_valid_timezone(tz):
+            await message.reply_text("Неизвестный часовой пояс. Пример: /subscribe 19:30 Asia/Yekaterinburg")
+            return
+
+    sub = Subscription(chat.id, resolve_tenant_id(update, context), time_, tz)
+    scheduler.subscribe(sub)
+    await message.reply_text(
+        f"Готово: каждый день в {sub.time} ({sub.tz}) пришлю ДЗ на завтра (класс {sub.tenant_id}).\n"
+        "Отписаться: /unsubscribe"
+    )
+
+
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message = update.message
+    chat = update.effective_chat
+    if not message or not chat:
+        return
+    if chat.type != ChatType.PRIVATE and not _is_admin(update):
+        await message.reply_text("Отписать группу может только админ")
+        return
+    if get_scheduler().unsubscribe(chat.id):
+        await message.reply_text("Напоминания отключены")
+    else:
+        await message.reply_text("Подписки не было. Подписаться: /subscribe")
+
+
+async def remember_chat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Запомнить чат как получателя рассылок его класса (для всех апдейтов)."""
+    chat = update.effective_chat
+    if chat is None:
+        return
+    get_broadcaster().remember(chat.id, resolve_tenant_id(update, context), chat.type != ChatType.PRIVATE)
+
+
+async def _start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> str:
+    chat = update.effective_chat
+    job_id, count = get_broadcaster().submit(
+        resolve_tenant_id(update, context), text, admin_chat_id=chat.id if chat else None
+    )
+    if not count:
+        return "В классе пока некому отправлять: бот ещё никому из него не писал."
+    return f"Рассылка #{job_id} поставлена в очередь: получателей {count}."
+
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/broadcast <текст> — отправить объявление всем чатам текущего класса (админ)."""
+    message = update.message
+    if not message:
+        return
+    if not _is_admin(update):
+        await message.reply_text("Эта команда только для админа")
+        return
+    text = (message.text or "").partition(" ")[2].strip()
+    if not text:
+        active = get_broadcaster().store.unfinished()
+        lines = ["Объявление всему классу: /broadcast <текст>"]
+        for job_id, tenant_id, counts in active:
+            done = counts["sent"] + counts["failed"]
+            lines.append(f"#{job_id} ({tenant_id}): {done} из {sum(counts.values())}")
+        await message.reply_text("\n".join(lines))
+        return
+    await message.reply_text(await _start_broadcast(update, context, text))
+
+
+async def api_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/apistats — счётчики вызовов Bot API: ошибки и повторы (админ)."""
+    message = update.message
+    if not message:
+        return
+    if not _is_admin(update):
+        await message.reply_text("Эта команда только для админа")
+        return
+    await message.reply_text(get_api_stats().format())
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/stats — задержки хендлеров и Bot API, запись на диск, очередь апдейтов (админ)."""
+    message = update.message
+    if not message:
+        return
+    if not _is_admin(update):
+        await message.reply_text("Эта команда только для админа")
+        return
+    await message.reply_text(f"{get_metrics().format()}\n\n{get_api_stats().format()}")
+
+
+def _is_admin(update: Update) -> bool:
+    user = update.effective_user
+    return get_settings().is_admin(user.id if user else None)
+
+
+# chat_data: id сообщения с главным меню (NAV_MODE=inline)
+MENU_MESSAGE_KEY = "menu_message_id"
+
+
+def _inline_nav() -> bool:
+    return get_settings().nav_mode == "inline"
+
+
+async def _edit_in_place(query, text: str, reply_markup) -> None:
+    """Ответ на нажатие и правка сообщения — одновременно, за один круг до Telegram."""
+    results = await asyncio.gather(
+        query.answer(),
+        query.edit_message_text(text=text, reply_markup=reply_markup),
+        return_exceptions=True,
+    )
+    error = results[1]
+    if isinstance(error, MessageGone) and query.message is not None:
+        await query.message.reply_text(text=text, reply_markup=reply_markup)
+    elif isinstance(error, BaseException):
+        raise error
+
+
+async def _show_menu_message(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    """NAV_MODE=inline: главное меню — одно сообщение в чате, его правим на месте."""
+    markup = build_main_menu_inline_keyboard(is_admin=_is_admin(update))
+    query = update.callback_query
+    chat = update.effective_chat
+    if query and query.message:
+        await _edit_in_place(query, text, markup)
+        if context.chat_data is not None:
+            context.chat_data[MENU_MESSAGE_KEY] = query.message.message_id
+        return
+    if chat is None or not update.message:
+        return
+    menu_id = context.chat_data.get(MENU_MESSAGE_KEY) if context.chat_data is not None else None
+    if isinstance(menu_id, int):
+        try:
+            await context.bot.edit_message_text(text, chat_id=chat.id, message_id=menu_id, reply_markup=markup)
+            return
+        except MessageGone:
+            pass  # меню удалили или оно слишком старое — пришлём новое
+    sent = await update.message.reply_text(text, reply_markup=markup)
+    if context.chat_data is not None:
+        context.chat_data[MENU_MESSAGE_KEY] = sent.message_id
 
 
 async def _send_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    if _inline_nav():
+        await _show_menu_message(update, context, f"{text}\n\nГлавное меню:")
+        return
     markup = build_main_menu_keyboard(is_admin=_is_admin(update))
     query = update.callback_query
     if query and query.message:
@@ -98,21 +357,10 @@ async def _send_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, te
 
 
 def _slugify_key(name: str) -> str:
-    mapping = {
-        "а": "a", "б": "b", "в": "v", "г": "g", "д": "d",
-        "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
-        "й": "y", "к": "k", "л": "l", "м": "m", "н": "n",
-        "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
-        "у": "u", "ф": "f", "х": "h", "ц": "c", "ч": "ch",
-        "ш": "sh", "щ": "sch", "ъ": "", "ы": "y", "ь": "",
-        "э": "e", "ю": "yu", "я": "ya",
-    }
-    s = name.strip().lower()
+    s = transliterate(name.strip().lower())
     res_chars: list[str] = []
     for ch in s:
-        if ch in mapping:
-            res_chars.append(mapping[ch])
-        elif ch.isalnum():
+        if ch.isalnum():
             res_chars.append(ch)
         elif ch in [" ", "-", "/", "\\", ",", ".", ":", ";", "(", ")"]:
             res_chars.append("_")
@@ -132,11 +380,16 @@ def _make_unique_key(base_key: str) -> str:
     return key
 
 
+@tenant_handler
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     help_text = (
         "Доступные команды:\n"
         "/start — приветствие и краткая справка\n"
-        "/help — показать эту помощь\n\n"
+        "/help — показать эту помощь\n"
+        "/class — выбрать класс (своё расписание и ДЗ)\n"
+        "/subscribe [ЧЧ:ММ] — присылать ДЗ на завтра каждый вечер\n"
+        "/unsubscribe — отключить напоминания\n"
+        "/search <слова> — найти ДЗ по тексту\n\n"
         "Просто отправь текст — я повторю его в ответ."
     )
     await update.message.reply_text(
@@ -145,6 +398,34 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     )  # type: ignore[union-attr]
 
 
+@tenant_handler
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/search <слова> — предметы, в названии или ДЗ которых есть все слова."""
+    message = update.message
+    if not message:
+        return
+    query = (message.text or "").partition(" ")[2].strip()
+    if not query:
+        await message.reply_text("Что искать? Например: /search законы Ньютона")
+        return
+    hits = search_homework(query)
+    if not hits:
+        await message.reply_text(f"По запросу «{query}» ничего не нашлось.")
+        return
+    lines = [f"Нашлось по запросу «{html.escape(query)}»:"]
+    past = [hit for hit in hits if hit.day is not None]
+    for hit in hits:
+        if hit.day is None:
+            lines.append(f"<b>{html.escape(hit.name)}</b>: {html.escape(hit.homework)}")
+    if past:
+        lines.append("\nПрошлые задания:")
+    for hit in past:
+        day = datetime.strptime(hit.day, "%Y-%m-%d").strftime("%d.%m.%Y")  # type: ignore[arg-type]
+        lines.append(f"{day} <b>{html.escape(hit.name)}</b>: {html.escape(hit.homework)}")
+    await message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+
+
+@tenant_handler
 async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Перехват текстов, если ожидается ввод нового ДЗ
     if not update.message or not update.message.text:
@@ -167,18 +448,8 @@ async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         )
         return
     elif text == "📝 ДЗ на завтра":
-        day_key = get_tomorrow_day_key()
-        day_label = get_day_label(day_key)
-        schedule = get_schedule_for_day(day_key)
-        if not schedule:
-            text_msg = f"На {day_label} занятий нет."
-        else:
-            lines = [f"ДЗ на завтра ({day_label}):"]
-            for order, subject in schedule:
-                lines.append(f"{order}. <b>{subject.name}</b>: {subject.homework}")
-            text_msg = "\n".join(lines)
         await update.message.reply_text(
-            text_msg,
+            render_homework_for_day(get_tomorrow_day_key()),
             reply_markup=build_main_menu_keyboard(is_admin=_is_admin(update)),
             parse_mode=ParseMode.HTML,
         )
@@ -207,10 +478,13 @@ async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             return
 
         new_hw = update.message.text.strip()
-        SUBJECTS[pending_subject_key] = Subject(key=subject.key, name=subject.name, homework=new_hw)
-        save_data()
+        set_homework(pending_subject_key, new_hw)
         await _send_main_menu(update, context, f"ДЗ для {subject.name} обновлено.")
         user_data.pop("edit_hw_subject", None)
+        await update.message.reply_text(
+            "Сообщить об этом всему классу?",
+            reply_markup=build_notify_homework_keyboard(pending_subject_key),
+        )
         return
 
     # Переименование предмета
@@ -227,8 +501,7 @@ async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             return
         new_name = update.message.text.strip()
         # Обновляем только имя, ключ остаётся прежним
-        SUBJECTS[rename_key] = Subject(key=subject.key, name=new_name, homework=subject.homework)
-        save_data()
+        rename_subject(rename_key, new_name)
         await _send_main_menu(update, context, f"Название предмета обновлено: {subject.name} → {new_name}")
         user_data.pop("rename_subject_key", None)
         return
@@ -272,8 +545,7 @@ async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             user_data.pop("await_new_subject", None)
             user_data.pop("await_new_subject_simple", None)
             return
-        SUBJECTS[key] = Subject(key=key, name=name, homework=hw)
-        save_data()
+        add_subject(key, name, hw)
         await _send_main_menu(update, context, f"Предмет добавлен: {name} (ключ: {key})")
         user_data.pop("await_new_subject", None)
         user_data.pop("await_new_subject_simple", None)
@@ -282,6 +554,7 @@ async def echo_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text(update.message.text)
 
 
+@tenant_handler
 async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(
         "Неизвестная команда. Попробуй /help",
@@ -289,114 +562,135 @@ async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     )  # type: ignore[union-attr]
 
 
-async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.callback_query
-    if not query:
-        return
-    data = query.data or ""
+menu_routes = CallbackRouter(is_admin=_is_admin)
 
-    if data == "menu:admin":
-        if not _is_admin(update):
-            await query.answer("Только для админа")
-            return
-        await query.edit_message_text(
-            text="Админ-панель:", reply_markup=build_admin_menu_keyboard()
-        )
-    elif data == "menu:subjects":
-        await query.edit_message_text(
-            text="Выбери предмет:", reply_markup=build_subjects_keyboard()
-        )
-    elif data == "menu:day":
-        await query.edit_message_text(
-            text="Выбери день недели:", reply_markup=build_days_keyboard()
-        )
-    elif data == "menu:tomorrow":
-        day_key = get_tomorrow_day_key()
-        day_label = get_day_label(day_key)
-        schedule = get_schedule_for_day(day_key)
-        if not schedule:
-            text = f"На {day_label} занятий нет."
-        else:
-            lines = [f"ДЗ на завтра ({day_label}):"]
-            for order, subject in schedule:
-                lines.append(f"{order}. <b>{subject.name}</b>: {subject.homework}")
-            text = "\n".join(lines)
-        await query.edit_message_text(
-            text=text,
-            reply_markup=build_main_menu_keyboard(is_admin=_is_admin(update)),
-            parse_mode=ParseMode.HTML,
-        )
-    elif data == "menu:edit_hw":
-        if not _is_admin(update):
-            await query.answer("Только для админа")
-            return
-        await query.edit_message_text(
-            text="Выбери предмет для изменения ДЗ:",
-            reply_markup=build_subjects_keyboard_with_prefix("edit:hw:"),
-        )
-    elif data == "menu:edit_sched":
-        if not _is_admin(update):
-            await query.answer("Только для админа")
-            return
-        await query.edit_message_text(
-            text="Выбери день для редактирования расписания:",
-            reply_markup=build_days_keyboard_with_prefix("edit:sched:day:"),
-        )
-    elif data == "menu:rename_subj":
-        if not _is_admin(update):
-            await query.answer("Только для админа")
-            return
-        await query.edit_message_text(
-            text="Выбери предмет для переименования:",
-            reply_markup=build_subjects_keyboard_with_prefix("edit:rename:"),
-        )
-    elif data == "menu:add_subject":
-        if not _is_admin(update):
-            await query.answer("Только для админа")
-            return
-        await query.edit_message_text(
-            text=(
-                "Отправь новым сообщением название предмета.\n"
-                "Можно добавить ДЗ через двоеточие: 'Название: ДЗ'.\n"
-                "Ключ сгенерируется автоматически."
-            ),
-            reply_markup=build_back_to_main_only_keyboard(),
-        )
-        context.user_data["await_new_subject_simple"] = True
-    elif data == "menu:days_manage":
-        if not _is_admin(update):
-            await query.answer("Только для админа")
-            return
-        await query.edit_message_text(
-            text="Управление днями:",
-            reply_markup=build_manage_days_keyboard(),
-        )
-    elif data == "menu:days_manage:create":
-        if not _is_admin(update):
-            await query.answer("Только для админа")
-            return
-        await query.edit_message_text(
-            text="Выбери день для создания:",
-            reply_markup=build_days_to_create_keyboard(),
-        )
-    elif data == "menu:days_manage:delete":
-        if not _is_admin(update):
-            await query.answer("Только для админа")
-            return
-        await query.edit_message_text(
-            text="Выбери день для удаления:",
-            reply_markup=build_days_to_delete_keyboard(),
-        )
-    elif data == "menu:del_subject":
-        if not _is_admin(update):
-            await query.answer("Только для админа")
-            return
-        await query.edit_message_text(
-            text="Выбери предмет для удаления:",
-            reply_markup=build_subjects_keyboard_with_prefix("edit:del_subj:"),
-        )
+
+@menu_routes.route("menu:admin", admin_only=True)
+async def _menu_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Админ-панель:", reply_markup=build_admin_menu_keyboard()
+    )
+
+
+@menu_routes.route("menu:subjects")
+async def _menu_subjects(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери предмет:", reply_markup=build_subjects_keyboard()
+    )
+
+
+@menu_routes.route("menu:day")
+async def _menu_day(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери день недели:", reply_markup=build_days_keyboard()
+    )
+
+
+@menu_routes.route("menu:tomorrow")
+async def _menu_tomorrow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text=render_homework_for_day(get_tomorrow_day_key()),
+        reply_markup=build_main_menu_keyboard(is_admin=_is_admin(update)),
+        parse_mode=ParseMode.HTML,
+    )
+
+
+@menu_routes.route("menu:edit_hw", admin_only=True)
+async def _menu_edit_hw(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери предмет для изменения ДЗ:",
+        reply_markup=build_subjects_keyboard_with_prefix("edit:hw:"),
+    )
+
+
+@menu_routes.route("menu:edit_sched", admin_only=True)
+async def _menu_edit_sched(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери день для редактирования расписания:",
+        reply_markup=build_days_keyboard_with_prefix("edit:sched:day:"),
+    )
+
+
+@menu_routes.route("menu:rename_subj", admin_only=True)
+async def _menu_rename_subj(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери предмет для переименования:",
+        reply_markup=build_subjects_keyboard_with_prefix("edit:rename:"),
+    )
+
+
+@menu_routes.route("menu:add_subject", admin_only=True)
+async def _menu_add_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text=(
+            "Отправь новым сообщением название предмета.\n"
+            "Можно добавить ДЗ через двоеточие: 'Название: ДЗ'.\n"
+            "Ключ сгенерируется автоматически."
+        ),
+        reply_markup=build_back_to_main_only_keyboard(),
+    )
+    context.user_data["await_new_subject_simple"] = True
 
 
+@menu_routes.route("menu:days_manage", admin_only=True)
+async def _menu_days_manage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Управление днями:",
+        reply_markup=build_manage_days_keyboard(),
+    )
+
+
+@menu_routes.route("menu:days_manage:create", admin_only=True)
+async def _menu_days_create(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери день для создания:",
+        reply_markup=build_days_to_create_keyboard(),
+    )
+
+
+@menu_routes.route("menu:days_manage:delete", admin_only=True)
+async def _menu_days_delete(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери день для удаления:",
+        reply_markup=build_days_to_delete_keyboard(),
+    )
+
+
+@menu_routes.route("menu:del_subject", admin_only=True)
+async def _menu_del_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери предмет для удаления:",
+        reply_markup=build_subjects_keyboard_with_prefix("edit:del_subj:"),
+    )
+
+
+@menu_routes.route("menu:stats", admin_only=True)
+async def _menu_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text=format_summary(await get_stats().summary_async()),
+        reply_markup=build_stats_keyboard(),
+    )
+
+
+@tenant_handler
+async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await menu_routes.dispatch(update, context)
+
+
+@tenant_handler
 async def subject_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     if not query:
@@ -420,11 +714,34 @@ async def subject_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         f"ДЗ: {subject.homework}\n\n"
         f"Ближайшие занятия:\n{schedule_text}"
     )
-    await query.edit_message_text(
-        text=text, reply_markup=build_subjects_keyboard(), parse_mode=ParseMode.HTML
+    await safe_edit_message(
+        query,
+        text=text, reply_markup=build_subject_card_keyboard(key), parse_mode=ParseMode.HTML
+    )
+
+
+@tenant_handler
+async def history_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """hist:<предмет>[:<id>] — страница архива ДЗ (записи старше id)."""
+    query = update.callback_query
+    if not query:
+        return
+    parts = (query.data or "").split(":")
+    if len(parts) not in (2, 3) or not parts[1]:
+        await query.answer()
+        return
+    subject_key = parts[1]
+    before_id = int(parts[2]) if len(parts) == 3 and parts[2].isdigit() else None
+    entries, has_more = get_history().page(current_store().tenant_id, subject_key, before_id)
+    older_than = entries[-1].id if has_more and entries else None
+    await safe_edit_message(
+        query,
+        text=format_history_page(subject_key, entries),
+        reply_markup=build_history_keyboard(subject_key, older_than),
     )
 
 
+@tenant_handler
 async def day_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     if not query:
@@ -433,30 +750,26 @@ async def day_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     if not data.startswith("day:"):
         return
     day_key = data.split(":", 1)[1]
-    day_label = get_day_label(day_key)
-    schedule = get_schedule_for_day(day_key)
-    if not schedule:
-        text = f"На {day_label} занятий нет."
-    else:
-        lines = [f"Расписание на {day_label}:"]
-        for order, subject in schedule:
-            lines.append(f"{order}. {subject.name}")
-        text = "\n".join(lines)
-
-    await query.edit_message_text(
-        text=text, reply_markup=build_days_keyboard()
+    await safe_edit_message(
+        query,
+        text=render_day_schedule(day_key), reply_markup=build_days_keyboard()
     )
 
 
+@tenant_handler
 async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     if not query:
         return
-    # Удаляем старое сообщение с inline-кнопками
+    if _inline_nav():
+        # Одно сообщение на чат: правим его, а не удаляем и шлём новое
+        await _show_menu_message(update, context, "Главное меню:")
+        return
+    # Удаляем старое сообщение с inline-кнопками (уже удалённое — не ошибка)
     try:
         await query.message.delete()
-    except:
-        pass
+    except TelegramError:
+        pass  # не смогли удалить — меню всё равно пришлём
     # Отправляем новое сообщение с reply-клавиатурой
     await query.message.reply_text(
         text="Главное меню:", 
@@ -465,364 +778,273 @@ async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await query.answer()
 
 
-def _render_day_schedule(day_key: str) -> str:
-    day_label = get_day_label(day_key)
-    schedule = get_schedule_for_day(day_key)
-    if not schedule:
-        return f"Редактирование расписания: {day_label}\nНа {day_label} занятий нет."
-    lines = [f"Редактирование расписания: {day_label}"]
-    for order, subject in schedule:
-        lines.append(f"{order}. {subject.name}")
-    return "\n".join(lines)
+# Все маршруты edit:* — только для админа (проверка в edit_callback)
+edit_routes = CallbackRouter()
 
 
-async def edit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def _edit_day_or_warn(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str | None:
+    """День, выбранный для редактирования расписания (edit:sched:day:<day_key>)."""
+    day_key = context.user_data.get("edit_sched_day")
+    if not isinstance(day_key, str) or not day_key:
+        await update.callback_query.answer("Сначала выбери день")
+        return None
+    return day_key
+
+
+async def _lesson_number_or_warn(update: Update, raw: str) -> int | None:
+    try:
+        return int(raw)
+    except ValueError:
+        await update.callback_query.answer("Неверный номер")
+        return None
+
+
+async def _show_day_editor(query, day_key: str) -> None:
+    await safe_edit_message(
+        query,
+        text=render_day_editor(day_key),
+        reply_markup=build_edit_schedule_actions_keyboard(day_key),
+    )
+
+
+@edit_routes.route("edit:add_subject", "edit:create_subject")
+async def _edit_prompt_new_subject(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await safe_edit_message(
+        update.callback_query,
+        text=(
+            "Отправь новым сообщением название предмета.\n"
+            "Можно добавить ДЗ через двоеточие: 'Название: ДЗ'.\n"
+            "Ключ сгенерируется автоматически."
+        ),
+        reply_markup=build_back_to_main_only_keyboard(),
+    )
+    context.user_data["await_new_subject_simple"] = True
+
+
+@edit_routes.route("edit:sched:day:{day_key:rest}")
+async def _edit_sched_day(update: Update, context: ContextTypes.DEFAULT_TYPE, day_key: str) -> None:
+    # Сохраняем выбранный день и сразу показываем список предметов для добавления
+    context.user_data["edit_sched_day"] = day_key
+    await safe_edit_message(
+        update.callback_query,
+        text=f"Выбери предмет для добавления в {get_day_label(day_key)}:",
+        reply_markup=build_subjects_keyboard_for_day_add(day_key),
+    )
+
+
+@edit_routes.route("edit:sched:add", "edit:days:add")
+async def _edit_sched_add_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if await _edit_day_or_warn(update, context) is None:
+        return
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери предмет для добавления:",
+        reply_markup=build_subjects_keyboard_with_prefix("edit:sched:add:"),
+    )
+
+
+@edit_routes.route("edit:sched:add:{subject_key}", "edit:days:add:{subject_key}")
+async def _edit_sched_add(update: Update, context: ContextTypes.DEFAULT_TYPE, subject_key: str) -> None:
     query = update.callback_query
-    if not query:
+    day_key = await _edit_day_or_warn(update, context)
+    if day_key is None:
         return
-    raw = query.data or ""
-    data = raw.split(":")
-    raw_lc = raw.lower()
-    if not _is_admin(update):
-        await query.answer("Только для админа")
+    if subject_key not in SUBJECTS:
+        await query.answer("Неизвестный предмет")
         return
+    add_lesson(day_key, subject_key)
+    await query.answer("Добавлено")
+    await _show_day_editor(query, day_key)
 
-    # Patterns:
-    # edit:hw:<subject_key>
-    # edit:rename:<subject_key>
-    # edit:del_subj:<subject_key>
-    # edit:sched:day:<day_key>
-    # edit:sched:add:<day_key>
-    # edit:sched:add:<day_key>:<subject_key>
-    # edit:sched:del:<day_key>
-    # edit:sched:del:<day_key>:<index>
-    # edit:sched:clear:<day_key>
-    # edit:days:create:<day_key>
-    # edit:days:delete:<day_key>
-
-    # Backward/defensive handling for possible stale buttons
-    if raw in ("edit:add_subject", "edit:create_subject") or (
-        ("add" in raw_lc or "create" in raw_lc) and ("subj" in raw_lc or "subject" in raw_lc)
-    ):
-        await query.edit_message_text(
-            text=(
-                "Отправь новым сообщением название предмета.\n"
-                "Можно добавить ДЗ через двоеточие: 'Название: ДЗ'.\n"
-                "Ключ сгенерируется автоматически."
-            ),
-            reply_markup=build_back_to_main_only_keyboard(),
-        )
-        context.user_data["await_new_subject_simple"] = True
+
+@edit_routes.route("edit:sched:days:clear", "edit:days:clear")
+async def _edit_sched_clear(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    day_key = await _edit_day_or_warn(update, context)
+    if day_key is None:
         return
+    clear_day(day_key)
+    await _show_day_editor(update.callback_query, day_key)
 
-    # Fast-path: adding subject directly edit:sched:add:<subject_key>
-    if raw.startswith("edit:sched:add:") and len(data) == 4:
-        day_key = context.user_data.get("edit_sched_day")
-        if not isinstance(day_key, str) or not day_key:
-            await query.answer("Сначала выбери день")
-            return
-        subject_key = data[3]
-        if subject_key not in SUBJECTS:
-            await query.answer("Неизвестный предмет")
-            return
-        SCHEDULE.setdefault(day_key, []).append(subject_key)
-        save_data()
-        await query.answer("Добавлено")
-        await safe_edit_message(
-            query,
-            text=_render_day_schedule(day_key),
-            reply_markup=build_edit_schedule_actions_keyboard(day_key),
-        )
+
+@edit_routes.route("edit:sched:del", "edit:days:del")
+async def _edit_sched_del_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    day_key = await _edit_day_or_warn(update, context)
+    if day_key is None:
         return
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери номер урока для удаления:",
+        reply_markup=build_delete_indices_keyboard(day_key),
+    )
 
-    # Fast-path: clear day edit:sched:days:clear
-    if raw == "edit:sched:days:clear":
-        day_key = context.user_data.get("edit_sched_day")
-        if not isinstance(day_key, str) or not day_key:
-            await query.answer("Сначала выбери день")
-            return
-        SCHEDULE[day_key] = []
-        save_data()
-        await safe_edit_message(
-            query,
-            text=_render_day_schedule(day_key),
-            reply_markup=build_edit_schedule_actions_keyboard(day_key),
-        )
+
+@edit_routes.route("edit:sched:del_choose:{index}", "edit:days:del_choose:{index}")
+async def _edit_sched_del(update: Update, context: ContextTypes.DEFAULT_TYPE, index: str) -> None:
+    day_key = await _edit_day_or_warn(update, context)
+    if day_key is None:
         return
+    idx = await _lesson_number_or_warn(update, index)
+    if idx is None:
+        return
+    if not remove_lesson(day_key, idx - 1):
+        # Урок уже удалён (кнопка из старого сообщения) — покажем день как есть
+        await update.callback_query.answer("Урок не найден")
+    await _show_day_editor(update.callback_query, day_key)
 
-    # Fast-path: show subjects for adding edit:sched:add
-    if raw == "edit:sched:add":
-        day_key = context.user_data.get("edit_sched_day")
-        if not isinstance(day_key, str) or not day_key:
-            await query.answer("Сначала выбери день")
-            return
-        await query.edit_message_text(
-            text="Выбери предмет для добавления:",
-            reply_markup=build_subjects_keyboard_with_prefix("edit:sched:add:"),
-        )
+
+@edit_routes.route("edit:sched:edit")
+async def _edit_sched_edit_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    day_key = await _edit_day_or_warn(update, context)
+    if day_key is None:
         return
+    await safe_edit_message(
+        update.callback_query,
+        text="Выбери урок для редактирования:",
+        reply_markup=build_edit_lessons_keyboard(day_key),
+    )
 
-    # Fast-path: show lessons for deletion edit:sched:del
-    if raw == "edit:sched:del":
-        day_key = context.user_data.get("edit_sched_day")
-        if not isinstance(day_key, str) or not day_key:
-            await query.answer("Сначала выбери день")
-            return
-        await query.edit_message_text(
-            text="Выбери номер урока для удаления:",
-            reply_markup=build_delete_indices_keyboard(day_key),
-        )
+
+@edit_routes.route("edit:sched:edit_choose:{index}")
+async def _edit_sched_edit_choose(update: Update, context: ContextTypes.DEFAULT_TYPE, index: str) -> None:
+    query = update.callback_query
+    day_key = await _edit_day_or_warn(update, context)
+    if day_key is None:
+        return
+    idx = await _lesson_number_or_warn(update, index)
+    if idx is None:
         return
+    if not (1 <= idx <= len(SCHEDULE.get(day_key, []))):
+        await query.answer("Неверный номер урока")
+        return
+    # Сохраняем индекс для замены
+    context.user_data["edit_lesson_index"] = idx - 1
+    await safe_edit_message(
+        query,
+        text="Выбери новый предмет для замены:",
+        reply_markup=build_subjects_keyboard_with_prefix("edit:sched:replace:"),
+    )
 
-    # Fast-path: delete specific lesson edit:sched:del_choose:<index>
-    if raw.startswith("edit:sched:del_choose:") and len(data) == 4:
-        day_key = context.user_data.get("edit_sched_day")
-        if not isinstance(day_key, str) or not day_key:
-            await query.answer("Сначала выбери день")
-            return
-        try:
-            idx = int(data[3])
-        except ValueError:
-            await query.answer("Неверный номер")
-            return
-        items = SCHEDULE.get(day_key, [])
-        if 1 <= idx <= len(items):
-            del items[idx - 1]
-            save_data()
-            await safe_edit_message(
-                query,
-                text=_render_day_schedule(day_key),
-                reply_markup=build_edit_schedule_actions_keyboard(day_key),
-            )
-        return
-
-    # Fast-path: show lessons for editing edit:sched:edit
-    if raw == "edit:sched:edit":
-        day_key = context.user_data.get("edit_sched_day")
-        if not isinstance(day_key, str) or not day_key:
-            await query.answer("Сначала выбери день")
-            return
-        await query.edit_message_text(
-            text="Выбери урок для редактирования:",
-            reply_markup=build_edit_lessons_keyboard(day_key),
-        )
+
+@edit_routes.route("edit:sched:replace:{subject_key}")
+async def _edit_sched_replace(update: Update, context: ContextTypes.DEFAULT_TYPE, subject_key: str) -> None:
+    query = update.callback_query
+    day_key = await _edit_day_or_warn(update, context)
+    if day_key is None:
+        return
+    lesson_idx = context.user_data.get("edit_lesson_index")
+    if lesson_idx is None:
+        await query.answer("Ошибка: не выбран урок")
+        return
+    if subject_key not in SUBJECTS:
+        await query.answer("Неизвестный предмет")
+        return
+    items = SCHEDULE.get(day_key, [])
+    if not (0 <= lesson_idx < len(items)):
+        await query.answer("Ошибка: неверный индекс урока")
+        return
+    # Проверяем, не тот же ли предмет
+    if items[lesson_idx] == subject_key:
+        await query.answer("Этот предмет уже установлен")
         return
+    replace_lesson(day_key, lesson_idx, subject_key)
+    await query.answer("Урок изменён")
+    await _show_day_editor(query, day_key)
 
-    # Fast-path: edit specific lesson edit:sched:edit_choose:<index>
-    if raw.startswith("edit:sched:edit_choose:") and len(data) == 4:
-        day_key = context.user_data.get("edit_sched_day")
-        if not isinstance(day_key, str) or not day_key:
-            await query.answer("Сначала выбери день")
-            return
-        try:
-            idx = int(data[3])
-        except ValueError:
-            await query.answer("Неверный номер")
-            return
-        items = SCHEDULE.get(day_key, [])
-        if not (1 <= idx <= len(items)):
-            await query.answer("Неверный номер урока")
-            return
-        
-        # Сохраняем индекс для замены
-        context.user_data["edit_lesson_index"] = idx - 1
-        await query.edit_message_text(
-            text="Выбери новый предмет для замены:",
-            reply_markup=build_subjects_keyboard_with_prefix("edit:sched:replace:"),
-        )
+
+@edit_routes.route("edit:sched:notify")
+async def _edit_sched_notify(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    day_key = await _edit_day_or_warn(update, context)
+    if day_key is None:
         return
+    text = "🗓️ Изменилось расписание\n" + render_day_schedule(day_key)
+    await update.callback_query.answer(await _start_broadcast(update, context, text), show_alert=True)
 
-    # Fast-path: replace lesson edit:sched:replace:<subject_key>
-    if raw.startswith("edit:sched:replace:") and len(data) == 4:
-        day_key = context.user_data.get("edit_sched_day")
-        if not isinstance(day_key, str) or not day_key:
-            await query.answer("Сначала выбери день")
-            return
-        lesson_idx = context.user_data.get("edit_lesson_index")
-        if lesson_idx is None:
-            await query.answer("Ошибка: не выбран урок")
-            return
-        subject_key = data[3]
-        if subject_key not in SUBJECTS:
-            await query.answer("Неизвестный предмет")
-            return
-        items = SCHEDULE.get(day_key, [])
-        if 0 <= lesson_idx < len(items):
-            # Проверяем, не тот же ли предмет
-            if items[lesson_idx] == subject_key:
-                await query.answer("Этот предмет уже установлен")
-                return
-            items[lesson_idx] = subject_key
-            save_data()
-            await query.answer("Урок изменён")
-            await safe_edit_message(
-                query,
-                text=_render_day_schedule(day_key),
-                reply_markup=build_edit_schedule_actions_keyboard(day_key),
-            )
-        else:
-            await query.answer("Ошибка: неверный индекс урока")
+
+@edit_routes.route("edit:notify:hw:{subject_key}")
+async def _edit_notify_hw(update: Update, context: ContextTypes.DEFAULT_TYPE, subject_key: str) -> None:
+    query = update.callback_query
+    subject = SUBJECTS.get(subject_key)
+    if not subject:
+        await query.answer("Неизвестный предмет")
         return
+    text = f"📝 Новое ДЗ — {subject.name}:\n{subject.homework or '(не задано)'}"
+    await safe_edit_message(query, await _start_broadcast(update, context, text))
 
-    if len(data) >= 2 and data[1] == "hw":
-        if len(data) == 3:
-            subject_key = data[2]
-            subject = SUBJECTS.get(subject_key)
-            if not subject:
-                await query.answer("Неизвестный предмет")
-                return
-            context.user_data["edit_hw_subject"] = subject_key
-            await query.edit_message_text(
-                text=f"Введи новое ДЗ для {subject.name} сообщением.",
-                reply_markup=build_back_to_main_only_keyboard(),
-            )
-        return
-
-    if len(data) >= 2 and data[1] == "rename":
-        if len(data) == 3:
-            subject_key = data[2]
-            subject = SUBJECTS.get(subject_key)
-            if not subject:
-                await query.answer("Неизвестный предмет")
-                return
-            context.user_data["rename_subject_key"] = subject_key
-            await query.edit_message_text(
-                text=f"Введи новое название для предмета: {subject.name}",
-                reply_markup=build_back_to_main_only_keyboard(),
-            )
-        return
-
-    if len(data) >= 2 and data[1] == "del_subj":
-        if len(data) == 3:
-            subject_key = data[2]
-            subject = SUBJECTS.get(subject_key)
-            if not subject:
-                await query.answer("Неизвестный предмет")
-                return
-            # Удаляем из SUBJECTS и из всех дней расписания
-            SUBJECTS.pop(subject_key, None)
-            for dk, keys in list(SCHEDULE.items()):
-                SCHEDULE[dk] = [k for k in keys if k != subject_key]
-            save_data()
-            await _send_main_menu(update, context, f"Предмет '{subject.name}' удалён, расписание обновлено.")
-        return
-
-    # Fast-path: select day for editing schedule → сразу показать выбор предметов
-    if raw.startswith("edit:sched:day:"):
-        parts = raw.split(":", 3)
-        if len(parts) >= 4:
-            day_key = parts[3]
-            context.user_data["edit_sched_day"] = day_key
-            await query.edit_message_text(
-                text=f"Выбери предмет для добавления в {get_day_label(day_key)}:",
-                reply_markup=build_subjects_keyboard_for_day_add(day_key),
-            )
-            return
 
-    if len(data) >= 2 and data[1] == "sched":
-        action = data[2] if len(data) >= 3 else ""
-        if action == "day" and len(data) >= 4:
-            day_key = data[3]
-            # Сохраняем выбранный день и сразу показываем список предметов для добавления
-            context.user_data["edit_sched_day"] = day_key
-            await query.edit_message_text(
-                text=f"Выбери предмет для добавления в {get_day_label(day_key)}:",
-                reply_markup=build_subjects_keyboard_for_day_add(day_key),
-            )
-            return
+@edit_routes.route("edit:hw:{subject_key}")
+async def _edit_hw(update: Update, context: ContextTypes.DEFAULT_TYPE, subject_key: str) -> None:
+    query = update.callback_query
+    subject = SUBJECTS.get(subject_key)
+    if not subject:
+        await query.answer("Неизвестный предмет")
+        return
+    context.user_data["edit_hw_subject"] = subject_key
+    await safe_edit_message(
+        query,
+        text=f"Введи новое ДЗ для {subject.name} сообщением.",
+        reply_markup=build_back_to_main_only_keyboard(),
+    )
 
-    if len(data) >= 2 and data[1] == "days":
-        action = data[2] if len(data) >= 3 else ""
-        if action == "create" and len(data) == 4:
-            dk = data[3]
-            if dk not in SCHEDULE:
-                SCHEDULE[dk] = []
-                save_data()
-            await _send_main_menu(update, context, f"День создан: {get_day_label(dk)}")
-            return
-        if action == "delete" and len(data) == 4:
-            dk = data[3]
-            if dk in SCHEDULE:
-                del SCHEDULE[dk]
-                save_data()
-            await _send_main_menu(update, context, f"День удалён: {get_day_label(dk)}")
-            return
 
-        if action == "add":
-            # Используем сохранённый день из состояния
-            day_key = context.user_data.get("edit_sched_day")
-            if not isinstance(day_key, str) or not day_key:
-                await query.answer("Сначала выбери день")
-                return
-            # edit:sched:add → показать список предметов
-            if len(data) == 3:
-                await query.edit_message_text(
-                    text="Выбери предмет для добавления:",
-                    reply_markup=build_subjects_keyboard_with_prefix("edit:sched:add:"),
-                )
-                return
-            # edit:sched:add:<subject_key> → добавить
-            if len(data) == 4:
-                subject_key = data[3]
-                if subject_key not in SUBJECTS:
-                    await query.answer("Неизвестный предмет")
-                    return
-                SCHEDULE.setdefault(day_key, []).append(subject_key)
-                save_data()
-                await query.answer("Добавлено")
-                await query.edit_message_text(
-                    text=_render_day_schedule(day_key),
-                    reply_markup=build_edit_schedule_actions_keyboard(day_key),
-                )
-                return
+@edit_routes.route("edit:rename:{subject_key}")
+async def _edit_rename(update: Update, context: ContextTypes.DEFAULT_TYPE, subject_key: str) -> None:
+    query = update.callback_query
+    subject = SUBJECTS.get(subject_key)
+    if not subject:
+        await query.answer("Неизвестный предмет")
+        return
+    context.user_data["rename_subject_key"] = subject_key
+    await safe_edit_message(
+        query,
+        text=f"Введи новое название для предмета: {subject.name}",
+        reply_markup=build_back_to_main_only_keyboard(),
+    )
 
-        if action == "del":
-            day_key = context.user_data.get("edit_sched_day")
-            if not isinstance(day_key, str) or not day_key:
-                await query.answer("Сначала выбери день")
-                return
-            if len(data) == 3:
-                await query.edit_message_text(
-                    text="Выбери номер урока для удаления:",
-                    reply_markup=build_delete_indices_keyboard(day_key),
-                )
-                return
-        if action == "del_choose" and len(data) == 4:
-            day_key = context.user_data.get("edit_sched_day")
-            if not isinstance(day_key, str) or not day_key:
-                await query.answer("Сначала выбери день")
-                return
-            try:
-                idx = int(data[3])
-            except ValueError:
-                await query.answer("Неверный номер")
-                return
-            items = SCHEDULE.get(day_key, [])
-            if 1 <= idx <= len(items):
-                del items[idx - 1]
-                save_data()
-            await query.edit_message_text(
-                text=_render_day_schedule(day_key),
-                reply_markup=build_edit_schedule_actions_keyboard(day_key),
-            )
-            return
 
-        if action == "clear":
-            day_key = context.user_data.get("edit_sched_day")
-            if not isinstance(day_key, str) or not day_key:
-                await query.answer("Сначала выбери день")
-                return
-            SCHEDULE[day_key] = []
-            save_data()
-            await query.edit_message_text(
-                text=_render_day_schedule(day_key),
-                reply_markup=build_edit_schedule_actions_keyboard(day_key),
-            )
-            return
+@edit_routes.route("edit:del_subj:{subject_key}")
+async def _edit_del_subject(update: Update, context: ContextTypes.DEFAULT_TYPE, subject_key: str) -> None:
+    subject = SUBJECTS.get(subject_key)
+    if not subject:
+        await update.callback_query.answer("Неизвестный предмет")
+        return
+    # Удаляем из SUBJECTS и из всех дней расписания
+    delete_subject(subject_key)
+    await _send_main_menu(update, context, f"Предмет '{subject.name}' удалён, расписание обновлено.")
 
+
+@edit_routes.route("edit:days:create:{day_key}")
+async def _edit_days_create(update: Update, context: ContextTypes.DEFAULT_TYPE, day_key: str) -> None:
+    create_day(day_key)
+    await _send_main_menu(update, context, f"День создан: {get_day_label(day_key)}")
+
+
+@edit_routes.route("edit:days:delete:{day_key}")
+async def _edit_days_delete(update: Update, context: ContextTypes.DEFAULT_TYPE, day_key: str) -> None:
+    delete_day(day_key)
+    await _send_main_menu(update, context, f"День удалён: {get_day_label(day_key)}")
+
+
+def _is_stale_add_subject_button(raw: str) -> bool:
+    # Старые кнопки «добавить предмет» с другими callback_data
+    raw_lc = raw.lower()
+    return ("add" in raw_lc or "create" in raw_lc) and ("subj" in raw_lc or "subject" in raw_lc)
+
+
+@tenant_handler
+async def edit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    if not query:
+        return
+    if not _is_admin(update):
+        await query.answer("Только для админа")
+        return
+    if await edit_routes.dispatch(update, context):
+        return
+    if _is_stale_add_subject_button(query.data or ""):
+        await _edit_prompt_new_subject(update, context)
+        return
     # fallback → показать админ-меню, чтобы обновить кнопки
-    await query.edit_message_text(
+    await safe_edit_message(
+        query,
         text="Админ-панель:", reply_markup=build_admin_menu_keyboard()
     )
-
-
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Tuple
+from zoneinfo import ZoneInfo
+
+from bot.data import SUBJECTS, Mutation, SubjectKey, add_mutation_listener, current_store
+
+
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), "history.sqlite3")
+
+logger = logging.getLogger(__name__)
+
+# Сколько прошлых заданий показывать за раз
+PAGE_SIZE = 5
+
+# Запись в очереди: (класс, предмет, задание, когда)
+Pending = Tuple[str, SubjectKey, str, datetime]
+
+# Архив ДЗ: каждая правка задания — новая строка, старые не меняются и не
+# удаляются (в т.ч. у удалённых предметов). Хранится отдельно от data.json,
+# поэтому не раздувает его перезапись. Индекс (класс, предмет, id) —
+# страница «прошлых заданий» предмета за O(страницы).
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    subject_key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    homework TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_by_subject ON history (tenant_id, subject_key, id);
+DROP INDEX IF EXISTS history_by_day;
+"""
+
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    id: int
+    subject_key: SubjectKey
+    day: str  # YYYY-MM-DD по часовому поясу бота
+    ts: int
+    homework: str
+
+
+class HistoryStore:
+    """Архив ДЗ в SQLite (общий файл для нескольких процессов бота).
+
+    record() не пишет на диск из event loop: записи копятся в очереди и
+    уходят одной транзакцией в executor'е (своё соединение), по одной пачке
+    за раз — в том же порядке, в каком были правки. Без event loop
+    (скрипты, тесты) запись синхронная.
+    """
+
+    def __init__(self, path: str = HISTORY_FILE, timezone: str = "Europe/Moscow") -> None:
+        self.path = path
+        self.tz = ZoneInfo(timezone)
+        self._conn: sqlite3.Connection | None = None
+        self._writer: sqlite3.Connection | None = None  # только из executor'а
+        self._pending: List[Pending] = []
+        self._task: asyncio.Task | None = None
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL synchronous=NORMAL не теряет целостность, fsync делается на checkpoint
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(SCHEMA)
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = self._open()
+        return self._conn
+
+    @property
+    def writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = self._open()
+        return self._writer
+
+    def record(self, tenant_id: str, subject_key: SubjectKey, homework: str) -> None:
+        """Поставить задание в очередь на запись (повтор последнего текста предмета не пишется)."""
+        self._pending.append((tenant_id, subject_key, homework, datetime.now(self.tz)))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._take(), self.conn)
+            return
+        if self._task is None:
+            self._task = loop.create_task(self._drain())
+
+    def _take(self) -> List[Pending]:
+        batch, self._pending = self._pending, []
+        return batch
+
+    async def _drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                batch = self._take()
+                try:
+                    await loop.run_in_executor(None, self._write, batch, self.writer)
+                except Exception:
+                    # Архив — не главное: правка ДЗ уже применена и сохранится
+                    logger.exception("Не удалось записать в архив заданий: %d", len(batch))
+        finally:
+            self._task = None
+
+    def _write(self, batch: List[Pending], conn: sqlite3.Connection) -> List[HistoryEntry]:
+        written: List[HistoryEntry] = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for tenant_id, subject_key, homework, when in batch:
+                last = conn.execute(
+                    "SELECT homework FROM history WHERE tenant_id = ? AND subject_key = ? ORDER BY id DESC LIMIT 1",
+                    (tenant_id, subject_key),
+                ).fetchone()
+                if last is not None and last[0] == homework:
+                    continue
+                day, ts = when.date().isoformat(), int(when.timestamp())
+                cursor = conn.execute(
+                    "INSERT INTO history (tenant_id, subject_key, day, ts, homework) VALUES (?, ?, ?, ?, ?)",
+                    (tenant_id, subject_key, day, ts, homework),
+                )
+                written.append(HistoryEntry(int(cursor.lastrowid or 0), subject_key, day, ts, homework))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return written
+
+    async def flush(self) -> None:
+        """Дождаться записи всего, что стоит в очереди."""
+        while self._task is not None:
+            await asyncio.shield(self._task)
+
+    def page(
+        self, tenant_id: str, subject_key: SubjectKey, before_id: int | None = None, limit: int = PAGE_SIZE
+    ) -> Tuple[List[HistoryEntry], bool]:
+        """Записи предмета от новых к старым, с id меньше before_id; второе — есть ли ещё."""
+        rows = self.conn.execute(
+            "SELECT id, subject_key, day, ts, homework FROM history"
+            " WHERE tenant_id = ? AND subject_key = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (tenant_id, subject_key, before_id if before_id is not None else 2**63 - 1, limit + 1),
+        ).fetchall()
+        return [HistoryEntry(*row) for row in rows[:limit]], len(rows) > limit
+
+    def since(self, tenant_id: str, after_id: int) -> List[HistoryEntry]:
+        """Записи класса с id больше after_id, по порядку (догнать индекс поиска)."""
+        rows = self.conn.execute(
+            "SELECT id, subject_key, day, ts, homework FROM history WHERE id > ? AND tenant_id = ? ORDER BY id",
+            (after_id, tenant_id),
+        )
+        return [HistoryEntry(*row) for row in rows]
+
+    def close(self) -> None:
+        for conn in (self._conn, self._writer):
+            if conn is not None:
+                conn.close()
+        self._conn = self._writer = None
+
+
+_store: HistoryStore | None = None
+
+
+def configure_history(path: str | None, timezone: str = "Europe/Moscow") -> HistoryStore:
+    global _store
+    if _store is not None:
+        _store.close()
+    _store = HistoryStore(path or HISTORY_FILE, timezone)
+    return _store
+
+
+def get_history() -> HistoryStore:
+    global _store
+    if _store is None:
+        _store = HistoryStore()
+    return _store
+
+
+async def flush_history() -> None:
+    if _store is not None:
+        await _store.flush()
+
+
+def record_homework(subject_key: SubjectKey, homework: str) -> None:
+    """Записать задание текущего класса в архив (повтор того же текста не пишем)."""
+    if not homework.strip():
+        return
+    get_history().record(current_store().tenant_id, subject_key, homework)
+
+
+def format_history_page(subject_key: SubjectKey, entries: List[HistoryEntry]) -> str:
+    subject = SUBJECTS.get(subject_key)
+    name = subject.name if subject else subject_key
+    if not entries:
+        return f"{name}: прошлых заданий пока нет."
+    lines = [f"{name} — задания по датам (сначала новые):"]
+    for entry in entries:
+        day = datetime.strptime(entry.day, "%Y-%m-%d").strftime("%d.%m.%Y")
+        lines.append(f"{day}: {entry.homework}")
+    return "\n".join(lines)
+
+
+def _on_mutation(op: Mutation) -> None:
+    if op["op"] not in ("set_homework", "add_subject"):
+        return
+    try:
+        record_homework(op["subject"], op.get("value", ""))
+    except Exception:
+        # Архив — не главное: правка ДЗ уже применена и сохранится, а слушатели
+        # после нас (индекс поиска и др.) должны её увидеть
+        logger.exception("Не удалось записать ДЗ в архив")
+
+
+add_mutation_listener(_on_mutation)
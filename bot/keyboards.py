@@ -1,8 +1,54 @@
+from functools import wraps
+from typing import Any, Callable, Dict, Tuple, TypeVar
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 
-from bot.data import DAY_LABELS, SUBJECTS, get_all_day_keys
+from bot.data import DAY_LABELS, SUBJECTS, current_store, get_all_day_keys
+
+
+# Кеш готовых клавиатур: ключ — (функция, аргументы), т.е. (builder, prefix, day_key, is_admin).
+# Разметка в python-telegram-bot неизменяема, поэтому один объект можно отдавать всем.
+# У каждого класса свой кеш (DataStore.extras); он сбрасывается целиком,
+# когда меняется версия данных класса (любая правка админа).
+_EXTRAS_KEY = "keyboards"
+
+_Builder = TypeVar("_Builder", bound=Callable[..., Any])
+
+
+class _KeyboardCache:
+    __slots__ = ("version", "markups")
+
+    def __init__(self) -> None:
+        self.version = -1
+        self.markups: Dict[Tuple[Any, ...], Any] = {}
+
 
+def clear_keyboard_cache() -> None:
+    current_store().extras.pop(_EXTRAS_KEY, None)
 
+
+def cached_keyboard(builder: _Builder) -> _Builder:
+    name = builder.__name__
+
+    @wraps(builder)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        store = current_store()
+        cache = store.extras.get(_EXTRAS_KEY)
+        if cache is None:
+            cache = store.extras[_EXTRAS_KEY] = _KeyboardCache()
+        if store.version != cache.version:
+            cache.markups.clear()
+            cache.version = store.version
+        key = (name, args, tuple(kwargs.items())) if kwargs else (name, args)
+        markup = cache.markups.get(key)
+        if markup is None:
+            markup = cache.markups[key] = builder(*args, **kwargs)
+        return markup
+
+    return wrapper  # type: ignore[return-value]
+
+
+@cached_keyboard
 def build_main_menu_keyboard(is_admin: bool = False) -> ReplyKeyboardMarkup:
     """Обычная клавиатура с кнопками внизу экрана"""
     buttons = [
@@ -14,8 +60,9 @@ def build_main_menu_keyboard(is_admin: bool = False) -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
 
 
+@cached_keyboard
 def build_main_menu_inline_keyboard(is_admin: bool = False) -> InlineKeyboardMarkup:
-    """Inline кнопки под сообщением (старая версия)"""
+    """Inline кнопки под сообщением (меню при NAV_MODE=inline)"""
     buttons = [
         [InlineKeyboardButton(text="📚 Предметы", callback_data="menu:subjects")],
         [InlineKeyboardButton(text="📅 Расписание по дню", callback_data="menu:day")],
@@ -26,6 +73,7 @@ def build_main_menu_inline_keyboard(is_admin: bool = False) -> InlineKeyboardMar
     return InlineKeyboardMarkup(buttons)
 
 
+@cached_keyboard
 def build_subjects_keyboard() -> InlineKeyboardMarkup:
     rows = []
     row = []
@@ -40,6 +88,24 @@ def build_subjects_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
+def build_subject_card_keyboard(subject_key: str) -> InlineKeyboardMarkup:
+    """Карточка предмета: прошлые задания и список предметов."""
+    rows = [[InlineKeyboardButton(text="🕘 Прошлые задания", callback_data=f"hist:{subject_key}")]]
+    rows.extend(build_subjects_keyboard().inline_keyboard)
+    return InlineKeyboardMarkup(rows)
+
+
+def build_history_keyboard(subject_key: str, older_than: int | None) -> InlineKeyboardMarkup:
+    """Страница архива: «Ещё раньше» (если есть) и возврат к предмету."""
+    rows = []
+    if older_than is not None:
+        rows.append([InlineKeyboardButton(text="⬅️ Ещё раньше", callback_data=f"hist:{subject_key}:{older_than}")])
+    rows.append([InlineKeyboardButton(text="↩️ К предмету", callback_data=f"subject:{subject_key}")])
+    return InlineKeyboardMarkup(rows)
+
+
+@cached_keyboard
 def build_days_keyboard() -> InlineKeyboardMarkup:
     # Показать только реально существующие дни в расписании, в предсказуемом порядке
     from bot.data import SCHEDULE  # локальный импорт
@@ -63,6 +129,7 @@ def build_days_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def build_admin_menu_keyboard() -> InlineKeyboardMarkup:
     buttons = [
         [InlineKeyboardButton(text="✏️ Ред. ДЗ", callback_data="menu:edit_hw")],
@@ -71,17 +138,28 @@ def build_admin_menu_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="🔤 Переименовать предмет", callback_data="menu:rename_subj")],
         [InlineKeyboardButton(text="➕ Новый предмет (в базу)", callback_data="menu:add_subject")],
         [InlineKeyboardButton(text="🗑️ Удалить предмет", callback_data="menu:del_subject")],
+        [InlineKeyboardButton(text="📊 Статистика", callback_data="menu:stats")],
         [InlineKeyboardButton(text="⬅️ Назад", callback_data="back:main")],
     ]
     return InlineKeyboardMarkup(buttons)
 
 
+@cached_keyboard
+def build_stats_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(text="🔄 Обновить", callback_data="menu:stats")],
+        [InlineKeyboardButton(text="⬅️ Назад", callback_data="menu:admin")],
+    ])
+
+
+@cached_keyboard
 def build_back_to_main_only_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         [[InlineKeyboardButton(text="⬅️ Назад", callback_data="back:main")]]
     )
 
 
+@cached_keyboard
 def build_manage_days_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton(text="➕ Создать день", callback_data="menu:days_manage:create")],
@@ -104,6 +182,7 @@ def build_days_choice_keyboard(prefix: str, keys: list[str]) -> InlineKeyboardMa
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def build_days_to_create_keyboard() -> InlineKeyboardMarkup:
     from bot.data import SCHEDULE  # локальный импорт
 
@@ -112,6 +191,7 @@ def build_days_to_create_keyboard() -> InlineKeyboardMarkup:
     return build_days_choice_keyboard("edit:days:create:", missing)
 
 
+@cached_keyboard
 def build_days_to_delete_keyboard() -> InlineKeyboardMarkup:
     from bot.data import SCHEDULE  # локальный импорт
 
@@ -122,6 +202,7 @@ def build_days_to_delete_keyboard() -> InlineKeyboardMarkup:
     return build_days_choice_keyboard("edit:days:delete:", ordered)
 
 
+@cached_keyboard
 def build_subjects_keyboard_with_prefix(prefix: str) -> InlineKeyboardMarkup:
     rows = []
     row = []
@@ -136,6 +217,7 @@ def build_subjects_keyboard_with_prefix(prefix: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def build_subjects_keyboard_for_day_add(day_key: str) -> InlineKeyboardMarkup:
     rows = []
     row = []
@@ -151,6 +233,7 @@ def build_subjects_keyboard_for_day_add(day_key: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def build_days_keyboard_with_prefix(prefix: str) -> InlineKeyboardMarkup:
     # Аналогично build_days_keyboard — показываем существующие дни первыми
     from bot.data import SCHEDULE  # локальный импорт
@@ -172,17 +255,27 @@ def build_days_keyboard_with_prefix(prefix: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def build_edit_schedule_actions_keyboard(day_key: str) -> InlineKeyboardMarkup:
     rows = [
         [InlineKeyboardButton(text="📚 Выбрать предмет", callback_data="edit:sched:add")],
         [InlineKeyboardButton(text="✏️ Редактировать урок", callback_data="edit:sched:edit")],
         [InlineKeyboardButton(text="➖ Удалить предмет", callback_data="edit:sched:del")],
         [InlineKeyboardButton(text="🧹 Очистить день", callback_data="edit:sched:days:clear")],
+        [InlineKeyboardButton(text="📣 Оповестить класс", callback_data="edit:sched:notify")],
         [InlineKeyboardButton(text="⬅️ К выбору дня", callback_data="menu:edit_sched")],
     ]
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
+def build_notify_homework_keyboard(subject_key: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton(text="📣 Разослать классу", callback_data=f"edit:notify:hw:{subject_key}")]]
+    )
+
+
+@cached_keyboard
 def build_edit_lessons_keyboard(day_key: str) -> InlineKeyboardMarkup:
     from bot.data import SCHEDULE, SUBJECTS  # локальный импорт, чтобы избежать циклов
 
@@ -202,6 +295,7 @@ def build_edit_lessons_keyboard(day_key: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+@cached_keyboard
 def build_delete_indices_keyboard(day_key: str) -> InlineKeyboardMarkup:
     from bot.data import SCHEDULE  # локальный импорт, чтобы избежать циклов
 
@@ -1,10 +1,24 @@
+import asyncio
 import logging
+import signal
 
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters
 
-from bot.config import get_settings
-from bot.storage import load_data
+from bot.broadcast import configure_broadcasts, start_broadcasts, stop_broadcasts
+from bot.concurrency import PerChatUpdateProcessor
+from bot.config import Settings, get_settings, reload_settings
+from bot.history import configure_history, flush_history
+from bot.metrics import instrument_handlers, start_metrics_server, stop_metrics_server
+from bot.persistence import build_persistence, start_state_sweeper
+from bot.reminders import configure_reminders, start_reminders, stop_reminders
+from bot.routing import register_commands
+from bot.stats import configure_stats, count_update, start_stats, stop_stats
+from bot.storage import configure_storage, configure_write_behind, load_data
+from bot.telegram_api import build_request, configure_api
+from bot.tenants import TENANT_KEY, configure_tenants, shutdown_tenants
 from bot.handlers import (
+    MENU_MESSAGE_KEY,
     echo_message,
     help_command,
     start,
@@ -12,9 +26,18 @@ from bot.handlers import (
     menu_callback,
     subject_callback,
     day_callback,
+    history_callback,
     back_to_main,
     admin_reload,
     admin_save,
+    class_command,
+    subscribe_command,
+    unsubscribe_command,
+    broadcast_command,
+    api_stats_command,
+    stats_command,
+    search_command,
+    remember_chat,
     edit_callback,
 )
 
@@ -26,18 +49,81 @@ def configure_logging() -> None:
     )
 
 
-def main() -> None:
-    configure_logging()
+def _on_sighup() -> None:
+    reload_settings()
+    logging.getLogger(__name__).info("Настройки перечитаны по SIGHUP")
+
+
+_state_sweeper: asyncio.Task | None = None
+
+
+async def _on_startup(application: Application) -> None:
+    global _state_sweeper
+    # SIGHUP — горячая перезагрузка настроек (на Windows сигнала нет)
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _on_sighup)
+    # Забываем брошенные сессии редактирования
+    _state_sweeper = start_state_sweeper(application)
+    # Ближайшая рассылка напоминаний о ДЗ — в job_queue
+    start_reminders(application)
+    # Рассылки админа: досылаем недоставленное после перезапуска
+    start_broadcasts(application.bot)
+    # Статистика использования: счётчики из памяти — в базу раз в минуту
+    start_stats()
     settings = get_settings()
-    # Load persisted subjects/schedule from data.json on startup
-    load_data()
+    await start_metrics_server(settings.metrics_listen, settings.metrics_port)
+
+
+async def _on_shutdown(application: Application) -> None:
+    if _state_sweeper is not None:
+        _state_sweeper.cancel()
+    stop_reminders()
+    await stop_broadcasts()
+    await stop_stats()
+    await stop_metrics_server()
+    await flush_history()
+    # Дописываем на диск всё, что ещё не успела сохранить фоновая запись (всех классов)
+    await shutdown_tenants()
+
+
+def build_application(settings: Settings) -> Application:
+    builder = Application.builder().token(settings.bot_token).post_init(_on_startup).post_shutdown(_on_shutdown)
+    # Все вызовы Bot API (кроме getUpdates) — с повторами, лимитами и счётчиками
+    builder = builder.request(build_request())
+    if settings.bot_api_base_url:
+        builder = builder.base_url(settings.bot_api_base_url)
+    if settings.concurrent_updates > 1:
+        builder = builder.concurrent_updates(
+            PerChatUpdateProcessor(settings.concurrent_updates, settings.max_pending_updates)
+        )
+    persistence = build_persistence(
+        settings.state_backend,
+        settings.state_path,
+        settings.state_ttl,
+        settings.state_flush_interval,
+        # Привязка к классу и сообщение с меню — не сессия редактирования, не истекают
+        keep_keys=(TENANT_KEY, MENU_MESSAGE_KEY),
+    )
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
 
-    application = Application.builder().token(settings.bot_token).build()
+    # Раньше всех хендлеров: запоминаем чаты — получателей рассылок
+    application.add_handler(TypeHandler(Update, remember_chat), group=-1)
+    # Счётчики статистики (в памяти, без ввода-вывода)
+    application.add_handler(TypeHandler(Update, count_update), group=-2)
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("reload", admin_reload))
     application.add_handler(CommandHandler("save", admin_save))
+    application.add_handler(CommandHandler("class", class_command))
+    application.add_handler(CommandHandler("subscribe", subscribe_command))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe_command))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("apistats", api_stats_command))
+    application.add_handler(CommandHandler("stats", stats_command))
 
     application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), echo_message))
     application.add_handler(MessageHandler(filters.COMMAND, unknown_command))
@@ -46,10 +132,42 @@ def main() -> None:
     application.add_handler(CallbackQueryHandler(menu_callback, pattern=r"^menu:"))
     application.add_handler(CallbackQueryHandler(subject_callback, pattern=r"^subject:"))
     application.add_handler(CallbackQueryHandler(day_callback, pattern=r"^day:"))
+    application.add_handler(CallbackQueryHandler(history_callback, pattern=r"^hist:"))
     application.add_handler(CallbackQueryHandler(edit_callback, pattern=r"^edit:"))
     application.add_handler(CallbackQueryHandler(back_to_main, pattern=r"^back:main$"))
 
-    application.run_polling(close_loop=False, drop_pending_updates=True)
+    # Остальные /команды в статистике и метриках — одним именем "/?"
+    register_commands(application)
+    # Время и ошибки каждого хендлера, глубина очереди — в /stats и GET /metrics
+    instrument_handlers(application)
+    return application
+
+
+def configure_services(settings: Settings) -> None:
+    # Load persisted subjects/schedule on startup
+    configure_storage(settings.storage_backend, settings.storage_path, settings.tenants_dir)
+    load_data()
+    configure_write_behind(settings.save_interval)
+    configure_tenants(settings.max_active_tenants, settings.tenant_idle_seconds)
+    configure_reminders(settings.subscriptions_path)
+    configure_api(settings.broadcast_rate, settings.edit_cache_size, settings.edit_cache_private_only)
+    configure_broadcasts(settings.broadcast_path)
+    configure_history(settings.history_path, settings.timezone)
+    configure_stats(settings.stats_path, settings.timezone, settings.stats_flush_interval)
+
+
+def main() -> None:
+    configure_logging()
+    settings = get_settings()
+    configure_services(settings)
+    application = build_application(settings)
+
+    if settings.mode == "webhook":
+        from bot.webhook import run_webhook  # aiohttp нужен только в этом режиме
+
+        run_webhook(application, settings)
+    else:
+        application.run_polling(close_loop=False, drop_pending_updates=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import functools
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Mapping, Sequence, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ApplicationHandlerStop
+
+from bot.stats import classify_update
+
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (сек), как у клиентов Prometheus по умолчанию
+BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Метрики процесса бота: время хендлеров (по маршруту: menu:subjects, edit:sched…),
+# их ошибки, время запросов к Bot API и записи данных на диск, очередь апдейтов.
+# Всё пишется из одного event loop, поэтому без блокировок.
+
+
+class Histogram:
+    """Гистограмма длительностей: счётчик на корзину, сумма и число замеров."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        """(le, сколько замеров не больше le) — как в формате Prometheus."""
+        total = 0
+        for bound, n in zip(self.buckets, self.counts):
+            total += n
+            yield _number(bound), total
+        yield "+Inf", total + self.counts[-1]
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по корзинам (линейно внутри корзины, как histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+LabelValues = Tuple[str, ...]
+
+
+class Metrics:
+    """Реестр метрик процесса."""
+
+    def __init__(self) -> None:
+        self.handlers: Dict[Tuple[str, str], Histogram] = {}
+        self.handler_errors: Counter[Tuple[str, str]] = Counter()
+        self.api: Dict[str, Histogram] = {}
+        self.storage: Dict[str, Histogram] = {}
+        # Значения, которые считают другие модули: имя → (описание, метки, функция)
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._counters: Dict[str, Tuple[str, Sequence[str], Callable[[], Mapping[Any, float]]]] = {}
+
+    def observe_handler(self, handler: str, route: str, seconds: float) -> None:
+        hist = self.handlers.get((handler, route))
+        if hist is None:
+            hist = self.handlers[(handler, route)] = Histogram()
+        hist.observe(seconds)
+
+    def observe_api(self, method: str, seconds: float) -> None:
+        hist = self.api.get(method)
+        if hist is None:
+            hist = self.api[method] = Histogram()
+        hist.observe(seconds)
+
+    def observe_storage(self, kind: str, seconds: float) -> None:
+        hist = self.storage.get(kind)
+        if hist is None:
+            hist = self.storage[kind] = Histogram()
+        hist.observe(seconds)
+
+    def add_gauge(self, name: str, help_text: str, read: Callable[[], float]) -> None:
+        self._gauges[name] = (help_text, read)
+
+    def add_counter(
+        self, name: str, help_text: str, labels: Sequence[str], read: Callable[[], Mapping[Any, float]]
+    ) -> None:
+        """Счётчик, который ведёт другой модуль: read() — {значения меток: число}."""
+        self._counters[name] = (help_text, tuple(labels), read)
+
+    def gauges(self) -> Dict[str, float]:
+        values: Dict[str, float] = {}
+        for name, (_, read) in self._gauges.items():
+            try:
+                values[name] = float(read())
+            except Exception:
+                logger.exception("Метрика %s не читается", name)
+        return values
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        lines: List[str] = []
+        _histograms(
+            lines, "bot_handler_seconds", "Время обработки апдейта хендлером",
+            ("handler", "route"), self.handlers,
+        )
+        _counter(
+            lines, "bot_handler_errors_total", "Исключения в хендлерах",
+            ("handler", "route"), self.handler_errors,
+        )
+        _histograms(
+            lines, "bot_api_seconds", "Время запроса к Bot API (одна попытка)",
+            ("method",), {(k,): v for k, v in self.api.items()},
+        )
+        _histograms(
+            lines, "bot_storage_flush_seconds", "Время записи данных на диск",
+            ("kind",), {(k,): v for k, v in self.storage.items()},
+        )
+        for name, (help_text, labels, read) in self._counters.items():
+            try:
+                values = read()
+            except Exception:
+                logger.exception("Метрика %s не читается", name)
+                continue
+            _counter(lines, name, help_text, labels, {_as_tuple(k): v for k, v in values.items()})
+        gauges = self.gauges()
+        for name, (help_text, _) in self._gauges.items():
+            if name in gauges:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_number(gauges[name])}")
+        return "\n".join(lines) + "\n"
+
+    def format(self, limit: int = 8) -> str:
+        """Сводка для /stats: самые медленные экраны, ошибки, Bot API, запись, очередь."""
+        lines: List[str] = []
+        slowest = sorted(self.handlers.items(), key=lambda item: -item[1].quantile(0.95))[:limit]
+        if slowest:
+            lines.append("Самые медленные (p50 / p95, мс; вызовов):")
+            for (handler, route), hist in slowest:
+                lines.append(f"  {handler} {route}: {_ms(hist.quantile(0.5))} / {_ms(hist.quantile(0.95))}; {hist.count}")
+        else:
+            lines.append("Апдейтов ещё не было.")
+        errors = sum(self.handler_errors.values())
+        if errors:
+            top = ", ".join(f"{handler} {route} ×{n}" for (handler, route), n in self.handler_errors.most_common(3))
+            lines.append(f"Ошибок в хендлерах: {errors} ({top})")
+        if self.api:
+            lines.append("Bot API (p50 / p95, мс; запросов):")
+            for method, hist in sorted(self.api.items(), key=lambda item: -item[1].count)[:limit]:
+                lines.append(f"  {method}: {_ms(hist.quantile(0.5))} / {_ms(hist.quantile(0.95))}; {hist.count}")
+        for kind, hist in sorted(self.storage.items()):
+            lines.append(f"Запись на диск ({kind}): p95 {_ms(hist.quantile(0.95))} мс; {hist.count}")
+        gauges = self.gauges()
+        if gauges:
+            lines.append("Очередь: " + ", ".join(f"{name.removeprefix('bot_')} {int(v)}" for name, v in gauges.items()))
+        return "\n".join(lines)
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}"
+
+
+def _as_tuple(key: Any) -> LabelValues:
+    return tuple(str(k) for k in key) if isinstance(key, tuple) else (str(key),)
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histograms(
+    lines: List[str], name: str, help_text: str, labels: Sequence[str], series: Mapping[LabelValues, Histogram]
+) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for values, hist in sorted(series.items()):
+        for le, n in hist.cumulative():
+            bucket = f'le="{le}"'
+            lines.append(f"{name}_bucket{_labels(labels, values, bucket)} {n}")
+        lines.append(f"{name}_sum{_labels(labels, values)} {hist.sum:.6f}")
+        lines.append(f"{name}_count{_labels(labels, values)} {hist.count}")
+
+
+def _counter(
+    lines: List[str], name: str, help_text: str, labels: Sequence[str], series: Mapping[LabelValues, float]
+) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for values, n in sorted(series.items()):
+        lines.append(f"{name}{_labels(labels, values)} {_number(n)}")
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def _route(update: object) -> str:
+    """Экран/действие апдейта для меток (то же имя, что в статистике: classify_update)."""
+    if not isinstance(update, Update):
+        return ""
+    return classify_update(update)[1]
+
+
+HandlerCallback = Callable[[Any, Any], Awaitable[Any]]
+
+
+def timed_handler(callback: HandlerCallback) -> HandlerCallback:
+    """Обёртка хендлера: время и исключения — в метрики (сами исключения идут дальше)."""
+    name = getattr(callback, "__name__", type(callback).__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(update: Any, context: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            _metrics.handler_errors[(name, _route(update))] += 1
+            raise
+        finally:
+            _metrics.observe_handler(name, _route(update), time.perf_counter() - started)
+
+    wrapper.__wrapped_by_metrics__ = True  # type: ignore[attr-defined]
+    return wrapper
+
+
+def instrument_handlers(application: Application) -> None:
+    """Обернуть все зарегистрированные хендлеры и добавить глубину очереди апдейтов."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not getattr(handler.callback, "__wrapped_by_metrics__", False):
+                handler.callback = timed_handler(handler.callback)
+    _metrics.add_gauge(
+        "bot_update_queue_depth", "Апдейты в очереди Application, ещё не взятые в обработку",
+        application.update_queue.qsize,
+    )
+    processor = application.update_processor
+    stats = getattr(processor, "stats", None)
+    if callable(stats):
+        # PerChatUpdateProcessor: приняты, но ждут своей очереди / обрабатываются
+        _metrics.add_gauge(
+            "bot_updates_pending", "Апдейты, ждущие очереди пользователя или воркера",
+            lambda: stats()["pending"],
+        )
+        _metrics.add_gauge("bot_updates_in_flight", "Апдейты в обработке", lambda: stats()["in_flight"])
+
+
+class MetricsServer:
+    """Локальный HTTP-сервер с GET /metrics (для Prometheus)."""
+
+    def __init__(self, listen: str, port: int) -> None:
+        self.listen = listen
+        self.port = port
+        self._runner: Any = None
+
+    async def start(self) -> None:
+        from aiohttp import web  # как и вебхук: aiohttp нужен только когда сервер включён
+
+        async def handle_metrics(request: web.Request) -> web.Response:
+            return web.Response(text=_metrics.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.listen, self.port).start()
+        self._runner = runner
+        logger.info("Метрики: http://%s:%s/metrics", self.listen, self.port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+_server: MetricsServer | None = None
+
+
+async def start_metrics_server(listen: str, port: int) -> None:
+    global _server
+    if not port or _server is not None:
+        return
+    server = MetricsServer(listen, port)
+    try:
+        await server.start()
+    except OSError:
+        # Порт занят — бот работает и без метрик
+        logger.exception("Не удалось открыть порт метрик %s:%s", listen, port)
+        return
+    _server = server
+
+
+async def stop_metrics_server() -> None:
+    global _server
+    if _server is not None:
+        await _server.stop()
+        _server = None
@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from telegram.ext import Application, BasePersistence, PersistenceInput
+
+
+STATE_FILE = os.path.join(os.path.dirname(__file__), "state.sqlite3")
+
+logger = logging.getLogger(__name__)
+
+
+# Состояние диалогов (context.user_data / chat_data): по строке JSON на пользователя
+# или чат. kind — 'user' или 'chat'. updated_at — время последней активности,
+# по нему истекают брошенные сессии редактирования.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS state_updated_at ON state(updated_at);
+"""
+
+USER = "user"
+CHAT = "chat"
+
+Key = Tuple[str, int]
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # Файл могут делить несколько процессов бота — ждём чужую запись, а не падаем
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def _dumps(data: Dict[Any, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def _only(data: Dict[Any, Any], keys: frozenset) -> Dict[Any, Any]:
+    return {k: v for k, v in data.items() if k in keys}
+
+
+class SqliteStatePersistence(BasePersistence):
+    """Хранение context.user_data и chat_data в SQLite.
+
+    - Application сам вызывает update_user_data раз в `update_interval` секунд
+      для всех, кто был активен; все записи одного прохода уходят на диск
+      одной транзакцией в executor'е.
+    - Перед каждым апдейтом refresh_user_data перечитывает строку пользователя,
+      если её обновил другой процесс: состояние общее для нескольких реплик.
+    - Сессии без активности дольше `ttl` секунд удаляются и из памяти
+      (см. sweep_expired), и из базы. Ключи из `keep_keys` (выбранный класс,
+      сообщение с меню) не истекают: от такой сессии остаются только они.
+
+    В user_data должны лежать только JSON-совместимые значения.
+    """
+
+    def __init__(
+        self,
+        path: str = STATE_FILE,
+        ttl: float = 86400.0,
+        update_interval: float = 5.0,
+        keep_keys: Iterable[str] = (),
+    ) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self.ttl = ttl
+        self.keep_keys = frozenset(keep_keys)
+        self._writer: sqlite3.Connection | None = None  # только из executor'а
+        self._reader: sqlite3.Connection | None = None  # только из event loop
+        self._pending: Dict[Key, Optional[str]] = {}  # None — удалить строку
+        self._batch: asyncio.Task | None = None
+        self._lock: asyncio.Lock | None = None  # одна запись в базу за раз
+        # Что и когда записано последним: неизменённые данные не переписываем
+        self._written: Dict[Key, Tuple[str, float]] = {}
+        self._seen: Dict[Key, float] = {}  # последняя активность в этом процессе
+
+    # --- соединения ---------------------------------------------------------
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = _connect(self.path)
+        conn.executescript(SCHEMA)
+        return conn
+
+    @property
+    def writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = self._open()
+        return self._writer
+
+    @property
+    def reader(self) -> sqlite3.Connection:
+        if self._reader is None:
+            self._reader = self._open()
+        return self._reader
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    # --- загрузка -----------------------------------------------------------
+
+    def _load(self, kind: str) -> Dict[int, Dict[Any, Any]]:
+        cutoff = time.time() - self.ttl
+        result: Dict[int, Dict[Any, Any]] = {}
+        for id_, raw, updated_at in self.reader.execute("SELECT id, data, updated_at FROM state WHERE kind = ?", (kind,)):
+            try:
+                data = json.loads(raw)
+            except json.JSONDecodeError:
+                logger.warning("Пропускаю повреждённое состояние %s %s", kind, id_)
+                continue
+            if updated_at < cutoff:
+                # Сессия истекла, но выбранный класс и т.п. остаются
+                data = _only(data, self.keep_keys)
+                if not data:
+                    continue
+            result[id_] = data
+            self._written[(kind, id_)] = (raw, updated_at)
+            self._seen[(kind, id_)] = updated_at
+        return result
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return self._load(USER)
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return self._load(CHAT)
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Any, Any]:
+        return {}
+
+    # --- запись пачкой ------------------------------------------------------
+
+    def _stage(self, key: Key, data: Optional[Dict[Any, Any]]) -> bool:
+        now = time.time()
+        if not data:
+            # Пустое состояние не храним
+            if key in self._written or key in self._pending:
+                self._written.pop(key, None)
+                self._pending[key] = None
+                return True
+            return False
+        try:
+            raw = _dumps(data)
+        except (TypeError, ValueError):
+            logger.warning("Состояние %s %s не сериализуется в JSON, не сохраняю", *key)
+            return False
+        written = self._written.get(key)
+        # Те же данные переписываем лишь изредка — чтобы не истекли по ttl
+        if written is not None and written[0] == raw and now - written[1] < self.ttl / 4:
+            return False
+        self._written[key] = (raw, now)
+        self._pending[key] = raw
+        return True
+
+    def _commit(self, batch: Dict[Key, Optional[str]], now: float) -> None:
+        conn = self.writer
+        with conn:
+            conn.executemany(
+                "INSERT INTO state(kind, id, data, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(kind, id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                [(kind, id_, raw, now) for (kind, id_), raw in batch.items() if raw is not None],
+            )
+            conn.executemany(
+                "DELETE FROM state WHERE kind = ? AND id = ?",
+                [key for key, raw in batch.items() if raw is None],
+            )
+
+    async def _write_batch(self) -> None:
+        # Даём остальным update_* этого прохода (они запущены через gather) добавить свои записи
+        await asyncio.sleep(0)
+        self._batch = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        async with self.lock:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._commit, batch, time.time())
+            except Exception:
+                # Вернём в очередь: новые записи тех же ключей важнее старых
+                for key, raw in batch.items():
+                    self._pending.setdefault(key, raw)
+                raise
+
+    async def _schedule_write(self) -> None:
+        if self._batch is None:
+            self._batch = asyncio.get_running_loop().create_task(self._write_batch())
+        await asyncio.shield(self._batch)
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        if self._stage((USER, user_id), data):
+            await self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        if self._stage((CHAT, chat_id), data):
+            await self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if self._stage((USER, user_id), None):
+            await self._schedule_write()
+        self._seen.pop((USER, user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        if self._stage((CHAT, chat_id), None):
+            await self._schedule_write()
+        self._seen.pop((CHAT, chat_id), None)
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: Tuple[int | str, ...], new_state: object | None) -> None:
+        pass
+
+    # --- синхронизация с другими процессами ---------------------------------
+
+    def _refresh(self, key: Key, current: Dict[Any, Any]) -> None:
+        self._seen[key] = time.time()
+        if key in self._pending:
+            return  # свои несохранённые правки новее
+        row = self.reader.execute(
+            "SELECT data, updated_at FROM state WHERE kind = ? AND id = ?", key
+        ).fetchone()
+        written = self._written.get(key)
+        if row is None:
+            if written is not None:
+                # Строку удалил другой процесс (сессия завершена или истекла)
+                self._written.pop(key, None)
+                current.clear()
+            return
+        raw, updated_at = row
+        if written is not None and (written[0] == raw or written[1] >= updated_at):
+            return
+        try:
+            fresh = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        current.clear()
+        current.update(fresh)
+        self._written[key] = (raw, updated_at)
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        self._refresh((USER, user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        self._refresh((CHAT, chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    # --- истечение сессий ---------------------------------------------------
+
+    def _delete_expired(self, cutoff: float) -> int:
+        """Удалить истёкшие строки; в строках с keep_keys оставить только их."""
+        conn = self.writer
+        now = time.time()
+        with conn:
+            if not self.keep_keys:
+                return conn.execute("DELETE FROM state WHERE updated_at < ?", (cutoff,)).rowcount
+            removed: List[Tuple[str, int]] = []
+            kept: List[Tuple[str, float, str, int]] = []
+            for kind, id_, raw in conn.execute("SELECT kind, id, data FROM state WHERE updated_at < ?", (cutoff,)):
+                try:
+                    data = _only(json.loads(raw), self.keep_keys)
+                except json.JSONDecodeError:
+                    data = {}
+                if data:
+                    kept.append((_dumps(data), now, kind, id_))
+                else:
+                    removed.append((kind, id_))
+            conn.executemany("UPDATE state SET data = ?, updated_at = ? WHERE kind = ? AND id = ?", kept)
+            conn.executemany("DELETE FROM state WHERE kind = ? AND id = ?", removed)
+            return len(removed)
+
+    async def sweep_expired(self, application: Application) -> int:
+        """Забыть сессии без активности дольше ttl: в памяти и в базе."""
+        cutoff = time.time() - self.ttl
+        expired: List[Key] = [key for key, seen in self._seen.items() if seen < cutoff]
+        for kind, id_ in expired:
+            del self._seen[(kind, id_)]
+            self._written.pop((kind, id_), None)
+            self._pending.pop((kind, id_), None)
+            current = (application.user_data if kind == USER else application.chat_data).get(id_)
+            kept = _only(current, self.keep_keys) if current else {}
+            if kept:
+                # Шаги редактирования забываем, выбранный класс — нет (строку в базе обрежет _delete_expired)
+                current.clear()  # type: ignore[union-attr]
+                current.update(kept)  # type: ignore[union-attr]
+            elif kind == USER:
+                application.drop_user_data(id_)
+            else:
+                application.drop_chat_data(id_)
+        # Записи, не попавшие в _seen: пользователи, ни разу не писавшие этому процессу
+        for user_id in [u for u in application.user_data if (USER, u) not in self._seen]:
+            self._seen[(USER, user_id)] = time.time()
+        for chat_id in [c for c in application.chat_data if (CHAT, c) not in self._seen]:
+            self._seen[(CHAT, chat_id)] = time.time()
+        async with self.lock:
+            removed = await asyncio.get_running_loop().run_in_executor(None, self._delete_expired, cutoff)
+        if expired or removed:
+            logger.info("Истекло сессий: %d в памяти, %d в базе", len(expired), removed)
+        return len(expired)
+
+    async def flush(self) -> None:
+        if self._batch is not None:
+            await asyncio.gather(self._batch, return_exceptions=True)
+        async with self.lock:
+            if self._pending:
+                batch, self._pending = self._pending, {}
+                await asyncio.get_running_loop().run_in_executor(None, self._commit, batch, time.time())
+        for conn in (self._writer, self._reader):
+            if conn is not None:
+                conn.close()
+        self._writer = self._reader = None
+
+
+async def _sweep_forever(application: Application, persistence: SqliteStatePersistence) -> None:
+    interval = max(1.0, min(persistence.ttl / 4, 3600.0))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await persistence.sweep_expired(application)
+        except Exception:
+            logger.exception("Не удалось удалить истёкшие сессии")
+
+
+def start_state_sweeper(application: Application) -> asyncio.Task | None:
+    """Периодически удалять брошенные сессии (если включено хранение состояния)."""
+    persistence = application.persistence
+    if not isinstance(persistence, SqliteStatePersistence):
+        return None
+    # Не через application.create_task: такие задачи Application ждёт при остановке
+    return asyncio.get_running_loop().create_task(_sweep_forever(application, persistence))
+
+
+def build_persistence(
+    backend: str, path: str | None, ttl: float, update_interval: float, keep_keys: Iterable[str] = ()
+) -> BasePersistence | None:
+    """"sqlite" — состояние на диске, "memory" — как раньше, только в памяти процесса."""
+    if backend == "memory":
+        return None
+    if backend == "sqlite":
+        return SqliteStatePersistence(path or STATE_FILE, ttl=ttl, update_interval=update_interval, keep_keys=keep_keys)
+    raise ValueError(f"Неизвестное хранилище состояния: {backend!r}")
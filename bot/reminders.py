@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import re
+import sqlite3
+import time as _time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import Forbidden, RetryAfter, TelegramError
+from telegram.ext import Application, ContextTypes, Job
+
+from bot.data import DEFAULT_TENANT, get_schedule_for_day, get_tomorrow_day_key
+from bot.render import render_homework_for_day
+from bot.storage import tenant_exists
+from bot.telegram_api import already_throttled, get_limiter
+from bot.tenants import use_tenant
+
+
+SUBSCRIPTIONS_FILE = os.path.join(os.path.dirname(__file__), "subscriptions.sqlite3")
+
+logger = logging.getLogger(__name__)
+
+
+# Подписки на "ДЗ на завтра": по строке на чат (личка или группа).
+# last_sent — локальная дата последней доставленной рассылки: по ней несколько
+# процессов бота (и перезапуск в ту же минуту) не отправят одно напоминание
+# дважды. lease_until — до какого момента (unix time) чат занят процессом,
+# который сейчас ему отправляет; после сбоя аренда истекает сама.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    chat_id INTEGER PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    time TEXT NOT NULL,
+    tz TEXT NOT NULL,
+    last_sent TEXT,
+    lease_until REAL
+);
+"""
+
+TIME_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+# Пропущенную (бот был выключен) рассылку ещё отправляем, если опоздали не больше чем на
+MISFIRE_GRACE = timedelta(hours=1)
+# На сколько секунд чат закрепляется за процессом, который отправляет ему напоминание
+LEASE_SECONDS = 120.0
+
+
+def parse_time(raw: str) -> str | None:
+    """"7:05" → "07:05"; None, если это не время."""
+    match = TIME_RE.match(raw.strip())
+    if not match:
+        return None
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class Subscription:
+    chat_id: int
+    tenant_id: str = DEFAULT_TENANT
+    time: str = "19:00"  # HH:MM по часовому поясу tz
+    tz: str = "Europe/Moscow"
+
+    @property
+    def slot(self) -> Slot:
+        return (self.time, self.tz)
+
+    @property
+    def is_group(self) -> bool:
+        # У групп и супергрупп отрицательные id
+        return self.chat_id < 0
+
+
+# Момент рассылки: все подписчики с одинаковым временем и поясом получают её вместе
+Slot = Tuple[str, str]
+
+
+def next_due(slot: Slot, after: datetime) -> datetime:
+    """Ближайший момент рассылки слота строго позже `after` (aware datetime)."""
+    time_, tz_name = slot
+    hour, minute = map(int, time_.split(":"))
+    local = after.astimezone(ZoneInfo(tz_name))
+    due = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if due <= local:
+        due += timedelta(days=1)
+    return due
+
+
+# Рассылка слота (time, tz) за дату ещё не доставлена и чат никем не занят
+_DUE_WHERE = "time = ? AND tz = ? AND (last_sent IS NULL OR last_sent < ?) AND (lease_until IS NULL OR lease_until < ?)"
+
+
+class SubscriptionStore:
+    """Подписки в SQLite (общий файл для нескольких процессов бота)."""
+
+    def __init__(self, path: str = SUBSCRIPTIONS_FILE) -> None:
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(subscriptions)")}
+            if "lease_until" not in columns:  # база от старой версии
+                conn.execute("ALTER TABLE subscriptions ADD COLUMN lease_until REAL")
+            self._conn = conn
+        return self._conn
+
+    def load_all(self) -> List[Subscription]:
+        rows = self.conn.execute("SELECT chat_id, tenant_id, time, tz FROM subscriptions")
+        return [Subscription(*row) for row in rows]
+
+    def get(self, chat_id: int) -> Subscription | None:
+        row = self.conn.execute(
+            "SELECT chat_id, tenant_id, time, tz FROM subscriptions WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        return Subscription(*row) if row else None
+
+    def upsert(self, sub: Subscription) -> None:
+        self.conn.execute(
+            "INSERT INTO subscriptions(chat_id, tenant_id, time, tz) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET tenant_id = excluded.tenant_id, "
+            "time = excluded.time, tz = excluded.tz",
+            (sub.chat_id, sub.tenant_id, sub.time, sub.tz),
+        )
+
+    def delete(self, chat_id: int) -> bool:
+        return self.conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,)).rowcount > 0
+
+    def pending(self, slot: Slot, chat_ids: Iterable[int], day: date) -> Set[int]:
+        """Чаты, которые ещё не получили рассылку за `day` и не заняты другим процессом.
+
+        Учитываются только строки с тем же временем и поясом: если подписку
+        изменили или удалили в другом процессе, старое напоминание не уйдёт.
+        """
+        ids = list(chat_ids)
+        stamp = day.isoformat()
+        now = _time.time()
+        found: Set[int] = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT chat_id FROM subscriptions WHERE {_DUE_WHERE} AND chat_id IN ({marks})",
+                [slot[0], slot[1], stamp, now, *chunk],
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    def lease(self, slot: Slot, chat_id: int, day: date) -> bool:
+        """Занять чат на LEASE_SECONDS перед отправкой.
+
+        False — рассылка уже ушла или её сейчас отправляет другой процесс.
+        """
+        now = _time.time()
+        return self.conn.execute(
+            f"UPDATE subscriptions SET lease_until = ? WHERE {_DUE_WHERE} AND chat_id = ?",
+            (now + LEASE_SECONDS, slot[0], slot[1], day.isoformat(), now, chat_id),
+        ).rowcount > 0
+
+    def mark_sent(self, chat_id: int, day: date) -> None:
+        self.conn.execute(
+            "UPDATE subscriptions SET last_sent = ?, lease_until = NULL WHERE chat_id = ?", (day.isoformat(), chat_id)
+        )
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ReminderScheduler:
+    """Рассылка "ДЗ на завтра" подписчикам через job_queue приложения.
+
+    Подписчики сгруппированы по слотам (время + пояс). Ближайшие рассылки
+    лежат в куче (момент, слот), а в job_queue всегда стоит одна задача — на
+    вершину кучи. Когда она срабатывает, текст ДЗ рендерится один раз на пару
+    (класс, день) и отправляется всем подписчикам наступивших слотов.
+    """
+
+    def __init__(self, store: SubscriptionStore) -> None:
+        self.store = store
+        self._slots: Dict[Slot, Dict[int, Subscription]] = {}
+        self._by_chat: Dict[int, Subscription] = {}
+        self._due: Dict[Slot, datetime] = {}  # актуальная запись кучи для слота
+        self._heap: List[Tuple[datetime, Slot]] = []  # устаревшие записи пропускаются
+        self._application: Application | None = None
+        self._job: Job | None = None
+        self._job_due: datetime | None = None
+
+    def __len__(self) -> int:
+        return len(self._by_chat)
+
+    def get(self, chat_id: int) -> Subscription | None:
+        # Из базы: подписку могли изменить через другой процесс бота
+        return self.store.get(chat_id)
+
+    # --- куча слотов --------------------------------------------------------
+
+    def _add(self, sub: Subscription, due: datetime | None = None) -> None:
+        self._remove(sub.chat_id)
+        self._by_chat[sub.chat_id] = sub
+        subscribers = self._slots.setdefault(sub.slot, {})
+        subscribers[sub.chat_id] = sub
+        if sub.slot not in self._due:
+            if due is None:
+                due = next_due(sub.slot, datetime.now(timezone.utc))
+            self._push(sub.slot, due)
+
+    def _remove(self, chat_id: int) -> Subscription | None:
+        sub = self._by_chat.pop(chat_id, None)
+        if sub is None:
+            return None
+        subscribers = self._slots.get(sub.slot)
+        if subscribers is not None:
+            subscribers.pop(chat_id, None)
+            if not subscribers:
+                # Запись в куче остаётся и будет пропущена при срабатывании
+                del self._slots[sub.slot]
+                self._due.pop(sub.slot, None)
+        return sub
+
+    def _push(self, slot: Slot, due: datetime) -> None:
+        self._due[slot] = due
+        heapq.heappush(self._heap, (due, slot))
+
+    def _head(self) -> datetime | None:
+        heap = self._heap
+        while heap and self._due.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def _arm(self) -> None:
+        """Поставить задачу job_queue на ближайшую рассылку (если она сдвинулась)."""
+        if self._application is None or self._application.job_queue is None:
+            return
+        head = self._head()
+        if head == self._job_due and self._job is not None:
+            return
+        if self._job is not None:
+            self._job.schedule_removal()
+            self._job = None
+        self._job_due = head
+        if head is not None:
+            delay = (head - datetime.now(timezone.utc)).total_seconds()
+            self._job = self._application.job_queue.run_once(self._fire, when=max(delay, 0.0), name="reminders")
+
+    # --- подписка -----------------------------------------------------------
+
+    def subscribe(self, sub: Subscription) -> None:
+        self.store.upsert(sub)
+        self._add(sub)
+        self._arm()
+
+    def unsubscribe(self, chat_id: int) -> bool:
+        removed = self.store.delete(chat_id)
+        removed = self._remove(chat_id) is not None or removed
+        self._arm()
+        return removed
+
+    def start(self, application: Application) -> None:
+        if application.job_queue is None:
+            logger.warning(
+                "Напоминания отключены: нет job_queue (pip install \"python-telegram-bot[job-queue]\")"
+            )
+            return
+        self._application = application
+        # Рассылку, пропущенную пока бот был выключен, отправим сразу; кто её
+        # уже получил, отсеет pending
+        since = datetime.now(timezone.utc) - MISFIRE_GRACE
+        for sub in self.store.load_all():
+            if not is_valid_timezone(sub.tz):
+                logger.warning("Подписка %s: неизвестный пояс %s, пропускаю", sub.chat_id, sub.tz)
+                continue
+            self._add(sub, next_due(sub.slot, since))
+        self._arm()
+        logger.info("Подписок на напоминания: %d", len(self._by_chat))
+
+    def stop(self) -> None:
+        if self._job is not None:
+            self._job.schedule_removal()
+            self._job = None
+        self._job_due = None
+        self._application = None
+        self.store.close()
+
+    # --- рассылка -----------------------------------------------------------
+
+    def _pop_due(self, now: datetime) -> List[Tuple[Slot, datetime]]:
+        due_slots = []
+        while True:
+            head = self._head()
+            if head is None or head > now:
+                break
+            _, slot = heapq.heappop(self._heap)
+            if now - head <= MISFIRE_GRACE:
+                due_slots.append((slot, head))
+            else:
+                logger.warning("Рассылка %s %s за %s пропущена: опоздание %s", *slot, head.date(), now - head)
+            # Следующая рассылка этого слота — завтра в то же время
+            if slot in self._slots:
+                self._push(slot, next_due(slot, max(head, now)))
+            else:
+                self._due.pop(slot, None)
+        return due_slots
+
+    async def _fire(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self._job = None
+        self._job_due = None
+        try:
+            await self.deliver_due(context.bot, datetime.now(timezone.utc))
+        finally:
+            self._arm()
+
+    async def deliver_due(self, bot: Bot, now: datetime) -> int:
+        """Разослать все наступившие слоты; вернуть число отправленных сообщений."""
+        # (класс, день) → (подписка, дата рассылки): текст ДЗ рендерится один раз на группу
+        groups: Dict[Tuple[str, str], List[Tuple[Subscription, date]]] = {}
+        for slot, due in self._pop_due(now):
+            subscribers = self._slots.get(slot)
+            if not subscribers:
+                continue
+            day_key = get_tomorrow_day_key(due)
+            for chat_id in self.store.pending(slot, list(subscribers), due.date()):
+                sub = subscribers[chat_id]
+                groups.setdefault((sub.tenant_id, day_key), []).append((sub, due.date()))
+
+        sent = 0
+        for (tenant_id, day_key), targets in groups.items():
+            if tenant_id != DEFAULT_TENANT and not tenant_exists(tenant_id):
+                logger.warning("Класса %s больше нет, напоминания %d чатам не отправлены", tenant_id, len(targets))
+                continue
+            async with use_tenant(tenant_id):
+                if not get_schedule_for_day(day_key):
+                    continue  # завтра уроков нет — не беспокоим
+                text = render_homework_for_day(day_key)
+            for sub, day in targets:
+                # Отметка — после каждой доставки: после сбоя непомеченные чаты
+                # получат напоминание при перезапуске (в пределах MISFIRE_GRACE)
+                if not self.store.lease(sub.slot, sub.chat_id, day):
+                    continue
+                if await self._send(bot, sub, text):
+                    self.store.mark_sent(sub.chat_id, day)
+                    sent += 1
+        if groups:
+            logger.info("Напоминания о ДЗ: отправлено %d", sent)
+        return sent
+
+    async def _send(self, bot: Bot, sub: Subscription, text: str) -> bool:
+        # Лимиты Telegram общие для всего бота — делим их с рассылками админа
+        limiter = get_limiter()
+        chat_id = sub.chat_id
+        for _ in range(2):
+            await limiter.acquire(chat_id, sub.is_group)
+            try:
+                with already_throttled():
+                    await bot.send_message(chat_id, text, parse_mode=ParseMode.HTML)
+                return True
+            except RetryAfter as e:
+                limiter.pause(e.retry_after)
+            except Forbidden:
+                # Бота заблокировали или удалили из группы — подписка больше не нужна
+                logger.info("Чат %s недоступен, отписываю", chat_id)
+                self.unsubscribe(chat_id)
+                return False
+            except TelegramError:
+                logger.exception("Не удалось отправить напоминание в чат %s", chat_id)
+                return False
+        return False
+
+
+_scheduler: ReminderScheduler | None = None
+
+
+def configure_reminders(path: str | None) -> ReminderScheduler:
+    global _scheduler
+    _scheduler = ReminderScheduler(SubscriptionStore(path or SUBSCRIPTIONS_FILE))
+    return _scheduler
+
+
+def get_scheduler() -> ReminderScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ReminderScheduler(SubscriptionStore())
+    return _scheduler
+
+
+def start_reminders(application: Application) -> None:
+    get_scheduler().start(application)
+
+
+def stop_reminders() -> None:
+    if _scheduler is not None:
+        _scheduler.stop()
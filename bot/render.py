@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Tuple
+
+from bot.data import (
+    SCHEDULE,
+    DayKey,
+    Mutation,
+    add_mutation_listener,
+    add_reload_listener,
+    current_store,
+    get_day_keys_for_subject,
+    get_day_label,
+    get_schedule_for_day,
+)
+
+
+# Готовые тексты сообщений по дням: ключ — (вид, день), у каждого класса свои
+# (DataStore.extras). Сбрасываются точечно: правка урока/дня — только этот день,
+# правка предмета — только дни, где он стоит в расписании.
+_EXTRAS_KEY = "render"
+
+VIEW_DAY = "day"  # расписание на день (ученик)
+VIEW_HOMEWORK = "homework"  # "ДЗ на завтра" (HTML)
+VIEW_EDITOR = "editor"  # экран редактирования расписания (админ)
+
+# Какие виды показывают домашнее задание, а какие — только названия предметов
+_VIEWS_WITH_HOMEWORK = (VIEW_HOMEWORK,)
+_ALL_VIEWS = (VIEW_DAY, VIEW_HOMEWORK, VIEW_EDITOR)
+
+
+def _render_day(day_key: DayKey) -> str:
+    day_label = get_day_label(day_key)
+    schedule = get_schedule_for_day(day_key)
+    if not schedule:
+        return f"На {day_label} занятий нет."
+    lines = [f"Расписание на {day_label}:"]
+    for order, subject in schedule:
+        lines.append(f"{order}. {subject.name}")
+    return "\n".join(lines)
+
+
+def _render_homework(day_key: DayKey) -> str:
+    day_label = get_day_label(day_key)
+    schedule = get_schedule_for_day(day_key)
+    if not schedule:
+        return f"На {day_label} занятий нет."
+    lines = [f"ДЗ на завтра ({day_label}):"]
+    for order, subject in schedule:
+        lines.append(f"{order}. <b>{subject.name}</b>: {subject.homework}")
+    return "\n".join(lines)
+
+
+def _render_editor(day_key: DayKey) -> str:
+    day_label = get_day_label(day_key)
+    schedule = get_schedule_for_day(day_key)
+    if not schedule:
+        return f"Редактирование расписания: {day_label}\nНа {day_label} занятий нет."
+    lines = [f"Редактирование расписания: {day_label}"]
+    for order, subject in schedule:
+        lines.append(f"{order}. {subject.name}")
+    return "\n".join(lines)
+
+
+_RENDERERS: Dict[str, Callable[[DayKey], str]] = {
+    VIEW_DAY: _render_day,
+    VIEW_HOMEWORK: _render_homework,
+    VIEW_EDITOR: _render_editor,
+}
+
+
+def _cache() -> Dict[Tuple[str, DayKey], str]:
+    extras = current_store().extras
+    cache = extras.get(_EXTRAS_KEY)
+    if cache is None:
+        cache = extras[_EXTRAS_KEY] = {}
+    return cache
+
+
+def _cached(view: str, day_key: DayKey) -> str:
+    if day_key not in SCHEDULE:
+        # Ключ из callback_data может быть любым (старая кнопка, удалённый день):
+        # кешируем только дни расписания, иначе кеш растёт без предела
+        return _RENDERERS[view](day_key)
+    cache = _cache()
+    key = (view, day_key)
+    text = cache.get(key)
+    if text is None:
+        text = cache[key] = _RENDERERS[view](day_key)
+    return text
+
+
+def render_day_schedule(day_key: DayKey) -> str:
+    return _cached(VIEW_DAY, day_key)
+
+
+def render_homework_for_day(day_key: DayKey) -> str:
+    return _cached(VIEW_HOMEWORK, day_key)
+
+
+def render_day_editor(day_key: DayKey) -> str:
+    return _cached(VIEW_EDITOR, day_key)
+
+
+def invalidate_day(day_key: DayKey, views: Tuple[str, ...] = _ALL_VIEWS) -> None:
+    cache = current_store().extras.get(_EXTRAS_KEY)
+    if not cache:
+        return
+    for view in views:
+        cache.pop((view, day_key), None)
+
+
+def clear_render_cache() -> None:
+    current_store().extras.pop(_EXTRAS_KEY, None)
+
+
+def _on_mutation(op: Mutation) -> None:
+    kind = op["op"]
+    if "day" in op:
+        invalidate_day(op["day"])
+    elif kind == "set_homework":
+        for day_key in get_day_keys_for_subject(op["subject"]):
+            invalidate_day(day_key, _VIEWS_WITH_HOMEWORK)
+    elif kind == "rename_subject":
+        for day_key in get_day_keys_for_subject(op["subject"]):
+            invalidate_day(day_key)
+    elif kind == "delete_subject":
+        # Индекс уже не знает, где стоял удалённый предмет; удаление — редкость
+        clear_render_cache()
+    # add_subject не меняет ни одного дня
+
+
+add_mutation_listener(_on_mutation)
+add_reload_listener(clear_render_cache)
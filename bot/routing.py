@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Set, Tuple
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ContextTypes
+
+
+RouteHandler = Callable[..., Awaitable[None]]
+Converter = Callable[[str], Any]
+
+CONVERTERS: Dict[str, Converter] = {
+    "str": str,
+    "int": int,
+    "rest": str,  # последний параметр, может содержать ':'
+}
+
+# Сегмент шаблона: '{name:type}' целиком (внутри тоже есть ':') или литерал
+_SEGMENT_RE = re.compile(r"\{[^}]*\}|[^:]+")
+
+
+@dataclass(frozen=True)
+class Route:
+    pattern: str
+    handler: RouteHandler
+    params: Tuple[Tuple[str, Converter], ...]
+    admin_only: bool = False
+    rest: bool = False
+    name: str = ""  # литералы шаблона без параметров: "edit:sched:day"
+
+
+def _compile(pattern: str) -> Tuple[str, int, Tuple[Tuple[str, Converter], ...], bool]:
+    """'edit:sched:del_choose:{index:int}' → ('edit:sched:del_choose', 3, (('index', int),), False)"""
+    literals: List[str] = []
+    params: List[Tuple[str, Converter]] = []
+    rest = False
+    for segment in _SEGMENT_RE.findall(pattern):
+        if segment.startswith("{") and segment.endswith("}"):
+            name, _, conv = segment[1:-1].partition(":")
+            conv = conv or "str"
+            if conv not in CONVERTERS:
+                raise ValueError(f"Неизвестный тип параметра {conv!r} в {pattern!r}")
+            if rest:
+                raise ValueError(f"Параметр :rest должен быть последним: {pattern!r}")
+            rest = conv == "rest"
+            params.append((name, CONVERTERS[conv]))
+        else:
+            if params:
+                raise ValueError(f"Литералы после параметров не поддерживаются: {pattern!r}")
+            literals.append(segment)
+    return ":".join(literals), len(literals), tuple(params), rest
+
+
+class CallbackRouter:
+    """Таблица маршрутов для callback_data вида 'edit:sched:add:{subject_key}'.
+
+    Маршруты компилируются один раз при регистрации в словари: сначала точное
+    совпадение всей строки, затем (префикс из литералов, число параметров).
+    Разбор — один split и несколько поисков по словарю, без цепочек if/elif.
+    """
+
+    def __init__(
+        self,
+        is_admin: Callable[[Update], bool] | None = None,
+        denied_text: str = "Только для админа",
+    ) -> None:
+        self.is_admin = is_admin
+        self.denied_text = denied_text
+        self.routes: List[Route] = []
+        self._exact: Dict[str, Route] = {}
+        self._by_prefix: Dict[Tuple[str, int], Route] = {}  # (префикс, число параметров)
+        self._rest: Dict[str, Route] = {}
+        self._literal_counts: List[int] = []  # по убыванию: длинные префиксы важнее
+        _routers.append(self)
+
+    def add_route(self, pattern: str, handler: RouteHandler, admin_only: bool = False) -> Route:
+        prefix, n_literals, params, rest = _compile(pattern)
+        route = Route(pattern=pattern, handler=handler, params=params, admin_only=admin_only, rest=rest, name=prefix)
+        if not params:
+            table: Dict[Any, Route] = self._exact
+            key: Any = prefix
+        elif rest:
+            table, key = self._rest, prefix
+        else:
+            table, key = self._by_prefix, (prefix, len(params))
+        if key in table:
+            raise ValueError(f"Маршрут {pattern!r} пересекается с {table[key].pattern!r}")
+        table[key] = route
+        self.routes.append(route)
+        if params and n_literals not in self._literal_counts:
+            self._literal_counts.append(n_literals)
+            self._literal_counts.sort(reverse=True)
+        return route
+
+    def route(self, *patterns: str, admin_only: bool = False) -> Callable[[RouteHandler], RouteHandler]:
+        """Декоратор: зарегистрировать обработчик под одним или несколькими шаблонами."""
+
+        def decorator(handler: RouteHandler) -> RouteHandler:
+            for pattern in patterns:
+                self.add_route(pattern, handler, admin_only=admin_only)
+            return handler
+
+        return decorator
+
+    def resolve(self, data: str) -> Tuple[Route, Dict[str, Any]] | None:
+        route = self._exact.get(data)
+        if route is not None:
+            return route, {}
+        parts = data.split(":")
+        for n in self._literal_counts:
+            n_params = len(parts) - n
+            if n_params < 1:
+                continue
+            prefix = ":".join(parts[:n])
+            route = self._by_prefix.get((prefix, n_params))
+            values = parts[n:]
+            if route is None:
+                route = self._rest.get(prefix)
+                if route is None:
+                    continue
+                if len(values) > len(route.params):
+                    keep = len(route.params) - 1
+                    values = values[:keep] + [":".join(values[keep:])]
+                elif len(values) < len(route.params):
+                    continue
+            try:
+                return route, {name: conv(value) for (name, conv), value in zip(route.params, values)}
+            except ValueError:
+                return None
+        return None
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        """Вызвать обработчик для update.callback_query.data. False — маршрут не найден."""
+        query = update.callback_query
+        if not query:
+            return False
+        resolved = self.resolve(query.data or "")
+        if resolved is None:
+            return False
+        route, params = resolved
+        if route.admin_only and self.is_admin is not None and not self.is_admin(update):
+            await query.answer(self.denied_text)
+            return True
+        await route.handler(update, context, **params)
+        return True
+
+
+# Имена маршрутов для статистики и метрик: без параметров, чтобы их было
+# столько же, сколько экранов и команд, а не пользователей и предметов
+_routers: List[CallbackRouter] = []
+_commands: Set[str] = set()
+
+
+def route_name(data: str) -> str:
+    """"edit:sched:day:mon" → "edit:sched:day", "menu:subjects" → "menu:subjects", "subject:phys" → "subject"."""
+    for router in _routers:
+        resolved = router.resolve(data)
+        if resolved is not None:
+            return resolved[0].name
+    # Кнопки без таблицы маршрутов (subject:, day:, hist:): только первый сегмент
+    return data.split(":", 1)[0] or "?"
+
+
+def command_name(text: str) -> str:
+    """"/Start@bot arg" → "/start"; незарегистрированные команды — одним именем "/?"."""
+    command = text.split(maxsplit=1)[0].split("@", 1)[0].lower()
+    if _commands and command[1:] not in _commands:
+        return "/?"
+    return command
+
+
+def register_commands(application: Application) -> None:
+    """Запомнить команды всех CommandHandler приложения (для command_name)."""
+    names: Iterable[str] = (
+        name
+        for handlers in application.handlers.values()
+        for handler in handlers
+        if isinstance(handler, CommandHandler)
+        for name in handler.commands
+    )
+    _commands.update(names)
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import heapq
+import re
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+from bot.data import SUBJECTS, Mutation, SubjectKey, add_mutation_listener, add_reload_listener, current_store
+from bot.history import HistoryEntry, get_history
+
+
+# Поиск по ДЗ (/search): обратный индекс «слово → документы» у каждого класса
+# в DataStore.extras. Строится при первом поиске, дальше обновляется правками
+# (set_homework и т.п.), а не пересобирается целиком. Прошлые задания из
+# архива (bot/history.py) — отдельные документы ("hist", id): индекс
+# дочитывает новые записи архива перед каждым поиском.
+_EXTRAS_KEY = "search"
+_HISTORY_DOC = "hist"
+
+# Сколько прошлых заданий показывать в ответе
+PAST_LIMIT = 5
+
+# Вес совпадения в названии предмета и в тексте задания
+NAME_WEIGHT = 3.0
+TEXT_WEIGHT = 1.0
+# Слово запроса — начало слова в тексте ("ньют" → "ньютона"): весит меньше точного
+PREFIX_FACTOR = 0.5
+# Короче — только точное совпадение, иначе "с" находит пол-индекса
+MIN_PREFIX_LEN = 2
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Транслитерация (как в ключах предметов): «nyuton» находит «Ньютона»
+_TRANSLIT: Dict[str, str] = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d",
+    "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n",
+    "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "h", "ц": "c", "ч": "ch",
+    "ш": "sh", "щ": "sch", "ъ": "", "ы": "y", "ь": "",
+    "э": "e", "ю": "yu", "я": "ya",
+}
+
+# Окончания, которые отрезаем («законы», «законах» → «закон»); основа — не короче 3 букв
+_ENDINGS = sorted(
+    (
+        "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ией", "иях", "иям",
+        "ах", "ях", "ам", "ям", "ов", "ев", "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее",
+        "ую", "юю", "ом", "ем", "ия", "ие", "ии",
+        "а", "я", "ы", "и", "е", "о", "у", "ю", "ь",
+    ),
+    key=len,
+    reverse=True,
+)
+
+DocId = Hashable
+
+
+def transliterate(text: str) -> str:
+    return "".join(_TRANSLIT.get(ch, ch) for ch in text)
+
+
+@lru_cache(maxsize=65536)
+def _term(word: str) -> str:
+    # Слов в ДЗ немного и они повторяются: каждое разбираем один раз
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            word = word[: -len(ending)]
+            break
+    return transliterate(word)
+
+
+def terms(text: str) -> List[str]:
+    """Слова текста в виде, в котором они лежат в индексе."""
+    return [_term(word) for word in _TOKEN_RE.findall(text.lower().replace("ё", "е"))]
+
+
+class SearchIndex:
+    """Обратный индекс: терм → {документ: вес}, плюс отсортированный список термов
+    для поиска по началу слова (bisect)."""
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, Dict[DocId, float]] = {}
+        self._sorted_terms: List[str] = []
+        self._doc_terms: Dict[DocId, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(self, doc_id: DocId, fields: Iterable[Tuple[str, float]]) -> None:
+        """Проиндексировать документ (поля — текст и вес); старая версия заменяется."""
+        self.remove(doc_id)
+        weights: Dict[str, float] = {}
+        for text, weight in fields:
+            for term in terms(text):
+                weights[term] = weights.get(term, 0.0) + weight
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                insort(self._sorted_terms, term)
+            postings[doc_id] = weight
+        self._doc_terms[doc_id] = list(weights)
+
+    def remove(self, doc_id: DocId) -> None:
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+                del self._sorted_terms[bisect_left(self._sorted_terms, term)]
+
+    def _matches(self, term: str) -> Dict[DocId, float]:
+        """Документы с этим термом или (для термов от MIN_PREFIX_LEN) с термом, начинающимся с него."""
+        exact = self._postings.get(term, {})
+        if len(term) < MIN_PREFIX_LEN:
+            return exact
+        terms_ = self._sorted_terms
+        i = bisect_left(terms_, term)
+        if i < len(terms_) and terms_[i] == term:
+            i += 1
+        if i == len(terms_) or not terms_[i].startswith(term):
+            return exact  # только точное совпадение — без копирования
+        scores = {doc_id: weight * PREFIX_FACTOR for doc_id, weight in self._postings[terms_[i]].items()}
+        i += 1
+        while i < len(terms_) and terms_[i].startswith(term):
+            for doc_id, weight in self._postings[terms_[i]].items():
+                weight *= PREFIX_FACTOR
+                if weight > scores.get(doc_id, 0.0):
+                    scores[doc_id] = weight
+            i += 1
+        for doc_id, weight in exact.items():
+            if weight > scores.get(doc_id, 0.0):
+                scores[doc_id] = weight
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[DocId, float]]:
+        """Документы, где есть все слова запроса, от самых подходящих."""
+        query_terms = list(dict.fromkeys(terms(query)))
+        if not query_terms:
+            return []
+        # Начинаем с самого редкого слова: дальше только отсеиваем
+        matches = sorted((self._matches(term) for term in query_terms), key=len)
+        scores = matches[0]
+        for other in matches[1:]:
+            if not scores:
+                break
+            scores = {doc_id: score + other[doc_id] for doc_id, score in scores.items() if doc_id in other}
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    subject_key: SubjectKey
+    name: str
+    homework: str
+    score: float
+    day: str | None = None  # у прошлого задания — дата из архива (YYYY-MM-DD)
+
+
+class HomeworkIndex(SearchIndex):
+    """Индекс класса: предметы плюс прошлые задания из архива."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.past: Dict[int, HistoryEntry] = {}
+        self.past_upto = 0  # id последней прочитанной записи архива
+
+    def catch_up(self, tenant_id: str) -> None:
+        # Диапазон по первичному ключу: обычно ноль-несколько новых строк
+        for entry in get_history().since(tenant_id, self.past_upto):
+            self.past[entry.id] = entry
+            self.add((_HISTORY_DOC, entry.id), [(entry.homework, TEXT_WEIGHT)])
+            self.past_upto = entry.id
+
+
+def _subject_fields(subject_key: SubjectKey) -> List[Tuple[str, float]]:
+    subject = SUBJECTS[subject_key]
+    return [(subject.name, NAME_WEIGHT), (subject.homework, TEXT_WEIGHT)]
+
+
+def get_index() -> HomeworkIndex:
+    """Индекс текущего класса (строится при первом обращении)."""
+    store = current_store()
+    index = store.extras.get(_EXTRAS_KEY)
+    if index is None:
+        index = store.extras[_EXTRAS_KEY] = HomeworkIndex()
+        for subject_key in SUBJECTS:
+            index.add(subject_key, _subject_fields(subject_key))
+    index.catch_up(store.tenant_id)
+    return index
+
+
+def search_homework(query: str, limit: int = 10, past_limit: int = PAST_LIMIT) -> List[SearchHit]:
+    """Текущие задания (до limit), затем прошлые (до past_limit, hit.day задан)."""
+    index = get_index()
+    hits: List[SearchHit] = []
+    past: List[SearchHit] = []
+    seen = set()
+    for doc_id, score in index.search(query, limit + past_limit * 2):
+        if isinstance(doc_id, tuple):
+            entry = index.past[doc_id[1]]
+            subject = SUBJECTS.get(entry.subject_key)
+            # Текущее задание уже найдено как предмет; одинаковые тексты — один раз
+            if subject is None or entry.homework == subject.homework or (subject.key, entry.homework) in seen:
+                continue
+            seen.add((subject.key, entry.homework))
+            if len(past) < past_limit:
+                past.append(SearchHit(subject.key, subject.name, entry.homework, score, entry.day))
+            continue
+        subject = SUBJECTS.get(doc_id)  # type: ignore[call-overload]
+        if subject is not None and len(hits) < limit:
+            hits.append(SearchHit(subject.key, subject.name, subject.homework, score))
+    return hits + past
+
+
+def clear_search_index() -> None:
+    current_store().extras.pop(_EXTRAS_KEY, None)
+
+
+def _on_mutation(op: Mutation) -> None:
+    index = current_store().extras.get(_EXTRAS_KEY)
+    if index is None:
+        return
+    kind = op["op"]
+    if kind in ("set_homework", "rename_subject", "add_subject"):
+        if op["subject"] in SUBJECTS:
+            index.add(op["subject"], _subject_fields(op["subject"]))
+    elif kind == "delete_subject":
+        index.remove(op["subject"])
+    # Правки расписания текстов не меняют
+
+
+add_mutation_listener(_on_mutation)
+add_reload_listener(clear_search_index)
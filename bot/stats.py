@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from telegram import Update
+
+from bot.routing import command_name, route_name
+
+
+STATS_FILE = os.path.join(os.path.dirname(__file__), "stats.sqlite3")
+
+logger = logging.getLogger(__name__)
+
+# Как часто (сек) счётчики из памяти дописываются в базу
+FLUSH_INTERVAL = 60.0
+# Почасовые данные старше этого сворачиваются в посуточные
+HOURLY_RETENTION = timedelta(days=14)
+
+# Виды событий
+COMMAND = "command"  # /start, /help, ...
+CALLBACK = "callback"  # нажатие inline-кнопки (по маршруту: menu:subjects, edit:sched:day, ...)
+MESSAGE = "message"  # обычный текст
+OTHER = "other"
+
+# Временной ряд: счётчики (вид, имя) и сообщения по пользователям — по часам
+# (hour = unix-время // 3600, UTC), старые часы сворачиваются в дни (day —
+# дата по часовому поясу бота). Каждый процесс бота прибавляет свои приросты,
+# поэтому несколько воркеров пишут в один файл без блокировок друг друга.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hourly (
+    hour INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, kind, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hourly_users (
+    hour INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, kind, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_users (
+    day TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, user_id)
+) WITHOUT ROWID;
+"""
+
+_SPARKS = "▁▂▃▄▅▆▇█"
+
+EventKey = Tuple[int, str, str]  # (час, вид, имя)
+UserKey = Tuple[int, int]  # (час, user_id)
+
+
+def classify_update(update: Update) -> Tuple[str, str]:
+    """(вид, имя) события для статистики и метрик.
+
+    Параметры отбрасываются (см. bot.routing.route_name): "edit:sched:day:mon"
+    → "edit:sched:day", "subject:phys" → "subject".
+    """
+    query = update.callback_query
+    if query is not None:
+        return CALLBACK, route_name(query.data or "")
+    message = update.message
+    if message is not None and message.text:
+        if message.text.startswith("/"):
+            return COMMAND, command_name(message.text)
+        return MESSAGE, "text"
+    return OTHER, "update"
+
+
+class Series(NamedTuple):
+    """Строки базы для отчёта, прочитанные одним снимком."""
+
+    hourly_events: List[Tuple[int, str, str, int]]
+    hourly_users: List[Tuple[int, int]]
+    daily_totals: List[Tuple[str, int]]
+    daily_users: List[Tuple[str, int]]
+
+
+class StatsStore:
+    """Временной ряд статистики в SQLite.
+
+    Запись (add, rollup) и чтение отчёта идут через разные соединения и
+    вызываются из разных потоков; каждое соединение — под своей блокировкой.
+    """
+
+    def __init__(self, path: str = STATS_FILE, timezone: str = "Europe/Moscow") -> None:
+        self.path = path
+        self.tz = ZoneInfo(timezone)
+        self._conn: sqlite3.Connection | None = None  # чтение отчёта
+        self._writer: sqlite3.Connection | None = None
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(SCHEMA)
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = self._open()
+        return self._conn
+
+    @property
+    def writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = self._open()
+        return self._writer
+
+    def day_of(self, hour: int) -> str:
+        return datetime.fromtimestamp(hour * 3600, self.tz).date().isoformat()
+
+    def add(self, events: Dict[EventKey, int], users: Dict[UserKey, int]) -> None:
+        """Прибавить приросты счётчиков (одной транзакцией)."""
+        with self._write_lock:
+            conn = self.writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO hourly (hour, kind, name, count) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (hour, kind, name) DO UPDATE SET count = count + excluded.count",
+                    [(hour, kind, name, n) for (hour, kind, name), n in events.items()],
+                )
+                conn.executemany(
+                    "INSERT INTO hourly_users (hour, user_id, count) VALUES (?, ?, ?)"
+                    " ON CONFLICT (hour, user_id) DO UPDATE SET count = count + excluded.count",
+                    [(hour, user_id, n) for (hour, user_id), n in users.items()],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def rollup(self, before_hour: int) -> int:
+        """Свернуть часы раньше before_hour в дни. Возвращает число свёрнутых строк."""
+        with self._write_lock:
+            conn = self.writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                events: Counter[Tuple[str, str, str]] = Counter()
+                for hour, kind, name, n in conn.execute(
+                    "SELECT hour, kind, name, count FROM hourly WHERE hour < ?", (before_hour,)
+                ):
+                    events[(self.day_of(hour), kind, name)] += n
+                users: Counter[Tuple[str, int]] = Counter()
+                for hour, user_id, n in conn.execute(
+                    "SELECT hour, user_id, count FROM hourly_users WHERE hour < ?", (before_hour,)
+                ):
+                    users[(self.day_of(hour), user_id)] += n
+                conn.executemany(
+                    "INSERT INTO daily (day, kind, name, count) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (day, kind, name) DO UPDATE SET count = count + excluded.count",
+                    [(*key, n) for key, n in events.items()],
+                )
+                conn.executemany(
+                    "INSERT INTO daily_users (day, user_id, count) VALUES (?, ?, ?)"
+                    " ON CONFLICT (day, user_id) DO UPDATE SET count = count + excluded.count",
+                    [(*key, n) for key, n in users.items()],
+                )
+                removed = conn.execute("DELETE FROM hourly WHERE hour < ?", (before_hour,)).rowcount
+                conn.execute("DELETE FROM hourly_users WHERE hour < ?", (before_hour,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return removed
+
+    def read(self, since_hour: int, since_day: str) -> Series:
+        """Ряды для отчёта одной транзакцией чтения: свёртка, идущая в это время,
+        видна целиком или не видна вовсе (иначе часы посчитались бы дважды)."""
+        with self._read_lock:
+            conn = self.conn
+
+            def rows(sql: str, since: Any) -> List[Any]:
+                return conn.execute(sql, (since,)).fetchall()
+
+            conn.execute("BEGIN")
+            try:
+                return Series(
+                    rows("SELECT hour, kind, name, count FROM hourly WHERE hour >= ?", since_hour),
+                    rows("SELECT hour, user_id FROM hourly_users WHERE hour >= ?", since_hour),
+                    rows("SELECT day, SUM(count) FROM daily WHERE day >= ? GROUP BY day", since_day),
+                    rows("SELECT day, user_id FROM daily_users WHERE day >= ?", since_day),
+                )
+            finally:
+                conn.execute("COMMIT")
+
+    def close(self) -> None:
+        for conn in (self._conn, self._writer):
+            if conn is not None:
+                conn.close()
+        self._conn = self._writer = None
+
+
+class UsageStats:
+    """Счётчики использования бота.
+
+    record() — горячий путь каждого апдейта: два увеличения Counter в памяти,
+    без блокировок (всё в одном event loop) и без ввода-вывода. Раз в
+    FLUSH_INTERVAL накопленное подменяется пустыми счётчиками и приросты
+    пишутся в базу в отдельном потоке.
+    """
+
+    def __init__(self, store: StatsStore, flush_interval: float = FLUSH_INTERVAL) -> None:
+        self.store = store
+        self.flush_interval = flush_interval
+        self._events: Counter[EventKey] = Counter()
+        self._users: Counter[UserKey] = Counter()
+        self._rolled_up_hour = 0
+        self._task: asyncio.Task | None = None
+
+    def record(self, kind: str, name: str, user_id: int | None = None, now: float | None = None) -> None:
+        hour = int(now if now is not None else time.time()) // 3600
+        self._events[(hour, kind, name)] += 1
+        if user_id is not None:
+            self._users[(hour, user_id)] += 1
+
+    def flush(self, now: float | None = None) -> None:
+        events, self._events = self._events, Counter()
+        users, self._users = self._users, Counter()
+        self._write(events, users, now)
+
+    def _write(self, events: Dict[EventKey, int], users: Dict[UserKey, int], now: float | None = None) -> None:
+        if events or users:
+            self.store.add(events, users)
+        hour = int(now if now is not None else time.time()) // 3600
+        if hour != self._rolled_up_hour:
+            self._rolled_up_hour = hour
+            self.store.rollup(hour - int(HOURLY_RETENTION.total_seconds()) // 3600)
+
+    async def flush_async(self) -> None:
+        events, self._events = self._events, Counter()
+        users, self._users = self._users, Counter()
+        try:
+            await asyncio.to_thread(self._write, events, users)
+        except Exception:
+            # Не потеряем приросты: вернём их в счётчики до следующей попытки
+            self._events.update(events)
+            self._users.update(users)
+            raise
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.flush()
+        self.store.close()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_async()
+            except Exception:
+                logger.exception("Не удалось записать статистику")
+
+    # --- отчёт --------------------------------------------------------------
+
+    def _since(self, now: float, hours: int, days: int) -> Tuple[int, str]:
+        """(первый час, первый день) окна отчёта."""
+        first_hour = int(now) // 3600 - hours + 1
+        today = datetime.fromtimestamp(now, self.store.tz).date()
+        first_day = (today - timedelta(days=days - 1)).isoformat()
+        # Дни целиком из почасовых данных, пока они не свёрнуты
+        day_start = int(datetime.fromisoformat(first_day).replace(tzinfo=self.store.tz).timestamp()) // 3600
+        return min(first_hour, day_start), first_day
+
+    def summary(self, now: float | None = None, hours: int = 24, days: int = 7) -> Dict[str, Any]:
+        """Кривые по часам и дням, активные пользователи, самые частые действия.
+
+        Учитывает и ещё не записанное в базу. Читает базу в вызывающем потоке;
+        в event loop — summary_async().
+        """
+        now = now if now is not None else time.time()
+        return self._summarize(now, hours, days, self.store.read(*self._since(now, hours, days)))
+
+    async def summary_async(self, hours: int = 24, days: int = 7) -> Dict[str, Any]:
+        """summary() для хендлеров: база читается в отдельном потоке."""
+        now = time.time()
+        series = await asyncio.to_thread(self.store.read, *self._since(now, hours, days))
+        return self._summarize(now, hours, days, series)
+
+    def _summarize(self, now: float, hours: int, days: int, series: Series) -> Dict[str, Any]:
+        first_hour = int(now) // 3600 - hours + 1
+        since_hour, first_day = self._since(now, hours, days)
+        today = datetime.fromtimestamp(now, self.store.tz).date()
+
+        events: Counter[EventKey] = Counter()
+        for hour, kind, name, n in series.hourly_events:
+            events[(hour, kind, name)] += n
+        for key, n in self._events.items():
+            if key[0] >= since_hour:
+                events[key] += n
+        users: Set[UserKey] = set(series.hourly_users)
+        users.update(key for key in self._users if key[0] >= since_hour)
+
+        by_hour = [0] * hours
+        by_day: Counter[str] = Counter(dict(series.daily_totals))
+        top: Counter[Tuple[str, str]] = Counter()
+        for (hour, kind, name), n in events.items():
+            if hour >= first_hour:
+                by_hour[hour - first_hour] += n
+                top[(kind, name)] += n
+            by_day[self.store.day_of(hour)] += n
+
+        day_users: Dict[str, Set[int]] = {}
+        for day, user_id in series.daily_users:
+            day_users.setdefault(day, set()).add(user_id)
+        for hour, user_id in users:
+            day_users.setdefault(self.store.day_of(hour), set()).add(user_id)
+        days_list = [(today - timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1)]
+        return {
+            "hourly": by_hour,
+            "daily": [(day, by_day.get(day, 0)) for day in days_list],
+            "users_24h": len({user_id for hour, user_id in users if hour >= first_hour}),
+            "users_days": len(set().union(*(day_users.get(day, set()) for day in days_list))),
+            "top": top.most_common(5),
+        }
+
+
+def sparkline(values: List[int]) -> str:
+    top = max(values, default=0)
+    if not top:
+        return _SPARKS[0] * len(values)
+    return "".join(_SPARKS[v * (len(_SPARKS) - 1) // top] for v in values)
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    hourly = summary["hourly"]
+    daily = summary["daily"]
+    lines = [
+        f"📈 За 24 часа: {sum(hourly)} действий, пользователей: {summary['users_24h']}",
+        sparkline(hourly),
+        f"📅 За {len(daily)} дней: {sum(n for _, n in daily)} действий, пользователей: {summary['users_days']}",
+    ]
+    for day, n in daily:
+        lines.append(f"{day[8:10]}.{day[5:7]}: {n}")
+    if summary["top"]:
+        lines.append("Чаще всего за сутки:")
+        for (kind, name), n in summary["top"]:
+            lines.append(f"  {name}: {n}")
+    return "\n".join(lines)
+
+
+_stats: UsageStats | None = None
+
+
+def configure_stats(path: str | None, timezone: str = "Europe/Moscow", flush_interval: float = FLUSH_INTERVAL) -> UsageStats:
+    global _stats
+    _stats = UsageStats(StatsStore(path or STATS_FILE, timezone), flush_interval)
+    return _stats
+
+
+def get_stats() -> UsageStats:
+    global _stats
+    if _stats is None:
+        _stats = UsageStats(StatsStore())
+    return _stats
+
+
+async def count_update(update: Update, context: Any) -> None:
+    """Хендлер (TypeHandler, своя группа): посчитать апдейт."""
+    kind, name = classify_update(update)
+    user = update.effective_user
+    get_stats().record(kind, name, user.id if user else None)
+
+
+def start_stats() -> None:
+    get_stats().start()
+
+
+async def stop_stats() -> None:
+    if _stats is not None:
+        await _stats.stop()
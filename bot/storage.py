@@ -1,14 +1,36 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
 import os
+import time
 from dataclasses import asdict, dataclass
-from typing import Dict, List
+from typing import Any, Dict, List
 
-from bot.data import Subject, SUBJECTS, SCHEDULE
+from bot.data import (
+    DEFAULT_TENANT,
+    DataStore,
+    Mutation,
+    Subject,
+    SUBJECTS,
+    SCHEDULE,
+    add_mutation_listener,
+    apply_mutation,
+    current_store,
+    data_replaced,
+    using_store,
+)
+from bot.metrics import get_metrics
 
 
 DATA_FILE = os.path.join(os.path.dirname(__file__), "data.json")
+# Журнал правок, сделанных после последнего снимка data.json
+JOURNAL_FILE = os.path.join(os.path.dirname(__file__), "data.journal")
+# Данные остальных классов: <TENANTS_DIR>/<id>/data.json (или data.sqlite3)
+TENANTS_DIR = os.path.join(os.path.dirname(__file__), "tenants")
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -24,16 +46,19 @@ class SerializableData:
     schedule: Dict[str, List[str]]
 
 
-def load_data() -> None:
-    if not os.path.exists(DATA_FILE):
-        save_data()  # создадим файл с текущими значениями
-        return
-    try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            raw = json.load(f)
-    except json.JSONDecodeError:
-        return
+def _snapshot(store: DataStore | None = None) -> Dict[str, Any]:
+    # Копия данных класса: дальше её можно сериализовать в другом потоке,
+    # не опасаясь одновременных правок SUBJECTS/SCHEDULE в event loop.
+    store = store or current_store()
+    subs = [SerializableSubject(key=s.key, name=s.name, homework=s.homework) for s in store.subjects.values()]
+    data = SerializableData(
+        subjects=subs,
+        schedule={day_key: list(keys) for day_key, keys in store.schedule.items()},
+    )
+    return asdict(data)
 
+
+def load_payload(raw: Dict[str, Any]) -> None:
     subs = raw.get("subjects", [])
     sched = raw.get("schedule", {})
 
@@ -50,17 +75,482 @@ def load_data() -> None:
     for day_key, subject_keys in sched.items():
         if isinstance(subject_keys, list):
             SCHEDULE[day_key] = [str(k) for k in subject_keys]
+    data_replaced()
+
+
+def _fsync_dir(path: str) -> None:
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, payload: Any, indent: int | None = 2) -> None:
+    """Записать JSON через временный файл и os.replace: при сбое на диске
+    остаётся либо старая, либо новая версия файла, но не обрезанная."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+class StorageBackend:
+    """Интерфейс хранилища. Данные всегда живут в SUBJECTS/SCHEDULE,
+    хранилище лишь загружает их и записывает правки (см. bot.data.apply_mutation)."""
+
+    data_file: str
+    # Класс, чьи данные хранятся; load() вызывается, когда он текущий
+    store: DataStore | None = None
+
+    def load(self) -> None:
+        raise NotImplementedError
+
+    def append(self, op: Mutation) -> None:
+        """Записать одну правку. Вызывается в event loop — должно быть быстрым."""
+        raise NotImplementedError
+
+    def sync(self) -> None:
+        """Сделать записанные правки устойчивыми к сбою. Вызывается в executor'е."""
+
+    def changed_elsewhere(self) -> bool:
+        """Изменил ли данные другой процесс с тем же хранилищем (тогда нужен load)."""
+        return False
+
+    @property
+    def needs_snapshot(self) -> bool:
+        return False
+
+    @property
+    def snapshot_on_close(self) -> bool:
+        """Нужна ли полная запись при остановке бота."""
+        return False
+
+    def begin_snapshot(self) -> Dict[str, Any]:
+        """Снять копию данных для полной записи (в event loop)."""
+        return _snapshot(self.store)
+
+    def write_snapshot(self, payload: Dict[str, Any]) -> None:
+        """Полностью перезаписать хранилище копией данных (в executor'е)."""
+        raise NotImplementedError
+
+    def save(self) -> None:
+        self.write_snapshot(self.begin_snapshot())
+
+    def close(self) -> None:
+        pass
+
+
+class JournalStorage(StorageBackend):
+    """Снимок data.json + журнал правок (по строке JSON на правку).
+
+    Каждая правка сразу дописывается в журнал (без fsync, это микросекунды),
+    fsync журнала и периодические снимки выполняет фоновая запись.
+    На старте загружается снимок и поверх него воспроизводится журнал.
+    """
+
+    def __init__(self, data_file: str, journal_file: str, snapshot_every: int = 200) -> None:
+        self.data_file = data_file
+        self.journal_file = journal_file
+        self.snapshot_every = snapshot_every
+        self.seq = 0  # номер последней записанной правки
+        self.pending_records = 0  # правок в журнале после последнего снимка
+        self._fh = None
+        # Отложенные журналы (.1, .2, …): их правки ещё не попали в записанный снимок
+        self._rotated: List[str] = self._find_rotated()
+        self._covered: List[str] = []  # отложенные к моменту begin_snapshot
+
+    @property
+    def rotated_journal_files(self) -> List[str]:
+        return list(self._rotated)
+
+    def _find_rotated(self) -> List[str]:
+        directory = os.path.dirname(self.journal_file) or "."
+        prefix = os.path.basename(self.journal_file) + "."
+        numbers = sorted(
+            int(name[len(prefix):])
+            for name in (os.listdir(directory) if os.path.isdir(directory) else ())
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        )
+        return [f"{self.journal_file}.{n}" for n in numbers]
+
+    # --- загрузка -----------------------------------------------------------
+
+    def load(self) -> None:
+        self._rotated = self._find_rotated()
+        if not os.path.exists(self.data_file) and not os.path.exists(self.journal_file) and not self._rotated:
+            self.save()  # создадим файл с текущими значениями
+            return
+
+        snapshot_seq = 0
+        if os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+            except json.JSONDecodeError:
+                # Снимки пишутся атомарно, так что это ручная правка или чужой файл.
+                # Откладываем его в сторону, чтобы следующий снимок его не затёр.
+                broken = f"{self.data_file}.corrupt"
+                os.replace(self.data_file, broken)
+                logger.error("%s повреждён, сохранён как %s; загружаю только журнал", self.data_file, broken)
+            else:
+                snapshot_seq = int(raw.get("seq", 0))
+                load_payload(raw)
+
+        self.seq = snapshot_seq
+        self.pending_records = 0
+        for path in self._rotated + [self.journal_file]:
+            self._replay(path, snapshot_seq)
+        if self.pending_records:
+            logger.info("Из журнала восстановлено правок: %d", self.pending_records)
+
+    def _replay(self, path: str, snapshot_seq: int) -> None:
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            content = f.read()
+        lines = content.split(b"\n")
+        # Последняя строка без \n — оборванная запись (сбой во время записи)
+        tail = lines.pop()
+        if tail:
+            logger.warning("Отбрасываю оборванную запись в конце %s", path)
+            with open(path, "r+b") as f:
+                f.truncate(len(content) - len(tail))
+        for line in lines:
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Пропускаю повреждённую запись журнала %s", path)
+                continue
+            seq = int(record.pop("seq", 0))
+            if seq <= snapshot_seq:
+                continue
+            apply_mutation(record, notify=False)
+            self.seq = max(self.seq, seq)
+            self.pending_records += 1
+
+    # --- журнал -------------------------------------------------------------
+
+    def _journal(self):
+        if self._fh is None:
+            os.makedirs(os.path.dirname(self.journal_file) or ".", exist_ok=True)
+            self._fh = open(self.journal_file, "ab")
+        return self._fh
+
+    def append(self, op: Mutation) -> None:
+        self.seq += 1
+        record = dict(op, seq=self.seq)
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        fh = self._journal()
+        fh.write(line.encode("utf-8"))
+        fh.flush()  # в буфер ОС: переживает падение процесса
+        self.pending_records += 1
+
+    def sync(self) -> None:
+        """fsync журнала (переживает падение ОС). Выполняется в executor'е."""
+        if self._fh is not None:
+            os.fsync(self._fh.fileno())
+
+    # --- снимки -------------------------------------------------------------
+
+    @property
+    def needs_snapshot(self) -> bool:
+        return self.pending_records >= self.snapshot_every
+
+    @property
+    def snapshot_on_close(self) -> bool:
+        # Сворачиваем журнал в снимок, чтобы следующий запуск был быстрым
+        return self.pending_records > 0
+
+    def begin_snapshot(self) -> Dict[str, Any]:
+        """Снять копию данных и отложить текущий журнал (в event loop, быстро).
+
+        Правки, пришедшие пока снимок пишется на диск, попадут уже в новый журнал.
+        Журнал только переименовывается; если прошлый снимок не записался,
+        отложенных журналов становится несколько (.1, .2, …).
+        """
+        payload = _snapshot(self.store)
+        payload["seq"] = self.seq
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if os.path.exists(self.journal_file):
+            last = int(self._rotated[-1].rsplit(".", 1)[1]) if self._rotated else 0
+            rotated = f"{self.journal_file}.{last + 1}"
+            os.replace(self.journal_file, rotated)
+            self._rotated.append(rotated)
+        self._covered = list(self._rotated)
+        self.pending_records = 0
+        return payload
+
+    def write_snapshot(self, payload: Dict[str, Any]) -> None:
+        """Атомарно записать снимок и удалить покрытые им журналы (в executor'е)."""
+        atomic_write_json(self.data_file, payload)
+        covered, self._covered = self._covered, []
+        for path in covered:
+            if os.path.exists(path):
+                os.remove(path)
+        self._rotated = [path for path in self._rotated if path not in covered]
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class WriteBehindSaver:
+    """Отложенная запись: правки копятся, а fsync журнала и снимки
+    выполняются не чаще раза в `interval` секунд в executor'е."""
+
+    def __init__(self, storage: StorageBackend, interval: float = 2.0) -> None:
+        self.storage = storage
+        self.interval = interval
+        self._dirty = False
+        self._snapshot_requested = False
+        self._timer: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+        self._lock: asyncio.Lock | None = None
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def mark_dirty(self, snapshot: bool = False) -> None:
+        self._dirty = True
+        self._snapshot_requested = self._snapshot_requested or snapshot
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне event loop (скрипты, импорт данных) — пишем сразу
+            self.flush_sync()
+            return
+        if self._timer is None and self._flush_task is None:
+            self._timer = loop.call_later(self.interval, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._timer = None
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_and_reschedule())
+
+    async def _flush_and_reschedule(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Не удалось сохранить данные в %s", self.storage.data_file)
+        finally:
+            self._flush_task = None
+        # Правки, пришедшие во время записи, уйдут следующим пакетом
+        if self._dirty and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self._start_flush)
+
+    async def flush(self, snapshot: bool = False) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            snapshot = snapshot or self._snapshot_requested or self.storage.needs_snapshot
+            if not (self._dirty or snapshot):
+                return
+            self._dirty = False
+            self._snapshot_requested = False
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            try:
+                if snapshot:
+                    payload = self.storage.begin_snapshot()
+                    await loop.run_in_executor(None, self.storage.write_snapshot, payload)
+                else:
+                    await loop.run_in_executor(None, self.storage.sync)
+                get_metrics().observe_storage("snapshot" if snapshot else "sync", time.perf_counter() - started)
+            except Exception:
+                self._dirty = True
+                self._snapshot_requested = self._snapshot_requested or snapshot
+                raise
+
+    def flush_sync(self) -> None:
+        if self._dirty:
+            self.storage.sync()
+            if self._snapshot_requested or self.storage.needs_snapshot:
+                self.storage.save()
+            self._dirty = False
+            self._snapshot_requested = False
+
+    async def close(self) -> None:
+        """Гарантированная финальная запись при остановке бота."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush(snapshot=self.storage.snapshot_on_close)
+        self.storage.close()
+
+
+# ---------------------------------------------------------------------------
+# Хранилище каждого класса: WriteBehindSaver (с его StorageBackend) лежит в
+# DataStore.extras и создаётся при первом обращении. Настройки общие.
+# ---------------------------------------------------------------------------
+
+_EXTRAS_KEY = "storage"
+
+_backend_kind = "json"
+_default_path: str | None = None
+_tenants_dir = TENANTS_DIR
+_save_interval = 2.0
+_snapshot_every: int | None = None
+
+# Классы, у которых открыто хранилище (закрываются при остановке бота)
+_open_stores: Dict[str, DataStore] = {}
+
+
+def tenant_dir(tenant_id: str) -> str:
+    return os.path.join(_tenants_dir, tenant_id)
+
+
+def _make_backend(store: DataStore) -> StorageBackend:
+    default = store.tenant_id == DEFAULT_TENANT
+    if _backend_kind == "json":
+        if default:
+            data_file = _default_path or DATA_FILE
+            journal_file = JOURNAL_FILE if _default_path is None else f"{_default_path}.journal"
+        else:
+            data_file = os.path.join(tenant_dir(store.tenant_id), "data.json")
+            journal_file = os.path.join(tenant_dir(store.tenant_id), "data.journal")
+        backend: StorageBackend = JournalStorage(data_file, journal_file)
+        if _snapshot_every is not None:
+            backend.snapshot_every = _snapshot_every
+    elif _backend_kind == "sqlite":
+        from bot.storage_sqlite import SQLITE_FILE, SqliteStorage
+
+        if default:
+            backend = SqliteStorage(_default_path or SQLITE_FILE, import_from=DATA_FILE)
+        else:
+            backend = SqliteStorage(os.path.join(tenant_dir(store.tenant_id), "data.sqlite3"))
+    else:
+        raise ValueError(f"Неизвестное хранилище: {_backend_kind!r}")
+    backend.store = store
+    return backend
+
+
+def _saver_of(store: DataStore) -> WriteBehindSaver:
+    saver = store.extras.get(_EXTRAS_KEY)
+    if saver is None:
+        saver = store.extras[_EXTRAS_KEY] = WriteBehindSaver(_make_backend(store), _save_interval)
+        _open_stores[store.tenant_id] = store
+    return saver
+
+
+def storage_of(store: DataStore | None = None) -> StorageBackend:
+    return _saver_of(store or current_store()).storage
+
+
+def tenant_exists(tenant_id: str) -> bool:
+    """Есть ли сохранённые данные класса (основной класс есть всегда)."""
+    return tenant_id == DEFAULT_TENANT or os.path.isdir(tenant_dir(tenant_id))
+
+
+def list_tenants() -> List[str]:
+    ids = [DEFAULT_TENANT]
+    if os.path.isdir(_tenants_dir):
+        ids.extend(sorted(name for name in os.listdir(_tenants_dir) if os.path.isdir(tenant_dir(name))))
+    return ids
+
+
+def load_data(store: DataStore | None = None) -> None:
+    """Загрузить данные класса (по умолчанию текущего) с диска."""
+    store = store or current_store()
+    with using_store(store):
+        _saver_of(store).storage.load()
+
+
+def refresh_data(store: DataStore | None = None) -> bool:
+    """Подхватить правки других процессов бота, если хранилище общее.
+
+    Проверка дешёвая (для SQLite — PRAGMA data_version), поэтому делается
+    перед каждым апдейтом. True — данные перечитаны, кеши сброшены.
+    """
+    store = store or current_store()
+    if not storage_of(store).changed_elsewhere():
+        return False
+    load_data(store)
+    logger.info("Данные класса %s изменены другим процессом, перечитаны", store.tenant_id)
+    return True
 
 
 def save_data() -> None:
-    subs = [SerializableSubject(key=s.key, name=s.name, homework=s.homework) for s in SUBJECTS.values()]
-    data = SerializableData(
-        subjects=subs,
-        schedule=SCHEDULE,
-    )
-    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(asdict(data), f, ensure_ascii=False, indent=2)
+    """Синхронно записать снимок данных текущего класса на диск."""
+    started = time.perf_counter()
+    storage_of().save()
+    get_metrics().observe_storage("save", time.perf_counter() - started)
+
+
+def _on_mutation(op: Mutation) -> None:
+    saver = _saver_of(current_store())
+    saver.storage.append(op)
+    saver.mark_dirty()
+
+
+def configure_storage(backend: str = "json", path: str | None = None, tenants_dir: str | None = None) -> None:
+    """Выбрать хранилище: "json" (data.json + журнал) или "sqlite".
+
+    path — файл основного класса, tenants_dir — каталог с данными остальных.
+    """
+    global _backend_kind, _default_path, _tenants_dir
+    if backend not in ("json", "sqlite"):
+        raise ValueError(f"Неизвестное хранилище: {backend!r}")
+    _backend_kind = backend
+    _default_path = path
+    _tenants_dir = tenants_dir or TENANTS_DIR
+    for store in _open_stores.values():
+        saver = _saver_of(store)
+        saver.storage.close()
+        saver.storage = _make_backend(store)
+
+
+
+def configure_write_behind(interval: float, snapshot_every: int | None = None) -> None:
+    global _save_interval, _snapshot_every
+    _save_interval = interval
+    if snapshot_every is not None:
+        _snapshot_every = snapshot_every
+    for store in _open_stores.values():
+        saver = _saver_of(store)
+        saver.interval = interval
+        if snapshot_every is not None:
+            saver.storage.snapshot_every = snapshot_every
+
+
+def schedule_save() -> None:
+    """Данные изменены в обход bot.data — записать полный снимок в фоне."""
+    _saver_of(current_store()).mark_dirty(snapshot=True)
+
+
+async def flush_data() -> None:
+    """Немедленно записать снимок данных текущего класса (не блокируя event loop)."""
+    await _saver_of(current_store()).flush(snapshot=True)
+
+
+async def close_store(store: DataStore) -> None:
+    """Дописать правки класса на диск и закрыть его хранилище."""
+    saver = store.extras.pop(_EXTRAS_KEY, None)
+    if _open_stores.get(store.tenant_id) is store:
+        del _open_stores[store.tenant_id]
+    if saver is not None:
+        await saver.close()
+
 
+async def shutdown_storage() -> None:
+    for store in list(_open_stores.values()):
+        try:
+            await close_store(store)
+        except Exception:
+            logger.exception("Не удалось сохранить данные класса %s", store.tenant_id)
 
 
+add_mutation_listener(_on_mutation)
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+from typing import Any, Callable, Dict, List, Tuple
+
+from bot.data import Mutation
+from bot.storage import StorageBackend, load_payload
+
+
+SQLITE_FILE = os.path.join(os.path.dirname(__file__), "data.sqlite3")
+
+logger = logging.getLogger(__name__)
+
+
+# Порядок предметов и дней храним явно (position), чтобы клавиатуры
+# показывали их в том же порядке, что и при хранении в data.json.
+# В lessons допускаются «дыры» в position: порядок важен, плотность — нет,
+# поэтому удаление урока не перенумеровывает остальные строки.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    homework TEXT NOT NULL DEFAULT '',
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS days (
+    key TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lessons (
+    day_key TEXT NOT NULL REFERENCES days(key) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    subject_key TEXT NOT NULL REFERENCES subjects(key) ON DELETE CASCADE,
+    PRIMARY KEY (day_key, position)  -- он же индекс по day_key
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS lessons_subject_key ON lessons(subject_key);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta(key, value) VALUES ('version', 0);
+"""
+
+# Строка meta, которая появляется после первой загрузки: пустая база с ней —
+# это удалённые данные, а не ещё не заполненная база
+_INITIALIZED = "INSERT OR IGNORE INTO meta(key, value) VALUES ('initialized', 1)"
+
+_ENSURE_DAY = "INSERT OR IGNORE INTO days(key, position) VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM days))"
+# position урока по его порядковому номеру (с нуля) в дне
+_LESSON_AT = "(SELECT position FROM lessons WHERE day_key = ? ORDER BY position LIMIT 1 OFFSET ?)"
+
+
+def _drop_dangling(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Убрать из расписания уроки несуществующих предметов.
+
+    В базе их не сохранить (внешний ключ), а в памяти они сдвинули бы
+    номера уроков относительно строк lessons (см. _LESSON_AT).
+    """
+    known = {s.get("key") for s in raw.get("subjects", [])}
+    schedule = raw.get("schedule", {})
+    clean = {
+        day_key: [k for k in keys if k in known] if isinstance(keys, list) else keys
+        for day_key, keys in schedule.items()
+    }
+    dropped = sum(len(keys) for keys in schedule.values() if isinstance(keys, list)) - sum(
+        len(keys) for keys in clean.values() if isinstance(keys, list)
+    )
+    if dropped:
+        logger.warning("Уроков с несуществующими предметами: %d, не переношу", dropped)
+    return {**raw, "schedule": clean}
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # В режиме WAL synchronous=NORMAL не теряет целостность, fsync делается на checkpoint
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    # Базу могут делить несколько процессов бота — ждём чужую запись, а не падаем
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+# Версия данных в базе: растёт в той же транзакции, что и каждая правка.
+# По ней процесс узнаёт, что данные поменял кто-то другой.
+def _read_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+
+def _bump_version(conn: sqlite3.Connection) -> int:
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+    return _read_version(conn)
+
+
+def _set_homework(conn: sqlite3.Connection, op: Mutation) -> None:
+    conn.execute("UPDATE subjects SET homework = ? WHERE key = ?", (op["value"], op["subject"]))
+
+
+def _rename_subject(conn: sqlite3.Connection, op: Mutation) -> None:
+    conn.execute("UPDATE subjects SET name = ? WHERE key = ?", (op["value"], op["subject"]))
+
+
+def _add_subject(conn: sqlite3.Connection, op: Mutation) -> None:
+    conn.execute(
+        "INSERT INTO subjects(key, name, homework, position) "
+        "VALUES (?, ?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM subjects))",
+        (op["subject"], op["name"], op.get("value", "")),
+    )
+
+
+def _delete_subject(conn: sqlite3.Connection, op: Mutation) -> None:
+    # Уроки с этим предметом удалятся каскадно
+    conn.execute("DELETE FROM subjects WHERE key = ?", (op["subject"],))
+
+
+def _add_lesson(conn: sqlite3.Connection, op: Mutation) -> None:
+    conn.execute(_ENSURE_DAY, (op["day"],))
+    conn.execute(
+        "INSERT INTO lessons(day_key, position, subject_key) "
+        "VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM lessons WHERE day_key = ?), ?)",
+        (op["day"], op["day"], op["subject"]),
+    )
+
+
+def _remove_lesson(conn: sqlite3.Connection, op: Mutation) -> None:
+    conn.execute(
+        f"DELETE FROM lessons WHERE day_key = ? AND position = {_LESSON_AT}",
+        (op["day"], op["day"], op["index"]),
+    )
+
+
+def _replace_lesson(conn: sqlite3.Connection, op: Mutation) -> None:
+    conn.execute(
+        f"UPDATE lessons SET subject_key = ? WHERE day_key = ? AND position = {_LESSON_AT}",
+        (op["subject"], op["day"], op["day"], op["index"]),
+    )
+
+
+def _clear_day(conn: sqlite3.Connection, op: Mutation) -> None:
+    conn.execute(_ENSURE_DAY, (op["day"],))
+    conn.execute("DELETE FROM lessons WHERE day_key = ?", (op["day"],))
+
+
+def _create_day(conn: sqlite3.Connection, op: Mutation) -> None:
+    conn.execute(_ENSURE_DAY, (op["day"],))
+
+
+def _delete_day(conn: sqlite3.Connection, op: Mutation) -> None:
+    conn.execute("DELETE FROM days WHERE key = ?", (op["day"],))
+
+
+_STATEMENTS: Dict[str, Callable[[sqlite3.Connection, Mutation], None]] = {
+    "set_homework": _set_homework,
+    "rename_subject": _rename_subject,
+    "add_subject": _add_subject,
+    "delete_subject": _delete_subject,
+    "add_lesson": _add_lesson,
+    "remove_lesson": _remove_lesson,
+    "replace_lesson": _replace_lesson,
+    "clear_day": _clear_day,
+    "create_day": _create_day,
+    "delete_day": _delete_day,
+}
+
+
+class SqliteStorage(StorageBackend):
+    """SQLite (WAL) хранилище: каждая правка — одна-две строки в индексированных
+    таблицах вместо перезаписи всего документа.
+
+    Чтение по-прежнему идёт из SUBJECTS/SCHEDULE в памяти: это быстрее любого
+    запроса, а база нужна для дешёвой и надёжной записи.
+
+    Одну базу могут делить несколько процессов: правки других процессов
+    замечает changed_elsewhere() (версия в таблице meta), после чего
+    данные перечитываются целиком.
+    """
+
+    def __init__(self, path: str, import_from: str | None = None) -> None:
+        self.data_file = path
+        self.import_from = import_from
+        self._conn: sqlite3.Connection | None = None
+        self.version = 0  # версия базы, которой соответствуют данные в памяти
+        self._stale = False  # перед нашей правкой в базу успел записать другой процесс
+        self._data_version: int | None = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.data_file) or ".", exist_ok=True)
+            self._conn = _connect(self.data_file)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def load(self) -> None:
+        conn = self.conn
+        # Одна читающая транзакция: версия и данные из одного состояния базы
+        conn.execute("BEGIN")
+        try:
+            version = _read_version(conn)
+            initialized = conn.execute("SELECT 1 FROM meta WHERE key = 'initialized'").fetchone() is not None
+            subjects = [
+                {"key": key, "name": name, "homework": homework}
+                for key, name, homework in conn.execute(
+                    "SELECT key, name, homework FROM subjects ORDER BY position"
+                )
+            ]
+            schedule: Dict[str, List[str]] = {
+                key: [] for (key,) in conn.execute("SELECT key FROM days ORDER BY position")
+            }
+            for day_key, subject_key in conn.execute(
+                "SELECT day_key, subject_key FROM lessons ORDER BY day_key, position"
+            ):
+                schedule.setdefault(day_key, []).append(subject_key)
+        finally:
+            conn.execute("COMMIT")
+
+        if not initialized:
+            if subjects or schedule:
+                # База от версии без отметки: данные в ней уже есть
+                with conn:
+                    conn.execute(_INITIALIZED)
+            else:
+                # Первая загрузка: переносим данные из data.json (если есть) или текущие значения
+                if self.import_from and os.path.exists(self.import_from):
+                    with open(self.import_from, "r", encoding="utf-8") as f:
+                        load_payload(_drop_dangling(json.load(f)))
+                    logger.info("Данные перенесены из %s в %s", self.import_from, self.data_file)
+                self.version = version
+                self.save()
+                return
+
+        load_payload({"subjects": subjects, "schedule": schedule})
+        self.version = version
+        self._stale = False
+        self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed_elsewhere(self) -> bool:
+        if self._stale:
+            return True
+        conn = self.conn
+        # data_version меняется, только когда в базу пишет другое соединение
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        return _read_version(conn) != self.version
+
+    def append(self, op: Mutation) -> None:
+        # Короткая транзакция на правку; в WAL + synchronous=NORMAL commit не делает fsync
+        with self.conn:
+            _STATEMENTS[op["op"]](self.conn, op)
+            version = _bump_version(self.conn)
+        if version != self.version + 1:
+            # Правка легла поверх чужих: перечитаем данные перед следующим апдейтом
+            self._stale = True
+        self.version = version
+
+    def sync(self) -> None:
+        # Checkpoint переносит WAL в основной файл с fsync — правки переживут и сбой ОС
+        conn = _connect(self.data_file)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        finally:
+            conn.close()
+
+    def begin_snapshot(self) -> Dict[str, Any]:
+        payload = super().begin_snapshot()
+        payload["version"] = self.version
+        return payload
+
+    def write_snapshot(self, payload: Dict[str, Any]) -> None:
+        conn = _connect(self.data_file)
+        try:
+            conn.executescript(SCHEMA)
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if _read_version(conn) != payload.get("version", self.version):
+                    # Другой процесс уже записал более новые правки — не затираем их
+                    # старой копией; все наши правки и так в базе (append)
+                    logger.info("Снимок %s пропущен: данные в базе новее", self.data_file)
+                    self._stale = True
+                    return
+                conn.execute("DELETE FROM lessons")
+                conn.execute("DELETE FROM days")
+                conn.execute("DELETE FROM subjects")
+                conn.executemany(
+                    "INSERT INTO subjects(key, name, homework, position) VALUES (?, ?, ?, ?)",
+                    [(s["key"], s["name"], s["homework"], pos) for pos, s in enumerate(payload["subjects"], 1)],
+                )
+                known = {s["key"] for s in payload["subjects"]}
+                days: List[Tuple[str, int]] = []
+                lessons: List[Tuple[str, int, str]] = []
+                for day_pos, (day_key, keys) in enumerate(payload["schedule"].items(), 1):
+                    days.append((day_key, day_pos))
+                    lessons.extend((day_key, pos, k) for pos, k in enumerate(keys, 1))
+                if any(k not in known for _, _, k in lessons):
+                    # Урок без предмета в базе не сохранить (внешний ключ), а пропустить
+                    # его — сдвинуть номера уроков относительно памяти. Такие данные
+                    # в память попадают только в обход правок (load_payload)
+                    lessons = [lesson for lesson in lessons if lesson[2] in known]
+                    self._stale = True  # перечитаем память из базы перед следующим апдейтом
+                conn.executemany("INSERT INTO days(key, position) VALUES (?, ?)", days)
+                conn.executemany(
+                    "INSERT INTO lessons(day_key, position, subject_key) VALUES (?, ?, ?)", lessons
+                )
+                conn.execute(_INITIALIZED)
+                self.version = _bump_version(conn)
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError, TimedOut
+from telegram.request import HTTPXRequest, RequestData
+
+from bot.metrics import get_metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Bot API: около 30 сообщений в секунду на бота, не чаще 1 в секунду
+# в один чат (короткие всплески допустимы) и 20 в минуту в одну группу
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+GROUP_RATE = 20 / 60
+CHAT_BURST = 3.0
+
+# Повторы: экспоненциальная пауза BACKOFF_BASE * 2^n (не больше BACKOFF_MAX)
+# со случайным разбросом, чтобы повторы разных запросов не совпадали
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+# Дольше не ждём внутри хендлера: ошибка уйдёт вызывающему (рассылка сама встанет на паузу)
+MAX_RETRY_AFTER = 30.0
+
+# Сколько последних сообщений помнить, чтобы не отправлять правку без изменений
+EDIT_CACHE_SIZE = 4096
+
+# Исходы вызова (счётчики по методам)
+OK = "ok"
+RETRY_AFTER = "retry_after"
+TIMED_OUT = "timed_out"
+NETWORK = "network"
+NOT_MODIFIED = "not_modified"
+MESSAGE_GONE = "message_gone"
+FORBIDDEN = "forbidden"
+BAD_REQUEST = "bad_request"
+ERROR = "error"
+SKIPPED = "skipped"  # правка без изменений, в Telegram не отправлялась
+
+# Методы, которые отправляют или меняют сообщения — расходуют общий лимит бота
+_THROTTLED_PREFIXES = ("send", "edit", "copyMessage", "forwardMessage")
+# Повтор после таймаута может продублировать сообщение (запрос мог дойти),
+# поэтому эти методы после таймаута чтения не повторяем
+_NOT_IDEMPOTENT_PREFIXES = ("send", "copyMessage", "forwardMessage")
+
+_MESSAGE_GONE_TEXTS = (
+    "message to edit not found",
+    "message to delete not found",
+    "message can't be deleted",
+    "message can't be edited",
+    "message_id_invalid",
+)
+
+
+# Поля, от которых зависит вид сообщения: одинаковые поля — одинаковое сообщение
+_CONTENT_FIELDS = ("text", "parse_mode", "entities", "reply_markup", "link_preview_options", "disable_web_page_preview")
+
+
+class MessageGone(BadRequest):
+    """Сообщение, которое пытались изменить, удалено или слишком старое."""
+
+
+def classify(error: BaseException) -> str:
+    if isinstance(error, RetryAfter):
+        return RETRY_AFTER
+    if isinstance(error, TimedOut):
+        return TIMED_OUT
+    if isinstance(error, BadRequest):
+        text = str(error).lower()
+        if "message is not modified" in text:
+            return NOT_MODIFIED
+        if isinstance(error, MessageGone) or any(t in text for t in _MESSAGE_GONE_TEXTS):
+            return MESSAGE_GONE
+        return BAD_REQUEST
+    if isinstance(error, NetworkError):
+        return NETWORK
+    if isinstance(error, Forbidden):
+        return FORBIDDEN
+    return ERROR
+
+
+def backoff_delay(attempt: int) -> float:
+    """Пауза перед повтором номер attempt (с 1): «полный разброс» от 0 до предела."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+class TokenBucket:
+    """Ведро токенов: `rate` в секунду, не больше `capacity` подряд.
+
+    reserve() берёт токен сразу (при необходимости в долг) и возвращает,
+    сколько ждать до его появления, — ожидающие обслуживаются по очереди
+    без опроса.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float | None = None) -> float:
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds: float, now: float | None = None) -> None:
+        """Не выдавать токены `seconds` секунд (ответ 429 с retry_after)."""
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """Общий лимит бота плюс лимит на каждый чат."""
+
+    def __init__(
+        self,
+        rate: float = GLOBAL_RATE,
+        chat_rate: float = CHAT_RATE,
+        group_rate: float = GROUP_RATE,
+        chat_burst: float = CHAT_BURST,
+    ) -> None:
+        self.bucket = TokenBucket(rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self._chats: Dict[int, TokenBucket] = {}
+        # Сколько секунд отправки простояли в очереди: "chat" и "global"
+        self.waited: Counter = Counter()
+
+    async def acquire(self, chat_id: int | None, is_group: bool = False) -> None:
+        if chat_id is not None:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                if len(self._chats) >= 10000:
+                    self._prune()
+                rate = self.group_rate if is_group else self.chat_rate
+                bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst)
+            # Сначала очередь чата, потом общая: ожидание чата не тратит общий лимит
+            delay = bucket.reserve()
+            if delay:
+                self.waited["chat"] += delay
+                await asyncio.sleep(delay)
+        delay = self.bucket.reserve()
+        if delay:
+            self.waited["global"] += delay
+            await asyncio.sleep(delay)
+
+    def spend(self) -> None:
+        """Учесть вызов, который не ждал очереди (ответ на действие пользователя).
+
+        Токен берётся в долг — рассылки, которые ждут в acquire(), уступят
+        место интерактивным ответам.
+        """
+        self.bucket.reserve()
+
+    def pause(self, seconds: float) -> None:
+        self.bucket.pause(seconds)
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for chat_id in [c for c, b in self._chats.items() if b.is_full(now)]:
+            del self._chats[chat_id]
+
+
+class EditCache:
+    """Что сейчас показано в сообщениях бота: (chat_id, message_id) → отпечаток.
+
+    Правку с тем же текстом и кнопками Telegram отклоняет ("message is not
+    modified"), поэтому её можно не отправлять. Помним последние `size`
+    сообщений. private_only — только личные чаты: с несколькими процессами
+    сообщение в группе может поменять другой процесс.
+    """
+
+    def __init__(self, size: int = EDIT_CACHE_SIZE, private_only: bool = False) -> None:
+        self.size = size
+        self.private_only = private_only
+        self._entries: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, chat_id: int | None, message_id: Any) -> Optional[Tuple[int, int]]:
+        if self.size <= 0 or chat_id is None or not isinstance(message_id, int):
+            return None
+        if self.private_only and chat_id < 0:
+            return None
+        return chat_id, message_id
+
+    def matches(self, key: Tuple[int, int], fingerprint: int) -> bool:
+        if self._entries.get(key) != fingerprint:
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def remember(self, key: Tuple[int, int], fingerprint: int) -> None:
+        self._entries[key] = fingerprint
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def forget(self, key: Tuple[int, int]) -> None:
+        self._entries.pop(key, None)
+
+
+def fingerprint(request_data: RequestData) -> int:
+    params = request_data.json_parameters
+    return hash(tuple(params.get(field) for field in _CONTENT_FIELDS))
+
+
+class ApiStats:
+    """Счётчики вызовов Bot API: (метод, исход) и число повторов по методам."""
+
+    def __init__(self) -> None:
+        self.calls: Counter[Tuple[str, str]] = Counter()
+        self.retries: Counter[str] = Counter()
+
+    def record(self, method: str, outcome: str) -> None:
+        self.calls[(method, outcome)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        by_outcome: Counter[str] = Counter()
+        for (_, outcome), n in self.calls.items():
+            by_outcome[outcome] += n
+        return {
+            "calls": sum(self.calls.values()),
+            "retries": sum(self.retries.values()),
+            "outcomes": dict(by_outcome),
+            "by_method": {f"{m}:{o}": n for (m, o), n in sorted(self.calls.items())},
+            "retries_by_method": dict(self.retries),
+        }
+
+    def format(self) -> str:
+        snap = self.snapshot()
+        lines = [f"Вызовов Bot API: {snap['calls']}, повторов: {snap['retries']}"]
+        for outcome, n in sorted(snap["outcomes"].items(), key=lambda item: -item[1]):
+            lines.append(f"  {outcome}: {n}")
+        for method, n in sorted(snap["retries_by_method"].items(), key=lambda item: -item[1]):
+            lines.append(f"  повторы {method}: {n}")
+        return "\n".join(lines)
+
+
+_limiter = RateLimiter()
+_stats = ApiStats()
+_edit_cache = EditCache()
+
+get_metrics().add_counter("bot_api_calls_total", "Вызовы Bot API по исходам", ("method", "outcome"), lambda: _stats.calls)
+get_metrics().add_counter("bot_api_retries_total", "Повторы вызовов Bot API", ("method",), lambda: _stats.retries)
+get_metrics().add_counter(
+    "bot_limiter_wait_seconds_total", "Ожидание рассылок в лимитере", ("bucket",), lambda: _limiter.waited
+)
+
+# Вызывающий уже взял токен в лимитере (рассылки) — второй раз не списываем
+_PRE_THROTTLED: ContextVar[bool] = ContextVar("pre_throttled", default=False)
+
+
+def get_limiter() -> RateLimiter:
+    return _limiter
+
+
+def get_api_stats() -> ApiStats:
+    return _stats
+
+
+def get_edit_cache() -> EditCache:
+    return _edit_cache
+
+
+def configure_api(
+    rate: float = GLOBAL_RATE, edit_cache_size: int = EDIT_CACHE_SIZE, private_only: bool = False
+) -> None:
+    global _limiter, _edit_cache
+    _limiter = RateLimiter(rate)
+    _edit_cache = EditCache(edit_cache_size, private_only)
+
+
+@contextmanager
+def already_throttled() -> Iterator[None]:
+    token = _PRE_THROTTLED.set(True)
+    try:
+        yield
+    finally:
+        _PRE_THROTTLED.reset(token)
+
+
+class RetryingRequest(HTTPXRequest):
+    """HTTPXRequest с повторами, лимитами и счётчиками для всех вызовов бота.
+
+    - 429: весь бот ждёт retry_after (пауза общего лимита), затем повтор;
+    - таймаут и сетевые ошибки: повтор с экспоненциальной паузой и разбросом
+      (отправку сообщений после таймаута чтения не повторяем — могла дойти);
+    - "message is not modified" у edit* — не ошибка: вызов возвращает True;
+      такую правку (тот же текст и кнопки, см. EditCache) не отправляем вовсе;
+    - удалённое сообщение: deleteMessage считается выполненным, edit*
+      поднимают MessageGone;
+    - send*/edit* расходуют общий лимит бота, но очереди не ждут: ответ на
+      нажатие пользователя не должен стоять за рассылкой. Ждут в
+      RateLimiter.acquire() только массовые отправки (рассылки, напоминания).
+    """
+
+    # BaseRequest.post помечен @final только для тайпчекера
+    async def post(  # type: ignore[misc, override]
+        self, url: str, request_data: RequestData | None = None, **kwargs: Any
+    ) -> Any:
+        method = url.rsplit("/", 1)[-1]
+        throttled = method.startswith(_THROTTLED_PREFIXES) and not _PRE_THROTTLED.get()
+        chat_id = _chat_id(request_data)
+        cache_key = fp = None
+        if request_data is not None and method.startswith(("edit", "deleteMessage")):
+            cache_key = _edit_cache.key(chat_id, request_data.parameters.get("message_id"))
+            if method == "editMessageText" and cache_key is not None:
+                fp = fingerprint(request_data)
+                if _edit_cache.matches(cache_key, fp):
+                    _stats.record(method, SKIPPED)
+                    return True
+            elif cache_key is not None:
+                # Кнопки, подпись или само сообщение поменялись в обход кэша
+                _edit_cache.forget(cache_key)
+        attempt = 0
+        while True:
+            attempt += 1
+            if throttled:
+                _limiter.spend()
+            started = time.perf_counter()
+            try:
+                result = await super().post(url, request_data, **kwargs)
+            except TelegramError as error:
+                get_metrics().observe_api(method, time.perf_counter() - started)
+                outcome = classify(error)
+                _stats.record(method, outcome)
+                if outcome == NOT_MODIFIED and method.startswith("edit"):
+                    if fp is not None:
+                        _edit_cache.remember(cache_key, fp)  # type: ignore[arg-type]
+                    return True
+                if cache_key is not None:
+                    _edit_cache.forget(cache_key)
+                if outcome == MESSAGE_GONE:
+                    if method == "deleteMessage":
+                        return True
+                    if not isinstance(error, MessageGone):
+                        raise MessageGone(error.message) from error
+                    raise
+                delay = self._retry_delay(method, error, outcome, attempt)
+                if delay is None:
+                    raise
+                _stats.retries[method] += 1
+                logger.info("%s: %s, повтор %d через %.1f с", method, outcome, attempt, delay)
+                await asyncio.sleep(delay)
+                continue
+            get_metrics().observe_api(method, time.perf_counter() - started)
+            _stats.record(method, OK)
+            if fp is not None:
+                _edit_cache.remember(cache_key, fp)  # type: ignore[arg-type]
+            elif method == "sendMessage" and isinstance(result, dict) and request_data is not None:
+                # Новое сообщение: его вид уже известен, первая же правка «без изменений» не уйдёт
+                sent_key = _edit_cache.key(chat_id, result.get("message_id"))
+                if sent_key is not None:
+                    _edit_cache.remember(sent_key, fingerprint(request_data))
+            return result
+
+    @staticmethod
+    def _retry_delay(method: str, error: TelegramError, outcome: str, attempt: int) -> float | None:
+        if attempt >= MAX_ATTEMPTS:
+            return None
+        if outcome == RETRY_AFTER:
+            retry_after = float(error.retry_after)  # type: ignore[attr-defined]
+            if retry_after > MAX_RETRY_AFTER:
+                return None
+            _limiter.pause(retry_after)
+            return retry_after + random.uniform(0, 0.5)
+        if outcome == TIMED_OUT:
+            # Таймаут очереди соединений: запрос точно не уходил
+            if method.startswith(_NOT_IDEMPOTENT_PREFIXES) and "pool timeout" not in str(error).lower():
+                return None
+            return backoff_delay(attempt)
+        if outcome == NETWORK:
+            return backoff_delay(attempt)
+        return None
+
+
+def _chat_id(request_data: RequestData | None) -> int | None:
+    if request_data is None:
+        return None
+    chat_id = request_data.parameters.get("chat_id")
+    if isinstance(chat_id, int):
+        return chat_id
+    if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+        return int(chat_id)
+    return None  # @username канала или inline-сообщение
+
+
+def build_request(**kwargs: Any) -> RetryingRequest:
+    # Столько же соединений, сколько даёт ApplicationBuilder по умолчанию
+    kwargs.setdefault("connection_pool_size", 256)
+    return RetryingRequest(**kwargs)
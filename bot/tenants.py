@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import wraps
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, TypeVar
+
+from telegram import Update
+from telegram.constants import ChatType
+from telegram.ext import ContextTypes
+
+from bot.data import DEFAULT_TENANT, DataStore, get_default_store, using_store
+from bot.storage import close_store, load_data, refresh_data, shutdown_storage
+
+
+logger = logging.getLogger(__name__)
+
+# Ключ привязки к классу в context.user_data (личка) и context.chat_data (группы)
+TENANT_KEY = "class_id"
+
+# Идентификатор класса — он же имя каталога с данными
+TENANT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+
+def is_valid_tenant_id(tenant_id: str) -> bool:
+    return bool(TENANT_ID_RE.match(tenant_id))
+
+
+class TenantRegistry:
+    """Загруженные классы: подгружаются при первом обращении и выгружаются (LRU),
+    когда их больше `max_active` или они простаивают дольше `idle_seconds`.
+
+    Класс, который сейчас обрабатывает апдейт, не выгружается. Основной класс
+    (DEFAULT_TENANT) живёт всё время и в реестр не входит.
+    """
+
+    def __init__(self, max_active: int = 16, idle_seconds: float = 600.0) -> None:
+        self.max_active = max_active
+        self.idle_seconds = idle_seconds
+        # От давно использованных к недавним
+        self._stores: "OrderedDict[str, DataStore]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._in_use: Dict[str, int] = {}
+        self._closing: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._stores)
+
+    def __contains__(self, tenant_id: object) -> bool:
+        return tenant_id in self._stores
+
+    async def acquire(self, tenant_id: str) -> DataStore:
+        if tenant_id == DEFAULT_TENANT:
+            store = get_default_store()
+            refresh_data(store)
+            return store
+        closing = self._closing.get(tenant_id)
+        if closing is not None:
+            # Класс как раз выгружается — дождёмся записи на диск и загрузим заново
+            await asyncio.gather(closing, return_exceptions=True)
+        store = self._stores.get(tenant_id)
+        if store is None:
+            store = DataStore(tenant_id)
+            load_data(store)
+            self._stores[tenant_id] = store
+            logger.info("Класс %s загружен (в памяти: %d)", tenant_id, len(self._stores))
+        else:
+            self._stores.move_to_end(tenant_id)
+            refresh_data(store)
+        self._in_use[tenant_id] = self._in_use.get(tenant_id, 0) + 1
+        self._last_used[tenant_id] = time.monotonic()
+        self._evict()
+        return store
+
+    def release(self, store: DataStore) -> None:
+        tenant_id = store.tenant_id
+        if tenant_id not in self._in_use:
+            return
+        self._in_use[tenant_id] -= 1
+        if not self._in_use[tenant_id]:
+            del self._in_use[tenant_id]
+        if tenant_id in self._stores:
+            self._stores.move_to_end(tenant_id)
+            self._last_used[tenant_id] = time.monotonic()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for tenant_id in list(self._stores):
+            too_many = len(self._stores) > self.max_active
+            idle = now - self._last_used[tenant_id] > self.idle_seconds
+            if not (too_many or idle):
+                break  # дальше только более свежие
+            if self._in_use.get(tenant_id):
+                continue
+            store = self._stores.pop(tenant_id)
+            del self._last_used[tenant_id]
+            task = asyncio.get_running_loop().create_task(self._close(store))
+            self._closing[tenant_id] = task
+
+    async def _close(self, store: DataStore) -> None:
+        try:
+            await close_store(store)
+            logger.info("Класс %s выгружен", store.tenant_id)
+        except Exception:
+            logger.exception("Не удалось сохранить данные класса %s", store.tenant_id)
+        finally:
+            self._closing.pop(store.tenant_id, None)
+
+    async def close(self) -> None:
+        """Дождаться выгрузки и закрыть хранилища всех классов (при остановке бота)."""
+        if self._closing:
+            await asyncio.gather(*self._closing.values(), return_exceptions=True)
+        self._stores.clear()
+        self._last_used.clear()
+        await shutdown_storage()
+
+
+_registry = TenantRegistry()
+
+
+def get_registry() -> TenantRegistry:
+    return _registry
+
+
+def configure_tenants(max_active: int, idle_seconds: float) -> None:
+    _registry.max_active = max_active
+    _registry.idle_seconds = idle_seconds
+
+
+async def shutdown_tenants() -> None:
+    await _registry.close()
+
+
+@asynccontextmanager
+async def use_tenant(tenant_id: str) -> AsyncIterator[DataStore]:
+    """Сделать класс текущим (SUBJECTS/SCHEDULE и т.п.) на время блока."""
+    store = await _registry.acquire(tenant_id)
+    try:
+        with using_store(store):
+            yield store
+    finally:
+        _registry.release(store)
+
+
+def resolve_tenant_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Класс апдейта: привязка группового чата, затем пользователя, иначе основной."""
+    chat = update.effective_chat
+    if chat is not None and chat.type != ChatType.PRIVATE and context.chat_data is not None:
+        tenant_id = context.chat_data.get(TENANT_KEY)
+        if tenant_id:
+            return tenant_id
+    if context.user_data is not None:
+        tenant_id = context.user_data.get(TENANT_KEY)
+        if tenant_id:
+            return tenant_id
+    return DEFAULT_TENANT
+
+
+_Handler = TypeVar("_Handler", bound=Callable[..., Awaitable[Any]])
+
+
+def tenant_handler(callback: _Handler) -> _Handler:
+    """Декоратор хендлера: данные берутся из класса пользователя/чата."""
+
+    @wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Any:
+        async with use_tenant(resolve_tenant_id(update, context)):
+            return await callback(update, context)
+
+    return wrapper  # type: ignore[return-value]
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Any
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from bot.config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def build_webhook_app(application: Application, path: str, secret: str | None = None) -> web.Application:
+    """aiohttp-приложение, которое принимает апдейты от Telegram и кладёт их в очередь бота."""
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=403)
+        try:
+            payload: Any = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        update = Update.de_json(payload, application.bot)
+        if update is None:
+            return web.Response(status=400)
+        # Ответ Telegram'у сразу; обработка идёт в обычном цикле Application
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    app.router.add_get("/healthz", health)
+    return app
+
+
+async def wait_for_stop_signal() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: остановка по Ctrl+C через KeyboardInterrupt
+    await stop.wait()
+
+
+async def serve_webhook(application: Application, settings: Settings) -> None:
+    web_app = build_webhook_app(application, settings.webhook_path, settings.webhook_secret)
+    runner = web.AppRunner(web_app)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        if settings.webhook_url:
+            await application.bot.set_webhook(
+                url=settings.webhook_url.rstrip("/") + settings.webhook_path,
+                secret_token=settings.webhook_secret,
+                max_connections=settings.webhook_max_connections,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True,
+            )
+        await application.start()
+        await runner.setup()
+        site = web.TCPSite(runner, settings.webhook_listen, settings.webhook_port)
+        await site.start()
+        logger.info(
+            "Webhook слушает http://%s:%s%s", settings.webhook_listen, settings.webhook_port, settings.webhook_path
+        )
+        await wait_for_stop_signal()
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, settings: Settings) -> None:
+    try:
+        asyncio.run(serve_webhook(application, settings))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,199 @@
+"""Несколько процессов бота с общим хранилищем (режим webhook).
+
+    WORKERS=4 BOT_MODE=webhook STORAGE_BACKEND=sqlite python -m bot.workers
+
+Этот процесс принимает вебхук Telegram и раздаёт апдейты воркерам по id
+пользователя (иначе чата): апдейты одного пользователя всегда попадают в один
+процесс, поэтому его шаги редактирования и порядок апдейтов сохраняются.
+Каждый воркер — обычный bot.main на 127.0.0.1:<WEBHOOK_PORT + 1 + номер>.
+Правки админа воркеры видят друг у друга через общую базу SQLite
+(см. SqliteStorage.changed_elsewhere).
+"""
+from __future__ import annotations
+
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+from typing import Any, Dict, List
+
+import aiohttp
+from aiohttp import web
+from telegram import Bot, Update
+
+from bot.config import Settings, get_settings
+from bot.webhook import SECRET_HEADER, wait_for_stop_signal
+
+
+logger = logging.getLogger(__name__)
+
+
+def shard_key(payload: Dict[str, Any]) -> int:
+    """id пользователя (или чата), по которому апдейт закрепляется за воркером."""
+    for value in payload.values():
+        if not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return int(user["id"])
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return int(chat["id"])
+    return int(payload.get("update_id", 0))
+
+
+def worker_port(settings: Settings, index: int) -> int:
+    return settings.webhook_port + 1 + index
+
+
+def _run_worker(index: int, port: int) -> None:
+    # Отдельный интерпретатор (spawn): настройки читаются заново из окружения
+    metrics_port = int(os.environ.get("METRICS_PORT") or 0)
+    if metrics_port:
+        # Метрики у каждого воркера свои: METRICS_PORT+1+номер, как и вебхук
+        os.environ["METRICS_PORT"] = str(metrics_port + 1 + index)
+    os.environ.update(
+        {
+            "WORKERS": "1",
+            "WEBHOOK_URL": "",  # вебхук регистрирует только главный процесс
+            "WEBHOOK_LISTEN": "127.0.0.1",
+            "WEBHOOK_PORT": str(port),
+            # Сообщение в группе могут править несколько воркеров — не доверяем своей памяти о нём
+            "EDIT_CACHE_PRIVATE_ONLY": "1",
+        }
+    )
+    from bot.main import main
+
+    main()
+
+
+class WorkerPool:
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._ctx = multiprocessing.get_context("spawn")
+        self.processes: List[multiprocessing.process.BaseProcess] = []
+
+    def _spawn(self, index: int) -> multiprocessing.process.BaseProcess:
+        proc = self._ctx.Process(
+            target=_run_worker,
+            args=(index, worker_port(self.settings, index)),
+            name=f"bot-worker-{index}",
+        )
+        proc.start()
+        return proc
+
+    def start(self) -> None:
+        self.processes = [self._spawn(i) for i in range(self.settings.workers)]
+
+    async def watch(self, interval: float = 1.0) -> None:
+        """Перезапускать упавшие воркеры."""
+        while True:
+            await asyncio.sleep(interval)
+            for index, proc in enumerate(self.processes):
+                if not proc.is_alive():
+                    logger.warning("Воркер %d завершился (код %s), перезапускаю", index, proc.exitcode)
+                    self.processes[index] = self._spawn(index)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        for proc in self.processes:
+            if proc.is_alive():
+                proc.terminate()  # SIGTERM: воркер штатно допишет данные
+        for proc in self.processes:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.kill()
+
+
+def build_router_app(settings: Settings, session: aiohttp.ClientSession) -> web.Application:
+    """aiohttp-приложение, которое пересылает апдейты воркерам."""
+    urls = [
+        f"http://127.0.0.1:{worker_port(settings, i)}{settings.webhook_path}" for i in range(settings.workers)
+    ]
+    secret = settings.webhook_secret
+    headers = {SECRET_HEADER: secret} if secret else {}
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=403)
+        body = await request.read()
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(payload, dict):
+            return web.Response(status=400)
+        url = urls[shard_key(payload) % len(urls)]
+        try:
+            async with session.post(url, data=body, headers=headers) as resp:
+                # Ошибка воркера → не 200: Telegram пришлёт апдейт повторно
+                return web.Response(status=resp.status)
+        except aiohttp.ClientError:
+            logger.warning("Воркер %s недоступен", url)
+            return web.Response(status=503)
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_post(settings.webhook_path, handle_update)
+    app.router.add_get("/healthz", health)
+    return app
+
+
+async def serve_workers(settings: Settings) -> None:
+    pool = WorkerPool(settings)
+    pool.start()
+    watcher = asyncio.get_running_loop().create_task(pool.watch())
+    session = aiohttp.ClientSession(
+        headers={"Content-Type": "application/json"},
+        timeout=aiohttp.ClientTimeout(total=10),
+    )
+    runner = web.AppRunner(build_router_app(settings, session))
+    try:
+        await runner.setup()
+        site = web.TCPSite(runner, settings.webhook_listen, settings.webhook_port)
+        await site.start()
+        if settings.webhook_url:
+            async with Bot(settings.bot_token) as bot:
+                await bot.set_webhook(
+                    url=settings.webhook_url.rstrip("/") + settings.webhook_path,
+                    secret_token=settings.webhook_secret,
+                    max_connections=settings.webhook_max_connections,
+                    allowed_updates=Update.ALL_TYPES,
+                    drop_pending_updates=True,
+                )
+        logger.info(
+            "Webhook слушает http://%s:%s%s, воркеров: %d",
+            settings.webhook_listen,
+            settings.webhook_port,
+            settings.webhook_path,
+            settings.workers,
+        )
+        await wait_for_stop_signal()
+    finally:
+        watcher.cancel()
+        await runner.cleanup()
+        await session.close()
+        await asyncio.get_running_loop().run_in_executor(None, pool.stop)
+
+
+def main() -> None:
+    from bot.main import configure_logging
+
+    configure_logging()
+    settings = get_settings()
+    if settings.workers < 2:
+        from bot.main import main as run_single
+
+        run_single()
+        return
+    try:
+        asyncio.run(serve_workers(settings))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
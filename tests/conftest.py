@@ -0,0 +1,26 @@
+import os
+
+# Настройки бота читают BOT_TOKEN при первом обращении
+os.environ.setdefault("BOT_TOKEN", "0:test")
+
+import pytest  # noqa: E402
+
+from bot.data import DataStore, using_store  # noqa: E402
+from bot.history import configure_history  # noqa: E402
+from bot.storage import configure_storage  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_files(tmp_path):
+    """Файлы данных и архива — во временном каталоге, рабочие файлы бота не трогаем."""
+    configure_storage("json", str(tmp_path / "data.json"), str(tmp_path / "tenants"))
+    history = configure_history(str(tmp_path / "history.sqlite3"))
+    yield tmp_path
+    history.close()
+
+
+@pytest.fixture
+def store():
+    """Пустой класс, текущий на время теста (SUBJECTS/SCHEDULE — его данные)."""
+    with using_store(DataStore("test")) as store:
+        yield store
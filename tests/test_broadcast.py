@@ -0,0 +1,116 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+import bot.broadcast as broadcast
+from bot.broadcast import FAILED, LEASE_SECONDS, PENDING, SENT, Broadcaster, BroadcastStore
+from bot.telegram_api import RateLimiter
+
+CHATS = [1, 2, 3, 4, -5]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "broadcast.sqlite3")
+
+
+@pytest.fixture
+def stores(path):
+    # Два процесса бота с общим файлом очереди
+    first, second = BroadcastStore(path), BroadcastStore(path)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def _job(store: BroadcastStore) -> int:
+    for chat_id in CHATS:
+        store.remember(chat_id, "10a", chat_id < 0)
+    store.remember(100, "11b", False)
+    job_id, count = store.create_job("10a", "Завтра контрольная")
+    assert count == len(CHATS)
+    return job_id
+
+
+def test_job_is_claimed_by_one_process(stores):
+    first, second = stores
+    job_id = _job(first)
+    assert first.claim_job().id == job_id
+    assert second.claim_job() is None
+    # Процесс остановили: задание сразу свободно
+    first.release(job_id)
+    assert second.claim_job().id == job_id
+    assert first.claim_job() is None
+
+
+def test_abandoned_job_resumes_with_pending_chats_only(stores, monkeypatch):
+    first, second = stores
+    job_id = _job(first)
+    assert first.claim_job().id == job_id
+    first.record(job_id, [(1, SENT), (2, FAILED)])
+    # Процесс упал, не продлив аренду: задание забирает другой
+    now = time.time()
+    monkeypatch.setattr(broadcast.time, "time", lambda: now + LEASE_SECONDS + 1)
+    assert second.claim_job().id == job_id
+    assert [chat_id for chat_id, _ in second.pending(job_id, -(2**63))] == [-5, 3, 4]
+    second.record(job_id, [(-5, SENT), (3, SENT), (4, SENT)])
+    second.finish(job_id)
+    assert first.counts(job_id) == {PENDING: 0, SENT: 4, FAILED: 1}
+    assert first.is_finished(job_id) and first.claim_job() is None
+
+
+class FakeBot:
+    """Бот, который запоминает отправки; после `limit` сообщений зависает."""
+
+    def __init__(self, sent: List[int], limit: int | None = None) -> None:
+        self.sent = sent
+        self.limit = limit
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> SimpleNamespace:
+        if self.limit is not None and len(self.sent) >= self.limit:
+            await asyncio.Event().wait()
+        self.sent.append(chat_id)
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def edit_message_text(self, text: str, **kwargs) -> None:
+        pass
+
+
+def test_stopped_broadcast_is_finished_by_another_process(path):
+    sent: List[int] = []
+
+    async def main() -> None:
+        first = Broadcaster(BroadcastStore(path), RateLimiter(rate=1000), max_in_flight=1)
+        for chat_id in CHATS:
+            first.remember(chat_id, "10a", chat_id < 0)
+        job_id, _ = first.submit("10a", "Завтра контрольная")
+        first.start(FakeBot(sent, limit=2))
+        while len(sent) < 2:
+            await asyncio.sleep(0.01)
+        # Остановка посреди рассылки: доставленное сохраняется, задание освобождается
+        await first.stop()
+
+        second = Broadcaster(BroadcastStore(path), RateLimiter(rate=1000))
+        second.start(FakeBot(sent))
+        await asyncio.wait_for(second.wait(job_id), timeout=5)
+        await second.stop()
+
+    asyncio.run(main())
+    assert sorted(sent) == sorted(CHATS)
+
+
+def test_known_chats_are_bounded(path):
+    broadcaster = Broadcaster(BroadcastStore(path), RateLimiter(), known_size=2)
+    for chat_id in (1, 2, 3):
+        broadcaster.remember(chat_id, "10a")
+    assert list(broadcaster._known) == [2, 3]
+    # Вытесненный чат записывается заново, смена класса — тоже
+    broadcaster.remember(1, "11b")
+    broadcaster.remember(3, "11b")
+    assert list(broadcaster._known) == [1, 3]
+    assert broadcaster.store.audience_size("10a") == 1
+    assert broadcaster.store.audience_size("11b") == 2
+    broadcaster.store.close()
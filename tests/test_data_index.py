@@ -0,0 +1,119 @@
+import random
+
+from bot.data import (
+    SCHEDULE,
+    add_lesson,
+    add_mutation_listener,
+    add_subject,
+    check_subject_index,
+    clear_day,
+    create_day,
+    delete_day,
+    delete_subject,
+    get_day_keys_for_subject,
+    get_data_version,
+    get_days_for_subject,
+    remove_lesson,
+    remove_mutation_listener,
+    rename_subject,
+    replace_lesson,
+)
+
+
+def _fill() -> None:
+    add_subject("math", "Математика")
+    add_subject("rus", "Русский язык")
+    add_subject("bio", "Биология")
+    for day_key, keys in {"mon": ["math", "rus", "math"], "tue": ["bio", "math"], "fri": ["rus"]}.items():
+        for key in keys:
+            add_lesson(day_key, key)
+
+
+def test_rename_keeps_days(store):
+    _fill()
+    assert rename_subject("math", "Алгебра")
+    assert check_subject_index() == []
+    assert get_days_for_subject("math") == [("Понедельник", 1), ("Понедельник", 3), ("Вторник", 2)]
+
+
+def test_remove_lesson_shifts_positions(store):
+    _fill()
+    assert remove_lesson("mon", 0)
+    assert SCHEDULE["mon"] == ["rus", "math"]
+    assert check_subject_index() == []
+    assert get_days_for_subject("math") == [("Понедельник", 2), ("Вторник", 2)]
+    assert get_days_for_subject("rus") == [("Понедельник", 1), ("Пятница", 1)]
+
+
+def test_replace_last_lesson_of_day(store):
+    _fill()
+    assert replace_lesson("fri", 0, "bio")
+    assert check_subject_index() == []
+    assert get_day_keys_for_subject("rus") == ["mon"]
+    assert sorted(get_day_keys_for_subject("bio")) == ["fri", "tue"]
+
+
+def test_delete_subject_removes_its_lessons(store):
+    _fill()
+    assert delete_subject("math")
+    assert check_subject_index() == []
+    assert SCHEDULE["mon"] == ["rus"]
+    assert SCHEDULE["tue"] == ["bio"]
+    assert get_days_for_subject("math") == []
+    assert get_days_for_subject("bio") == [("Вторник", 1)]
+
+
+def test_clear_and_delete_day(store):
+    _fill()
+    assert clear_day("mon")
+    assert check_subject_index() == []
+    assert get_day_keys_for_subject("math") == ["tue"]
+    assert delete_day("tue")
+    assert check_subject_index() == []
+    assert get_days_for_subject("math") == []
+    assert get_day_keys_for_subject("rus") == ["fri"]
+
+
+def test_clearing_empty_day_is_not_an_edit(store):
+    _fill()
+    create_day("sat")
+    seen = []
+    add_mutation_listener(seen.append)
+    try:
+        version = get_data_version()
+        assert not clear_day("sat")
+        assert not clear_day("sun")
+        assert "sun" not in SCHEDULE
+        assert get_data_version() == version and seen == []
+        assert clear_day("fri")
+        assert not clear_day("fri")
+        assert [op["op"] for op in seen] == ["clear_day"]
+    finally:
+        remove_mutation_listener(seen.append)
+
+
+def test_random_edits_keep_index_consistent(store):
+    rng = random.Random(4)
+    days = ["mon", "tue", "wed", "sat"]
+    keys = [f"s{i}" for i in range(6)]
+    for key in keys:
+        add_subject(key, key.upper())
+    for step in range(2000):
+        day_key = rng.choice(days)
+        lessons = len(SCHEDULE.get(day_key, []))
+        action = rng.randrange(8)
+        if action < 3:
+            add_lesson(day_key, rng.choice(keys))
+        elif action == 3 and lessons:
+            remove_lesson(day_key, rng.randrange(lessons))
+        elif action == 4 and lessons:
+            replace_lesson(day_key, rng.randrange(lessons), rng.choice(keys))
+        elif action == 5:
+            key = rng.choice(keys)
+            if not rename_subject(key, f"{key}-{step}"):
+                add_subject(key, key.upper())
+        elif action == 6 and rng.random() < 0.1:
+            delete_subject(rng.choice(keys))
+        elif action == 7 and rng.random() < 0.1:
+            rng.choice([clear_day, delete_day, create_day])(day_key)
+        assert check_subject_index() == [], f"шаг {step}"
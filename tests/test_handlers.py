@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, List, Tuple
+
+from bot.data import SCHEDULE, add_lesson, add_subject
+from bot.handlers import edit_routes
+
+
+class FakeQuery:
+    """callback_query, который запоминает ответы и правки сообщения."""
+
+    def __init__(self, data: str) -> None:
+        self.data = data
+        self.message = None
+        self.calls: List[Tuple[str, Any]] = []
+
+    async def answer(self, text: str | None = None) -> None:
+        self.calls.append(("answer", text))
+
+    async def edit_message_text(self, text: str, reply_markup=None, **kwargs) -> object:
+        self.calls.append(("edit", text))
+        return object()
+
+
+def _press(data: str, user_data: dict) -> FakeQuery:
+    query = FakeQuery(data)
+    update = SimpleNamespace(callback_query=query)
+    assert asyncio.run(edit_routes.dispatch(update, SimpleNamespace(user_data=user_data)))
+    return query
+
+
+def test_delete_lesson_redraws_day(store):
+    add_subject("math", "Математика")
+    add_lesson("mon", "math")
+    query = _press("edit:sched:del_choose:1", {"edit_sched_day": "mon"})
+    assert SCHEDULE["mon"] == []
+    assert [kind for kind, _ in query.calls] == ["edit"]
+
+
+def test_stale_delete_button_is_answered(store):
+    add_subject("math", "Математика")
+    add_lesson("mon", "math")
+    # Кнопка из старого сообщения: второго урока уже нет
+    query = _press("edit:sched:del_choose:2", {"edit_sched_day": "mon"})
+    assert SCHEDULE["mon"] == ["math"]
+    assert query.calls[0] == ("answer", "Урок не найден")
+    assert [kind for kind, _ in query.calls[1:]] == ["edit"]
@@ -0,0 +1,55 @@
+import asyncio
+
+from bot import config
+from bot.data import add_subject, current_store, set_homework
+from bot.history import HistoryStore, configure_history, flush_history, get_history
+from bot.search import search_homework
+
+
+def _texts(subject_key: str):
+    entries, _ = get_history().page(current_store().tenant_id, subject_key)
+    return [entry.homework for entry in entries]
+
+
+def test_record_skips_repeated_text(store):
+    add_subject("math", "Математика", "№ 1")
+    set_homework("math", "№ 1")  # тот же текст — не правка
+    set_homework("math", "№ 2")
+    set_homework("math", "№ 1")
+    assert _texts("math") == ["№ 1", "№ 2", "№ 1"]
+
+
+def test_record_needs_no_settings(store, monkeypatch, tmp_path):
+    # Без BOT_TOKEN get_settings() падает — архив его не вызывает
+    monkeypatch.delenv("BOT_TOKEN", raising=False)
+    monkeypatch.setattr(config, "_settings", None)
+    configure_history(str(tmp_path / "tz.sqlite3"), "Asia/Yekaterinburg")
+    add_subject("math", "Математика")
+    assert set_homework("math", "№ 5")
+    assert _texts("math") == ["№ 5"]
+
+
+def test_batched_write_in_event_loop(store):
+    async def main() -> None:
+        for n in range(20):
+            set_homework("math", f"№ {n}")
+        await flush_history()
+
+    add_subject("math", "Математика")
+    asyncio.run(main())
+    entries, has_more = get_history().page(current_store().tenant_id, "math", limit=20)
+    assert [entry.homework for entry in entries] == [f"№ {n}" for n in reversed(range(20))]
+    assert not has_more
+
+
+def test_archive_failure_does_not_break_edit(store, monkeypatch):
+    add_subject("math", "Математика")
+    search_homework("математика")  # индекс поиска построен
+
+    def broken(self, *args) -> None:
+        raise RuntimeError("архив недоступен")
+
+    monkeypatch.setattr(HistoryStore, "record", broken)
+    assert set_homework("math", "параграф 7")
+    # Слушатели после архива (индекс поиска) правку увидели
+    assert [hit.homework for hit in search_homework("параграф")] == ["параграф 7"]
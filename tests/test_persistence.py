@@ -0,0 +1,132 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from bot.persistence import CHAT, USER, SqliteStatePersistence
+
+
+KEEP = ("class_id", "menu_message_id")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "state.sqlite3")
+
+
+def _persistence(path: str, ttl: float = 3600.0) -> SqliteStatePersistence:
+    return SqliteStatePersistence(path, ttl=ttl, keep_keys=KEEP)
+
+
+def _age(path: str, kind: str, id_: int, seconds: float) -> None:
+    # Последняя активность — seconds назад
+    conn = _persistence(path).writer
+    with conn:
+        conn.execute("UPDATE state SET updated_at = ? WHERE kind = ? AND id = ?", (time.time() - seconds, kind, id_))
+    conn.close()
+
+
+def _rows(path: str):
+    conn = _persistence(path).reader
+    rows = dict(((kind, id_), data) for kind, id_, data in conn.execute("SELECT kind, id, data FROM state"))
+    conn.close()
+    return rows
+
+
+def _application(user_data, chat_data):
+    app = SimpleNamespace(user_data=user_data, chat_data=chat_data, dropped=[])
+    app.drop_user_data = lambda id_: (app.dropped.append((USER, id_)), user_data.pop(id_, None))
+    app.drop_chat_data = lambda id_: (app.dropped.append((CHAT, id_)), chat_data.pop(id_, None))
+    return app
+
+
+def test_state_survives_restart(path):
+    async def main() -> None:
+        persistence = _persistence(path)
+        await persistence.update_user_data(1, {"class_id": "10a", "edit_sched_day": "mon"})
+        await persistence.update_chat_data(-5, {"menu_message_id": 42})
+        await persistence.flush()
+
+    asyncio.run(main())
+    reopened = _persistence(path)
+    assert asyncio.run(reopened.get_user_data()) == {1: {"class_id": "10a", "edit_sched_day": "mon"}}
+    assert asyncio.run(reopened.get_chat_data()) == {-5: {"menu_message_id": 42}}
+
+
+def test_expired_rows_keep_only_keep_keys_on_load(path):
+    async def main() -> None:
+        persistence = _persistence(path)
+        await persistence.update_user_data(1, {"class_id": "10a", "edit_sched_day": "mon"})
+        await persistence.update_user_data(2, {"edit_sched_day": "tue"})
+        await persistence.update_user_data(3, {"edit_sched_day": "wed"})
+        await persistence.flush()
+
+    asyncio.run(main())
+    _age(path, USER, 1, 7200)
+    _age(path, USER, 2, 7200)
+    loaded = asyncio.run(_persistence(path).get_user_data())
+    # 1 — сессия истекла, класс остался; 2 — истекла целиком; 3 — активна
+    assert loaded == {1: {"class_id": "10a"}, 3: {"edit_sched_day": "wed"}}
+
+
+def test_sweep_trims_memory_and_database(path):
+    user_data = {1: {"class_id": "10a", "edit_sched_day": "mon"}, 2: {"edit_sched_day": "tue"}}
+    chat_data = {-5: {"menu_message_id": 42, "step": 1}}
+    app = _application(user_data, chat_data)
+
+    async def main() -> int:
+        persistence = _persistence(path)
+        for user_id, data in user_data.items():
+            await persistence.update_user_data(user_id, data)
+        await persistence.update_chat_data(-5, chat_data[-5])
+        # Все трое давно не писали
+        for key in ((USER, 1), (USER, 2), (CHAT, -5)):
+            persistence._seen[key] = time.time() - 7200
+            _age(path, *key, 7200)
+        expired = await persistence.sweep_expired(app)
+        await persistence.flush()
+        return expired
+
+    assert asyncio.run(main()) == 3
+    assert user_data == {1: {"class_id": "10a"}}
+    assert chat_data == {-5: {"menu_message_id": 42}}
+    assert app.dropped == [(USER, 2)]
+    assert _rows(path) == {(USER, 1): '{"class_id":"10a"}', (CHAT, -5): '{"menu_message_id":42}'}
+    # Обрезанная строка снова свежая: следующий запуск её не трогает
+    assert asyncio.run(_persistence(path).get_user_data()) == {1: {"class_id": "10a"}}
+
+
+def test_sweep_without_keep_keys_drops_everything(path):
+    user_data = {1: {"class_id": "10a"}}
+    app = _application(user_data, {})
+
+    async def main() -> None:
+        persistence = SqliteStatePersistence(path, ttl=3600.0)
+        await persistence.update_user_data(1, user_data[1])
+        persistence._seen[(USER, 1)] = time.time() - 7200
+        _age(path, USER, 1, 7200)
+        await persistence.sweep_expired(app)
+        await persistence.flush()
+
+    asyncio.run(main())
+    assert user_data == {} and app.dropped == [(USER, 1)]
+    assert _rows(path) == {}
+
+
+def test_refresh_picks_up_other_process(path):
+    async def main() -> None:
+        first, second = _persistence(path), _persistence(path)
+        await first.update_user_data(1, {"class_id": "10a"})
+        current = {}
+        await second.refresh_user_data(1, current)
+        assert current == {"class_id": "10a"}
+        # Свои несохранённые правки новее чужих
+        current["class_id"] = "11b"
+        second._stage((USER, 1), current)
+        await second.refresh_user_data(1, current)
+        assert current == {"class_id": "11b"}
+        await second.flush()
+        await first.flush()
+
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Tuple
+
+import pytest
+
+import bot.reminders as reminders
+import bot.tenants as tenants
+from bot.data import add_lesson, add_subject, get_tomorrow_day_key
+from bot.reminders import LEASE_SECONDS, ReminderScheduler, Subscription, SubscriptionStore, next_due
+
+SLOT = ("19:00", "Europe/Moscow")
+DAY = date(2026, 3, 2)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "subscriptions.sqlite3")
+
+
+@pytest.fixture
+def stores(path):
+    # Два процесса бота с общим файлом подписок
+    first, second = SubscriptionStore(path), SubscriptionStore(path)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def _subscribe(store: SubscriptionStore, *chat_ids: int, tenant_id: str = "10a") -> None:
+    for chat_id in chat_ids:
+        store.upsert(Subscription(chat_id, tenant_id=tenant_id))
+
+
+def test_lease_is_exclusive(stores):
+    first, second = stores
+    _subscribe(first, 1, 2)
+    assert first.lease(SLOT, 1, DAY)
+    assert not second.lease(SLOT, 1, DAY)
+    assert second.pending(SLOT, [1, 2], DAY) == {2}
+
+
+def test_sent_reminder_is_not_pending_again(stores):
+    first, second = stores
+    _subscribe(first, 1)
+    assert first.lease(SLOT, 1, DAY)
+    first.mark_sent(1, DAY)
+    assert second.pending(SLOT, [1], DAY) == set()
+    assert not second.lease(SLOT, 1, DAY)
+    # Завтра — новая рассылка
+    assert second.pending(SLOT, [1], DAY + timedelta(days=1)) == {1}
+
+
+def test_lease_expires_after_crash(stores, monkeypatch):
+    first, second = stores
+    _subscribe(first, 1)
+    assert first.lease(SLOT, 1, DAY)
+    # Процесс упал, не отметив доставку: аренда истекает сама
+    now = reminders._time.time()
+    monkeypatch.setattr(reminders._time, "time", lambda: now + LEASE_SECONDS + 1)
+    assert second.pending(SLOT, [1], DAY) == {1}
+    assert second.lease(SLOT, 1, DAY)
+
+
+def test_changed_subscription_is_skipped(stores):
+    first, second = stores
+    _subscribe(first, 1)
+    # Во втором процессе время перенесли: старый слот первого процесса не шлёт
+    second.upsert(Subscription(1, tenant_id="10a", time="07:30"))
+    assert first.pending(SLOT, [1], DAY) == set()
+    assert not first.lease(SLOT, 1, DAY)
+    assert first.pending(("07:30", "Europe/Moscow"), [1], DAY) == {1}
+
+
+class FakeBot:
+    """Бот, который только запоминает отправленные сообщения."""
+
+    def __init__(self) -> None:
+        self.sent: List[Tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        await asyncio.sleep(0)  # даём второму процессу вклиниться
+        self.sent.append((chat_id, text))
+
+
+def test_two_schedulers_send_each_reminder_once(path, monkeypatch):
+    monkeypatch.setattr(tenants, "_registry", tenants.TenantRegistry())
+    chats = [1, 2, 3, -4]
+    due = next_due(SLOT, datetime.now(timezone.utc))
+    bot = FakeBot()
+
+    async def main() -> Tuple[int, int]:
+        async with tenants.use_tenant("10a"):
+            add_subject("math", "Математика")
+            add_lesson(get_tomorrow_day_key(due), "math")
+        first = ReminderScheduler(SubscriptionStore(path))
+        second = ReminderScheduler(SubscriptionStore(path))
+        for chat_id in chats:
+            first.subscribe(Subscription(chat_id, tenant_id="10a"))
+            second._add(Subscription(chat_id, tenant_id="10a"))
+        now = due + timedelta(minutes=1)
+        sent = await asyncio.gather(first.deliver_due(bot, now), second.deliver_due(bot, now))
+        first.stop()
+        second.stop()
+        await tenants.get_registry().close()
+        return sent
+
+    assert sum(asyncio.run(main())) == len(chats)
+    assert sorted(chat_id for chat_id, _ in bot.sent) == sorted(chats)
+    assert "Математика" in bot.sent[0][1]
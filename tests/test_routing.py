@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from bot import routing
+from bot.handlers import edit_routes
+from bot.routing import CallbackRouter, route_name
+
+
+async def _noop(update, context, **params) -> None:
+    pass
+
+
+@pytest.fixture
+def router(monkeypatch):
+    # Маршруты теста не должны попасть в route_name других тестов
+    monkeypatch.setattr(routing, "_routers", [])
+    return CallbackRouter(is_admin=lambda update: update.is_admin, denied_text="нельзя")
+
+
+def _resolve(router: CallbackRouter, data: str):
+    resolved = router.resolve(data)
+    return None if resolved is None else (resolved[0].pattern, resolved[1])
+
+
+def test_exact_route_beats_parameter(router):
+    router.add_route("edit:sched:add", _noop)
+    router.add_route("edit:sched:{action}", _noop)
+    router.add_route("edit:sched:add:{subject_key}", _noop)
+    assert _resolve(router, "edit:sched:add") == ("edit:sched:add", {})
+    assert _resolve(router, "edit:sched:del") == ("edit:sched:{action}", {"action": "del"})
+    assert _resolve(router, "edit:sched:add:math") == ("edit:sched:add:{subject_key}", {"subject_key": "math"})
+
+
+def test_longer_prefix_wins(router):
+    router.add_route("edit:{section}:{key}", _noop)
+    router.add_route("edit:hw:{subject_key}", _noop)
+    assert _resolve(router, "edit:hw:math") == ("edit:hw:{subject_key}", {"subject_key": "math"})
+    assert _resolve(router, "edit:rename:math") == ("edit:{section}:{key}", {"section": "rename", "key": "math"})
+
+
+def test_parameter_count_must_match(router):
+    router.add_route("edit:hw:{subject_key}", _noop)
+    assert router.resolve("edit:hw") is None
+    assert router.resolve("edit:hw:math:extra") is None
+
+
+def test_rest_keeps_colons(router):
+    router.add_route("edit:sched:day:{day_key:rest}", _noop)
+    router.add_route("hist:{subject_key}:{day:rest}", _noop)
+    assert _resolve(router, "edit:sched:day:2024-09-01:a") == (
+        "edit:sched:day:{day_key:rest}", {"day_key": "2024-09-01:a"}
+    )
+    assert _resolve(router, "hist:math:a:b") == (
+        "hist:{subject_key}:{day:rest}", {"subject_key": "math", "day": "a:b"}
+    )
+    assert router.resolve("hist:math") is None
+
+
+def test_int_conversion(router):
+    router.add_route("edit:sched:del_choose:{index:int}", _noop)
+    assert _resolve(router, "edit:sched:del_choose:3") == ("edit:sched:del_choose:{index:int}", {"index": 3})
+    assert router.resolve("edit:sched:del_choose:x") is None
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("menu:day", "menu:day"),
+        ("edit:hw:{subject_key}", "edit:hw:{key:int}"),
+        ("edit:day:{day_key:rest}", "edit:day:{other:rest}"),
+    ],
+)
+def test_overlapping_routes_are_rejected(router, first, second):
+    router.add_route(first, _noop)
+    with pytest.raises(ValueError):
+        router.add_route(second, _noop)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    ["edit:{key}:save", "edit:{day:rest}:{key}", "edit:{key:float}"],
+)
+def test_bad_patterns_are_rejected(router, pattern):
+    with pytest.raises(ValueError):
+        router.add_route(pattern, _noop)
+
+
+def _update(data: str, is_admin: bool, answers: List[str]):
+    async def answer(text: str | None = None) -> None:
+        answers.append(text)
+
+    return SimpleNamespace(callback_query=SimpleNamespace(data=data, answer=answer), is_admin=is_admin)
+
+
+def test_admin_only_route_answers_denied(router):
+    calls = []
+
+    async def handler(update, context, **params) -> None:
+        calls.append(params)
+
+    router.add_route("edit:hw:{subject_key}", handler, admin_only=True)
+    answers: List[str] = []
+    assert asyncio.run(router.dispatch(_update("edit:hw:math", False, answers), None))
+    assert answers == ["нельзя"] and calls == []
+    assert asyncio.run(router.dispatch(_update("edit:hw:math", True, answers), None))
+    assert calls == [{"subject_key": "math"}]
+    assert not asyncio.run(router.dispatch(_update("menu:unknown", True, answers), None))
+
+
+def test_route_name_drops_parameters():
+    # Маршруты бота из bot.handlers
+    assert edit_routes in routing._routers
+    assert route_name("edit:sched:day:mon") == "edit:sched:day"
+    assert route_name("edit:sched:add") == "edit:sched:add"
+    assert route_name("edit:hw:math") == "edit:hw"
+    assert route_name("menu:subjects") == "menu:subjects"
+    assert route_name("subject:phys") == "subject"
+    assert route_name("") == "?"
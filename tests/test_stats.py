@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from bot.stats import CALLBACK, COMMAND, HOURLY_RETENTION, StatsStore, UsageStats
+
+
+NOW = 1_760_000_000.0
+
+
+@pytest.fixture
+def stats(tmp_path):
+    stats = UsageStats(StatsStore(str(tmp_path / "stats.sqlite3"), "Europe/Moscow"))
+    yield stats
+    stats.store.close()
+
+
+def test_summary_counts_written_and_pending(stats):
+    stats.record(COMMAND, "/start", user_id=1, now=NOW - 3600)
+    stats.flush(now=NOW)
+    stats.record(CALLBACK, "menu:subjects", user_id=2, now=NOW)
+    summary = stats.summary(now=NOW)
+    assert sum(summary["hourly"]) == 2
+    assert summary["users_24h"] == 2
+    assert dict(summary["top"]) == {(COMMAND, "/start"): 1, (CALLBACK, "menu:subjects"): 1}
+
+
+def test_rollup_is_not_counted_twice(stats):
+    old = NOW - 3 * 86400
+    for _ in range(3):
+        stats.record(COMMAND, "/start", user_id=1, now=old)
+    stats.flush(now=old)
+    before = stats.summary(now=NOW)["daily"]
+    # Всё старше now уходит в дни
+    stats.store.rollup(int(NOW) // 3600)
+    assert stats.summary(now=NOW)["daily"] == before
+    assert sum(n for _, n in before) == 3
+
+
+def test_report_does_not_see_unfinished_rollup(stats):
+    stats.record(COMMAND, "/start", user_id=1, now=NOW - 3600)
+    stats.flush(now=NOW)
+    store = stats.store
+    expected = stats.summary(now=NOW)
+
+    # Свёртка в другом потоке: дни уже вставлены, часы ещё не удалены
+    inserted, done = threading.Event(), threading.Event()
+
+    def rollup_halfway() -> None:
+        with store._write_lock:
+            conn = store.writer
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO daily (day, kind, name, count) SELECT ?, kind, name, count FROM hourly",
+                (store.day_of(int(NOW) // 3600),),
+            )
+            inserted.set()
+            done.wait(5)
+            conn.execute("ROLLBACK")
+
+    writer = threading.Thread(target=rollup_halfway)
+    writer.start()
+    try:
+        assert inserted.wait(5)
+        assert stats.summary(now=NOW) == expected
+    finally:
+        done.set()
+        writer.join()
+
+
+def test_summary_async_reads_off_loop(stats):
+    stats.record(COMMAND, "/start", user_id=1)
+    stats.flush()
+    threads = []
+    read = stats.store.read
+
+    def spy(*args):
+        threads.append(threading.current_thread())
+        return read(*args)
+
+    stats.store.read = spy
+    summary = asyncio.run(stats.summary_async())
+    assert sum(summary["hourly"]) == 1
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_flush_async_writes_off_loop(stats):
+    async def main() -> None:
+        stats.record(COMMAND, "/start", user_id=1)
+        await stats.flush_async()
+
+    asyncio.run(main())
+    hour = int(time.time()) // 3600
+    assert stats.store.read(hour - HOURLY_RETENTION.days * 24, "").hourly_events == [(hour, COMMAND, "/start", 1)]
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from bot.data import SCHEDULE, SUBJECTS, DataStore, Mutation, apply_mutation, check_subject_index, using_store
+from bot.storage import JournalStorage, StorageBackend, WriteBehindSaver
+
+
+def _open(tmp_path, snapshot_every: int = 200) -> JournalStorage:
+    return JournalStorage(str(tmp_path / "data.json"), str(tmp_path / "data.journal"), snapshot_every)
+
+
+def _edit(backend: JournalStorage, op: Mutation) -> None:
+    # Как слушатель bot.storage: правка применяется и дописывается в журнал
+    assert apply_mutation(op, notify=False)
+    backend.append(op)
+
+
+def _reopen(tmp_path) -> Tuple[Dict[str, Any], Dict[str, List[str]], JournalStorage]:
+    """Загрузить данные с диска в чистый класс, как при перезапуске бота."""
+    with using_store(DataStore("test")) as store:
+        backend = _open(tmp_path)
+        backend.store = store
+        backend.load()
+        assert check_subject_index() == []
+        subjects = {key: (s.name, s.homework) for key, s in SUBJECTS.items()}
+        return subjects, {day: list(keys) for day, keys in SCHEDULE.items()}, backend
+
+
+@pytest.fixture
+def backend(tmp_path, store):
+    backend = _open(tmp_path)
+    backend.store = store
+    backend.load()  # файлов нет — пишется пустой снимок
+    yield backend
+    backend.close()
+
+
+def test_replay_after_crash(tmp_path, backend):
+    _edit(backend, {"op": "add_subject", "subject": "math", "name": "Математика"})
+    _edit(backend, {"op": "add_lesson", "day": "mon", "subject": "math"})
+    _edit(backend, {"op": "set_homework", "subject": "math", "value": "№ 1"})
+    # Без close и снимка: процесс упал, в журнале только буфер ОС
+
+    subjects, schedule, reopened = _reopen(tmp_path)
+    assert subjects == {"math": ("Математика", "№ 1")}
+    assert schedule == {"mon": ["math"]}
+    assert reopened.seq == 3
+
+
+def test_torn_tail_is_dropped(tmp_path, backend):
+    _edit(backend, {"op": "add_subject", "subject": "math", "name": "Математика"})
+    _edit(backend, {"op": "add_lesson", "day": "mon", "subject": "math"})
+    backend.close()
+    with open(backend.journal_file, "ab") as f:
+        f.write(b'{"op":"add_lesson","day":"tue","sub')  # сбой посреди записи
+    size = os.path.getsize(backend.journal_file)
+
+    subjects, schedule, reopened = _reopen(tmp_path)
+    assert schedule == {"mon": ["math"]}
+    assert os.path.getsize(backend.journal_file) < size
+
+    # Новые правки после обрезки читаются целиком
+    with using_store(DataStore("test")) as store:
+        reopened.store = store
+        reopened.load()
+        _edit(reopened, {"op": "add_lesson", "day": "tue", "subject": "math"})
+        reopened.close()
+    _, schedule, _ = _reopen(tmp_path)
+    assert schedule == {"mon": ["math"], "tue": ["math"]}
+
+
+def test_replay_after_rotation(tmp_path, backend):
+    _edit(backend, {"op": "add_subject", "subject": "math", "name": "Математика"})
+    _edit(backend, {"op": "add_lesson", "day": "mon", "subject": "math"})
+    # Журнал отложен, но снимок так и не записан (сбой во время записи)
+    backend.begin_snapshot()
+    first = backend.journal_file + ".1"
+    assert backend.rotated_journal_files == [first]
+    size = os.path.getsize(first)
+    _edit(backend, {"op": "add_lesson", "day": "mon", "subject": "math"})
+    # Вторая попытка снимка тоже не дошла до диска: журнал отложен рядом, не дописан
+    backend.begin_snapshot()
+    assert backend.rotated_journal_files == [first, backend.journal_file + ".2"]
+    assert os.path.getsize(first) == size
+    _edit(backend, {"op": "set_homework", "subject": "math", "value": "№ 2"})
+
+    subjects, schedule, reopened = _reopen(tmp_path)
+    assert subjects == {"math": ("Математика", "№ 2")}
+    assert schedule == {"mon": ["math", "math"]}
+    assert reopened.seq == 4
+
+    # После перезапуска нумерация продолжается, а снимок убирает все отложенные журналы
+    with using_store(DataStore("test")) as store:
+        reopened.store = store
+        reopened.load()
+        payload = reopened.begin_snapshot()
+        assert reopened.rotated_journal_files[-1] == backend.journal_file + ".3"
+        reopened.write_snapshot(payload)
+        reopened.close()
+    assert reopened.rotated_journal_files == []
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("data.journal")]
+    subjects, schedule, _ = _reopen(tmp_path)
+    assert subjects == {"math": ("Математика", "№ 2")}
+    assert schedule == {"mon": ["math", "math"]}
+
+
+def test_snapshot_covers_journal(tmp_path, backend):
+    _edit(backend, {"op": "add_subject", "subject": "math", "name": "Математика"})
+    _edit(backend, {"op": "add_lesson", "day": "mon", "subject": "math"})
+    payload = backend.begin_snapshot()
+    # Правка, пришедшая пока снимок пишется, попадает в новый журнал
+    _edit(backend, {"op": "add_lesson", "day": "mon", "subject": "math"})
+    backend.write_snapshot(payload)
+    assert backend.rotated_journal_files == []
+    assert not os.path.exists(backend.journal_file + ".1")
+    with open(backend.data_file, encoding="utf-8") as f:
+        assert json.load(f)["seq"] == 2
+
+    # add_lesson не идемпотентна: повтор записи из снимка дал бы лишний урок
+    _, schedule, reopened = _reopen(tmp_path)
+    assert schedule == {"mon": ["math", "math"]}
+    assert reopened.seq == 3
+
+
+def test_old_records_in_rotated_journal_are_skipped(tmp_path, backend):
+    _edit(backend, {"op": "add_subject", "subject": "math", "name": "Математика"})
+    _edit(backend, {"op": "add_lesson", "day": "mon", "subject": "math"})
+    payload = backend.begin_snapshot()
+    backend.write_snapshot(payload)
+    # Снимок записан, но .1 остался (сбой между записью и удалением)
+    with open(backend.journal_file + ".1", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "add_lesson", "day": "mon", "subject": "math", "seq": 2}) + "\n")
+
+    _, schedule, _ = _reopen(tmp_path)
+    assert schedule == {"mon": ["math"]}
+
+
+class FakeStorage(StorageBackend):
+    """Хранилище, которое только записывает, что с ним делали."""
+
+    data_file = "fake"
+
+    def __init__(self, sync_delay: float = 0.0) -> None:
+        self.calls: List[str] = []
+        self.sync_delay = sync_delay
+        self.snapshot_requested = False
+        self.sync_started = threading.Event()
+
+    def append(self, op: Mutation) -> None:
+        self.calls.append("append")
+
+    def sync(self) -> None:
+        self.sync_started.set()
+        if self.sync_delay:
+            threading.Event().wait(self.sync_delay)
+        self.calls.append("sync")
+
+    @property
+    def needs_snapshot(self) -> bool:
+        return self.snapshot_requested
+
+    @property
+    def snapshot_on_close(self) -> bool:
+        return True
+
+    def begin_snapshot(self) -> Dict[str, Any]:
+        self.calls.append("begin_snapshot")
+        self.snapshot_requested = False
+        return {}
+
+    def write_snapshot(self, payload: Dict[str, Any]) -> None:
+        self.calls.append("write_snapshot")
+
+    def save(self) -> None:
+        self.calls.append("save")
+
+    def close(self) -> None:
+        self.calls.append("close")
+
+
+def test_edits_coalesce_into_one_sync():
+    storage = FakeStorage()
+
+    async def main() -> None:
+        saver = WriteBehindSaver(storage, interval=0.05)
+        for _ in range(50):
+            storage.append({})
+            saver.mark_dirty()
+        await asyncio.sleep(0.2)
+        assert not saver.dirty
+
+    asyncio.run(main())
+    assert storage.calls == ["append"] * 50 + ["sync"]
+
+
+def test_edit_during_flush_is_written_next():
+    storage = FakeStorage(sync_delay=0.1)
+
+    async def main() -> None:
+        saver = WriteBehindSaver(storage, interval=0.01)
+        storage.append({})
+        saver.mark_dirty()
+        await asyncio.get_running_loop().run_in_executor(None, storage.sync_started.wait)
+        # Первая запись ещё идёт в executor'е
+        storage.append({})
+        saver.mark_dirty()
+        await asyncio.sleep(0.4)
+        assert not saver.dirty
+
+    asyncio.run(main())
+    assert storage.calls == ["append", "append", "sync", "sync"]
+
+
+def test_snapshot_is_taken_before_it_is_written():
+    storage = FakeStorage()
+
+    async def main() -> None:
+        saver = WriteBehindSaver(storage, interval=0.01)
+        storage.snapshot_requested = True
+        saver.mark_dirty()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert storage.calls == ["begin_snapshot", "write_snapshot"]
+
+
+def test_close_flushes_pending_edits():
+    storage = FakeStorage()
+
+    async def main() -> None:
+        saver = WriteBehindSaver(storage, interval=60)
+        storage.append({})
+        saver.mark_dirty()
+        await saver.close()
+
+    asyncio.run(main())
+    assert storage.calls == ["append", "begin_snapshot", "write_snapshot", "close"]
+
+
+def test_flush_without_event_loop_is_immediate():
+    storage = FakeStorage()
+    saver = WriteBehindSaver(storage, interval=60)
+    saver.mark_dirty()
+    assert storage.calls == ["sync"]
+    saver.mark_dirty(snapshot=True)
+    assert storage.calls == ["sync", "sync", "save"]
+    assert not saver.dirty
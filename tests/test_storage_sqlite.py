@@ -0,0 +1,157 @@
+import json
+import random
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from bot.data import SCHEDULE, SUBJECTS, DataStore, Mutation, apply_mutation, using_store
+from bot.storage_sqlite import SqliteStorage
+
+Data = Tuple[Dict[str, Tuple[str, str]], Dict[str, List[str]]]
+
+
+def _data() -> Data:
+    subjects = {key: (s.name, s.homework) for key, s in SUBJECTS.items()}
+    return subjects, {day: list(keys) for day, keys in SCHEDULE.items()}
+
+
+def _open(path, store: DataStore, import_from: str | None = None) -> SqliteStorage:
+    backend = SqliteStorage(str(path), import_from)
+    backend.store = store
+    with using_store(store):
+        backend.load()
+    return backend
+
+
+def _edit(backend: SqliteStorage, op: Mutation) -> bool:
+    # Как слушатель bot.storage: правка применяется в памяти и пишется в базу
+    with using_store(backend.store):
+        changed = apply_mutation(op, notify=False)
+        if changed:
+            backend.append(op)
+    return changed
+
+
+def _reopen(path) -> Data:
+    store = DataStore("other")
+    backend = _open(path, store)
+    backend.close()
+    with using_store(store):
+        return _data()
+
+
+@pytest.fixture
+def db(tmp_path):
+    return tmp_path / "data.sqlite3"
+
+
+def _write_json(path, subjects: List[Dict[str, Any]], schedule: Dict[str, List[str]]) -> str:
+    path.write_text(json.dumps({"subjects": subjects, "schedule": schedule}, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_data_json_is_imported_once(tmp_path, db):
+    source = _write_json(
+        tmp_path / "data.json",
+        [{"key": "math", "name": "Математика", "homework": "№ 1"}],
+        {"mon": ["math", "ghost"]},  # урок несуществующего предмета не переносится
+    )
+    backend = _open(db, DataStore("test"), import_from=source)
+    with using_store(backend.store):
+        assert _data() == ({"math": ("Математика", "№ 1")}, {"mon": ["math"]})
+    _edit(backend, {"op": "delete_subject", "subject": "math"})
+    _edit(backend, {"op": "delete_day", "day": "mon"})
+    backend.close()
+
+    # База пуста, но это удалённые данные: data.json второй раз не переносится
+    reopened = _open(db, DataStore("test"), import_from=source)
+    with using_store(reopened.store):
+        assert _data() == ({}, {})
+    reopened.close()
+
+
+def test_lesson_positions_follow_memory(db):
+    backend = _open(db, DataStore("test"))
+    for key in ("a", "b", "c"):
+        _edit(backend, {"op": "add_subject", "subject": key, "name": key.upper()})
+    for key in ("a", "b", "c", "a"):
+        _edit(backend, {"op": "add_lesson", "day": "mon", "subject": key})
+    # После удаления в position остаётся дыра; номер урока — порядковый, а не position
+    _edit(backend, {"op": "remove_lesson", "day": "mon", "index": 1})
+    _edit(backend, {"op": "replace_lesson", "day": "mon", "index": 1, "subject": "b"})
+    _edit(backend, {"op": "remove_lesson", "day": "mon", "index": 2})
+    with using_store(backend.store):
+        expected = _data()
+    assert expected[1] == {"mon": ["a", "b"]}
+    backend.close()
+    assert _reopen(db) == expected
+
+
+def test_random_edits_match_memory(db):
+    rng = random.Random(3)
+    backend = _open(db, DataStore("test"))
+    keys = [f"s{i}" for i in range(5)]
+    for key in keys:
+        _edit(backend, {"op": "add_subject", "subject": key, "name": key})
+    for _ in range(500):
+        day = rng.choice(["mon", "tue", "wed"])
+        with using_store(backend.store):
+            lessons = len(SCHEDULE.get(day, []))
+        action = rng.randrange(6)
+        if action < 2:
+            op = {"op": "add_lesson", "day": day, "subject": rng.choice(keys)}
+        elif action == 2 and lessons:
+            op = {"op": "remove_lesson", "day": day, "index": rng.randrange(lessons)}
+        elif action == 3 and lessons:
+            op = {"op": "replace_lesson", "day": day, "index": rng.randrange(lessons), "subject": rng.choice(keys)}
+        elif action == 4 and rng.random() < 0.1:
+            op = {"op": "clear_day", "day": day}
+        else:
+            op = {"op": "set_homework", "subject": rng.choice(keys), "value": str(rng.random())}
+        _edit(backend, op)
+    with using_store(backend.store):
+        expected = _data()
+    backend.close()
+    assert _reopen(db) == expected
+
+
+def test_snapshot_does_not_overwrite_newer_data(db):
+    first = _open(db, DataStore("first"))
+    _edit(first, {"op": "add_subject", "subject": "math", "name": "Математика"})
+    second = _open(db, DataStore("second"))
+
+    # Второй процесс правит базу, первый ещё об этом не знает
+    _edit(second, {"op": "set_homework", "subject": "math", "value": "№ 2"})
+    with using_store(first.store):
+        payload = first.begin_snapshot()
+    first.write_snapshot(payload)
+    assert _reopen(db)[0] == {"math": ("Математика", "№ 2")}
+    assert first.changed_elsewhere()
+
+    with using_store(first.store):
+        first.load()
+        assert _data()[0] == {"math": ("Математика", "№ 2")}
+    assert not first.changed_elsewhere()
+    # Снимок с актуальной версией записывается
+    _edit(first, {"op": "rename_subject", "subject": "math", "value": "Алгебра"})
+    with using_store(first.store):
+        payload = first.begin_snapshot()
+    first.write_snapshot(payload)
+    assert _reopen(db)[0] == {"math": ("Алгебра", "№ 2")}
+    first.close()
+    second.close()
+
+
+def test_edit_over_foreign_edit_marks_stale(db):
+    first = _open(db, DataStore("first"))
+    _edit(first, {"op": "add_subject", "subject": "math", "name": "Математика"})
+    second = _open(db, DataStore("second"))
+    _edit(second, {"op": "set_homework", "subject": "math", "value": "№ 2"})
+    # Правка первого ложится поверх правки второго: память первого устарела
+    _edit(first, {"op": "add_subject", "subject": "rus", "name": "Русский"})
+    assert first.changed_elsewhere()
+    with using_store(first.store):
+        first.load()
+        assert _data()[0] == {"math": ("Математика", "№ 2"), "rus": ("Русский", "")}
+    first.close()
+    second.close()
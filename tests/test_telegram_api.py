@@ -0,0 +1,120 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+from telegram.request import HTTPXRequest, RequestData
+from telegram.request._requestparameter import RequestParameter
+
+import bot.telegram_api as telegram_api
+from bot.telegram_api import (
+    MAX_ATTEMPTS,
+    MAX_RETRY_AFTER,
+    MESSAGE_GONE,
+    NETWORK,
+    OK,
+    RETRY_AFTER,
+    SKIPPED,
+    ApiStats,
+    EditCache,
+    MessageGone,
+    RateLimiter,
+    RetryingRequest,
+)
+
+
+class FakeApi:
+    """Ответы Bot API по очереди: исключение поднимается, остальное возвращается."""
+
+    def __init__(self, monkeypatch, *responses: Any) -> None:
+        self.responses = list(responses)
+        self.methods: List[str] = []
+        self.sleeps: List[float] = []
+        api = self
+
+        async def post(request, url: str, request_data: RequestData | None = None, **kwargs: Any) -> Any:
+            api.methods.append(url.rsplit("/", 1)[-1])
+            response = api.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        async def sleep(delay: float) -> None:
+            api.sleeps.append(delay)
+
+        # Сетевой вызов RetryingRequest — post() родителя
+        monkeypatch.setattr(HTTPXRequest, "post", post, raising=False)
+        monkeypatch.setattr(telegram_api.asyncio, "sleep", sleep)
+
+
+@pytest.fixture(autouse=True)
+def api_state(monkeypatch):
+    # Свои лимитер, счётчики и кэш правок; разброс пауз — всегда максимальный
+    monkeypatch.setattr(telegram_api, "_limiter", RateLimiter())
+    monkeypatch.setattr(telegram_api, "_stats", ApiStats())
+    monkeypatch.setattr(telegram_api, "_edit_cache", EditCache())
+    monkeypatch.setattr(telegram_api.random, "uniform", lambda low, high: high)
+
+
+def _call(method: str, **params: Any) -> Any:
+    data = RequestData([RequestParameter(name, value, None) for name, value in params.items()])
+    return asyncio.run(RetryingRequest().post(f"https://api.telegram.org/bot0:test/{method}", data))
+
+
+def test_retry_after_pauses_limiter_and_retries(monkeypatch):
+    api = FakeApi(monkeypatch, RetryAfter(3), {"message_id": 7})
+    assert _call("sendMessage", chat_id=5, text="ДЗ") == {"message_id": 7}
+    assert api.methods == ["sendMessage", "sendMessage"]
+    assert api.sleeps == [3.5]
+    # Пауза общая: рассылки тоже ждут эти 3 секунды
+    assert telegram_api.get_limiter().bucket.reserve() >= 3
+    stats = telegram_api.get_api_stats()
+    assert stats.calls == {("sendMessage", RETRY_AFTER): 1, ("sendMessage", OK): 1}
+    assert stats.retries == {"sendMessage": 1}
+
+
+def test_long_retry_after_is_raised(monkeypatch):
+    api = FakeApi(monkeypatch, RetryAfter(int(MAX_RETRY_AFTER) + 1))
+    with pytest.raises(RetryAfter):
+        _call("sendMessage", chat_id=5, text="ДЗ")
+    assert api.sleeps == [] and telegram_api.get_api_stats().retries == {}
+
+
+def test_network_errors_back_off_until_attempts_run_out(monkeypatch):
+    api = FakeApi(monkeypatch, *[NetworkError("Bad Gateway")] * MAX_ATTEMPTS)
+    with pytest.raises(NetworkError):
+        _call("editMessageText", chat_id=5, message_id=1, text="ДЗ")
+    assert len(api.methods) == MAX_ATTEMPTS
+    assert api.sleeps == [0.5, 1.0, 2.0]
+    assert telegram_api.get_api_stats().calls == {("editMessageText", NETWORK): MAX_ATTEMPTS}
+
+
+def test_send_is_not_repeated_after_read_timeout(monkeypatch):
+    api = FakeApi(monkeypatch, TimedOut("Timed out"))
+    with pytest.raises(TimedOut):
+        _call("sendMessage", chat_id=5, text="ДЗ")
+    # Запрос мог дойти — повтор продублировал бы сообщение
+    assert api.methods == ["sendMessage"]
+    # Таймаут очереди соединений: запрос не уходил, повторять можно
+    api = FakeApi(monkeypatch, TimedOut("Pool timeout: all connections busy"), {"message_id": 7})
+    assert _call("sendMessage", chat_id=5, text="ДЗ") == {"message_id": 7}
+    assert api.methods == ["sendMessage", "sendMessage"]
+
+
+def test_not_modified_edit_is_skipped_next_time(monkeypatch):
+    api = FakeApi(monkeypatch, BadRequest("Message is not modified"))
+    assert _call("editMessageText", chat_id=5, message_id=1, text="ДЗ") is True
+    assert _call("editMessageText", chat_id=5, message_id=1, text="ДЗ") is True
+    assert api.methods == ["editMessageText"]
+    assert telegram_api.get_api_stats().calls[("editMessageText", SKIPPED)] == 1
+
+
+def test_gone_message(monkeypatch):
+    FakeApi(monkeypatch, BadRequest("Message to delete not found"), BadRequest("Message to edit not found"))
+    assert _call("deleteMessage", chat_id=5, message_id=1) is True
+    with pytest.raises(MessageGone):
+        _call("editMessageText", chat_id=5, message_id=1, text="ДЗ")
+    assert telegram_api.get_api_stats().calls == {
+        ("deleteMessage", MESSAGE_GONE): 1,
+        ("editMessageText", MESSAGE_GONE): 1,
+    }
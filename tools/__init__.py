@@ -0,0 +1,3 @@
+"""
+Инструменты для локальной разработки и проверки бота без настоящего Telegram.
+"""
@@ -0,0 +1,300 @@
+"""Локальная замена Telegram: синтетические апдейты и отправка их в вебхук бота,
+а также поддельный Bot API, который принимает запросы бота.
+
+Пример (бот запущен с BOT_MODE=webhook и WEBHOOK_SECRET=s3cret):
+
+    python -m tools.fake_telegram --url http://127.0.0.1:8080/telegram --secret s3cret \\
+        --text "📝 ДЗ на завтра" --callback menu:subjects
+
+Поддельный Bot API (отвечает 429 при превышении лимитов, как Telegram):
+
+    python -m tools.fake_telegram --serve-api --port 8081
+    # бот: Bot(token, base_url="http://127.0.0.1:8081/bot")
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Set
+
+import aiohttp
+from aiohttp import web
+
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def _chat(chat_id: int) -> Dict[str, Any]:
+    return {"id": chat_id, "type": "private", "first_name": f"User{chat_id}"}
+
+
+def message_update(text: str, user_id: int = 1, chat_id: int | None = None) -> Dict[str, Any]:
+    """Апдейт с текстовым сообщением (команды — текст, начинающийся с '/')."""
+    chat_id = chat_id if chat_id is not None else user_id
+    message: Dict[str, Any] = {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": _chat(chat_id),
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": next(_update_ids), "message": message}
+
+
+def callback_update(data: str, user_id: int = 1, chat_id: int | None = None, message_id: int = 1) -> Dict[str, Any]:
+    """Апдейт с нажатием inline-кнопки под сообщением бота message_id."""
+    chat_id = chat_id if chat_id is not None else user_id
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": _chat(chat_id),
+                "from": {"id": 1, "is_bot": True, "first_name": "Bot", "username": "bot"},
+                "text": "…",
+            },
+        },
+    }
+
+
+async def post_updates(url: str, updates: Iterable[Dict[str, Any]], secret: str | None = None) -> List[int]:
+    """Отправить апдейты в вебхук так же, как это делает Telegram. Возвращает HTTP-статусы."""
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    statuses: List[int] = []
+    async with aiohttp.ClientSession() as session:
+        for update in updates:
+            async with session.post(url, json=update, headers=headers) as resp:
+                statuses.append(resp.status)
+    return statuses
+
+
+class FakeBotApi:
+    """Поддельный Bot API: отвечает на запросы бота и считает отправленное.
+
+    Лимиты как у Telegram: в среднем не больше `rate` сообщений в секунду
+    (с запасом на всплеск в одну секунду) и не чаще `chat_rate` в один чат;
+    сверх этого — 429 с retry_after. Чаты из
+    `blocked` отвечают 403 (бот заблокирован). `latency` — задержка ответа, с.
+    `error_rate` — доля запросов (кроме getMe/getUpdates), на которые API
+    отвечает 500, как при сбое на стороне Telegram.
+
+    getUpdates отдаёт апдейты, добавленные push_updates(), — бот в режиме
+    polling получает их так же, как от Telegram (long polling с offset).
+    """
+
+    def __init__(
+        self,
+        rate: float = 30.0,
+        chat_rate: float = 1.0,
+        latency: float = 0.0,
+        blocked: Iterable[int] = (),
+        error_rate: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.latency = latency
+        self.blocked: Set[int] = set(blocked)
+        self.error_rate = error_rate
+        self.sent = 0
+        self.rate_limited = 0
+        self.errors_injected = 0
+        self.requests: Dict[str, int] = {}
+        self.first_sent_at: float | None = None
+        self.last_sent_at: float | None = None
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._chat_last: Dict[int, float] = {}
+        self._message_ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._updates_added = asyncio.Event()
+        # update_id → когда апдейт отдан боту (getUpdates)
+        self.delivered_at: Dict[int, float] = {}
+        self._runner: web.AppRunner | None = None
+        self.port: int | None = None
+
+    def _limited(self, chat_id: int, now: float) -> int:
+        """Сколько секунд ждать (0 — можно отправлять)."""
+        self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            return 1
+        last = self._chat_last.get(chat_id)
+        # Небольшой допуск на разброс сети, как и у настоящего Telegram
+        if last is not None and now - last < 0.9 / self.chat_rate:
+            return math.ceil(1.0 / self.chat_rate - (now - last))
+        self._tokens -= 1
+        self._chat_last[chat_id] = now
+        return 0
+
+    def push_updates(self, updates: Iterable[Dict[str, Any]]) -> None:
+        """Поставить апдейты в очередь getUpdates (update_id должны расти)."""
+        self._updates.extend(updates)
+        self._updates_added.set()
+
+    @property
+    def pending_updates(self) -> int:
+        return len(self._updates)
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        # offset подтверждает всё, что раньше него
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout > 0:
+            self._updates_added.clear()
+            try:
+                await asyncio.wait_for(self._updates_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        batch = list(itertools.islice(self._updates, limit))
+        now = time.perf_counter()
+        for update in batch:
+            self.delivered_at.setdefault(update["update_id"], now)
+        return batch
+
+    def _message(self, chat_id: int, text: str, message_id: int | None = None) -> Dict[str, Any]:
+        return {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": _chat(chat_id),
+            "from": {"id": 1, "is_bot": True, "first_name": "Bot", "username": "bot"},
+            "text": text,
+        }
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.requests[method] = self.requests.get(method, 0) + 1
+        if request.content_type == "application/json":
+            params: Dict[str, Any] = await request.json()
+        else:
+            params = dict(await request.post())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and method not in ("getMe", "getUpdates") and self._random.random() < self.error_rate:
+            self.errors_injected += 1
+            return web.json_response(
+                {"ok": False, "error_code": 500, "description": "Internal Server Error"}, status=500
+            )
+
+        if method == "getMe":
+            result: Any = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "bot"}
+        elif method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            if chat_id in self.blocked:
+                return web.json_response(
+                    {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"},
+                    status=403,
+                )
+            now = time.monotonic()
+            retry_after = self._limited(chat_id, now)
+            if retry_after:
+                self.rate_limited += 1
+                return web.json_response(
+                    {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {retry_after}",
+                        "parameters": {"retry_after": retry_after},
+                    },
+                    status=429,
+                )
+            self.sent += 1
+            self.first_sent_at = self.first_sent_at or now
+            self.last_sent_at = now
+            message_id = int(params["message_id"]) if "message_id" in params else None
+            result = self._message(chat_id, str(params.get("text", "")), message_id)
+        elif method == "getUpdates":
+            result = await self._get_updates(params)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result}, dumps=lambda o: json.dumps(o, ensure_ascii=False))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запустить сервер; вернуть base_url для Bot(..., base_url=...)."""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        return f"http://{host}:{self.port}/bot"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> str:
+        elapsed = (self.last_sent_at or 0) - (self.first_sent_at or 0)
+        rate = self.sent / elapsed if elapsed > 0 else 0.0
+        return f"отправлено {self.sent} ({rate:.1f}/с), 429: {self.rate_limited}"
+
+
+async def serve_api(port: int, rate: float, latency: float) -> None:
+    api = FakeBotApi(rate=rate, latency=latency)
+    base_url = await api.start(port=port)
+    print(f"Поддельный Bot API: {base_url}<token>/<method>")
+    try:
+        while True:
+            await asyncio.sleep(5)
+            print(api.stats())
+    finally:
+        await api.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--serve-api", action="store_true", help="запустить поддельный Bot API")
+    parser.add_argument("--port", type=int, default=8081, help="порт поддельного Bot API")
+    parser.add_argument("--rate", type=float, default=30.0, help="лимит сообщений в секунду")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа API, с")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/telegram")
+    parser.add_argument("--secret")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--text", action="append", default=[], help="текст сообщения (можно несколько)")
+    parser.add_argument("--callback", action="append", default=[], help="callback_data (можно несколько)")
+    args = parser.parse_args()
+
+    if args.serve_api:
+        try:
+            asyncio.run(serve_api(args.port, args.rate, args.latency))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    updates = [message_update(t, args.user_id) for t in args.text]
+    updates += [callback_update(d, args.user_id) for d in args.callback]
+    statuses = asyncio.run(post_updates(args.url, updates, args.secret))
+    for update, status in zip(updates, statuses):
+        print(status, update.get("message", {}).get("text") or update["callback_query"]["data"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Несколько процессов правят одни и те же данные через общую базу SQLite.
+
+Каждый процесс делает случайные правки (как админ в боте) в основном классе
+и в классе 7a, перед каждой подхватывая чужие правки так же, как бот перед
+апдейтом (use_tenant → refresh_data). После всех правок процессы должны
+прийти к одному и тому же состоянию — совпадающему с содержимым базы.
+
+    python -m tools.multiworker --workers 4 --edits 300
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+
+TENANTS = ("default", "7a")
+
+
+def _digest() -> Tuple[str, int, int]:
+    from bot.data import SCHEDULE, SUBJECTS
+
+    payload = {
+        "subjects": [[s.key, s.name, s.homework] for s in SUBJECTS.values()],
+        "schedule": {day: list(keys) for day, keys in SCHEDULE.items()},
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    lessons = sum(len(keys) for keys in SCHEDULE.values())
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16], len(SUBJECTS), lessons
+
+
+def _random_edit(rng: random.Random, worker: int, step: int) -> None:
+    from bot import data
+
+    subjects = list(data.SUBJECTS)
+    days = data.get_all_day_keys()
+    day = rng.choice(days)
+    r = rng.random()
+    if r < 0.15 or not subjects:
+        data.add_subject(f"w{worker}_{step}", f"Предмет {worker}.{step}", "")
+    elif r < 0.45:
+        data.add_lesson(day, rng.choice(subjects))
+    elif r < 0.6:
+        lessons = data.SCHEDULE.get(day, [])
+        if lessons:
+            data.remove_lesson(day, rng.randrange(len(lessons)))
+    elif r < 0.75:
+        data.set_homework(rng.choice(subjects), f"ДЗ от {worker} #{step}")
+    elif r < 0.85:
+        data.rename_subject(rng.choice(subjects), f"Имя {worker}.{step}")
+    elif r < 0.92:
+        lessons = data.SCHEDULE.get(day, [])
+        if lessons:
+            data.replace_lesson(day, rng.randrange(len(lessons)), rng.choice(subjects))
+    elif r < 0.97:
+        data.delete_subject(rng.choice(subjects))
+    else:
+        data.clear_day(day)
+
+
+def _configure(path: str, tenants_dir: str) -> None:
+    os.environ.setdefault("BOT_TOKEN", "0:multiworker")
+    from bot import storage
+
+    storage.configure_storage("sqlite", path, tenants_dir)
+
+
+def _worker(
+    index: int,
+    path: str,
+    tenants_dir: str,
+    edits: int,
+    seed: int,
+    start: Any,
+    finished: Any,
+    results: Any,
+) -> None:
+    _configure(path, tenants_dir)
+    from bot import data, storage, tenants
+
+    reloads = [0]
+    data.add_reload_listener(lambda: reloads.__setitem__(0, reloads[0] + 1))
+    storage.load_data()
+    rng = random.Random(seed * 1000 + index)
+
+    async def run() -> Dict[str, Any]:
+        for step in range(edits):
+            async with tenants.use_tenant(rng.choice(TENANTS)):
+                _random_edit(rng, index, step)
+            if rng.random() < 0.2:
+                await asyncio.sleep(rng.random() / 1000)
+        # Все закончили — подхватываем последние чужие правки
+        await asyncio.get_running_loop().run_in_executor(None, finished.wait)
+        digests = {}
+        for tenant_id in TENANTS:
+            async with tenants.use_tenant(tenant_id):
+                digests[tenant_id] = _digest()
+                problems = data.check_subject_index()
+                if problems:
+                    digests[tenant_id] += ("index: " + "; ".join(problems[:3]),)
+        await tenants.shutdown_tenants()
+        return {"worker": index, "digests": digests, "reloads": reloads[0]}
+
+    start.wait()
+    results.put(asyncio.run(run()))
+
+
+def _reference(path: str, tenants_dir: str) -> Dict[str, Tuple[str, int, int]]:
+    """Состояние, прочитанное из базы заново (как при старте нового процесса)."""
+    _configure(path, tenants_dir)
+    from bot.data import DataStore, using_store
+    from bot.storage import close_store, load_data
+
+    result = {}
+    for tenant_id in TENANTS:
+        store = DataStore(tenant_id)
+        load_data(store)
+        with using_store(store):
+            result[tenant_id] = _digest()
+        asyncio.run(close_store(store))
+    return result
+
+
+def run(workers: int, edits: int, seed: int) -> bool:
+    base = tempfile.mkdtemp(prefix="multiworker-")
+    path = os.path.join(base, "data.sqlite3")
+    tenants_dir = os.path.join(base, "tenants")
+    ctx = multiprocessing.get_context("spawn")
+    start, finished = ctx.Barrier(workers), ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(i, path, tenants_dir, edits, seed, start, finished, results))
+        for i in range(workers)
+    ]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    reports: List[Dict[str, Any]] = [results.get(timeout=300) for _ in procs]
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - started
+
+    reference = _reference(path, tenants_dir)
+    ok = True
+    print(f"{workers} процесса(ов) × {edits} правок, {elapsed:.1f} с, база: {path}")
+    for report in sorted(reports, key=lambda r: r["worker"]):
+        line = [f"воркер {report['worker']}: перечитываний {report['reloads']:4d}"]
+        for tenant_id in TENANTS:
+            digest = report["digests"][tenant_id]
+            same = tuple(digest) == tuple(reference[tenant_id])
+            ok = ok and same
+            line.append(f"{tenant_id}={digest[0]}{'' if same else ' ≠ база'}")
+        print("  ".join(line))
+    for tenant_id in TENANTS:
+        digest, n_subjects, n_lessons = reference[tenant_id]
+        print(f"база {tenant_id}: {digest} (предметов {n_subjects}, уроков {n_lessons})")
+    print("OK: все процессы сошлись" if ok else "ОШИБКА: состояния процессов расходятся")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--edits", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.workers, args.edits, args.seed) else 1)
+
+
+if __name__ == "__main__":
+    main()